@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""容器列表解析成dict和解析成citadelpy.models.Container的时间和内存.
+
+生成一个像/pod/<name>/containers那样的大JSON数组, info是一整块docker inspect,
+分别解析成dict的list和Container的list, 比较解析时间, 解析完之后list占的内存,
+以及用container_row生成表格的行的时间. 带上CONTAINER_FIELDS (列容器的命令都带) 的时候
+citadel不支持fields, 在本地裁剪.
+
+    python benchmarks/bench_models.py [--containers 10000]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import simplejson as jsonlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from citadelpy.models import Container  # noqa: E402
+from citadelpy.stream import CHUNK_SIZE, iter_json_array  # noqa: E402
+from corecli.cli.utils import CONTAINER_FIELDS, container_row  # noqa: E402
+
+
+def build_listing(count):
+    """count个容器, 每个的info大概4KB."""
+    containers = []
+    for i in range(count):
+        info = {
+            'Id': '%064x' % i,
+            'Config': {'Env': ['KEY_%d=value-%d' % (k, i) for k in range(40)], 'Labels': dict(('label%d' % k, 'v') for k in range(20)),
+                       'Cmd': ['python', 'app.py'], 'Image': 'hub.ricebook.net/foo/web:%07x' % i},
+            'NetworkSettings': {'Networks': {'calico': {'IPAddress': '10.%d.%d.%d' % (i >> 16, (i >> 8) & 255, i & 255),
+                                                        'Gateway': '10.0.0.1', 'MacAddress': '02:42:ac:11:00:02'}}, 'Ports': {}},
+            'Mounts': [{'Source': '/data/%d/%d' % (i, k), 'Destination': '/mnt/%d' % k, 'RW': True} for k in range(10)],
+            'State': {'Running': True, 'Pid': 1000 + i, 'StartedAt': '2016-01-01T00:00:00Z'},
+        }
+        containers.append({'name': 'foo_web_%d' % i, 'container_id': '%064x' % i, 'nodename': 'node%d' % (i % 50),
+                           'podname': 'pod', 'appname': 'foo', 'sha': '%040x' % i, 'entrypoint': 'web', 'env': 'prod',
+                           'cpu_quota': 1, 'info': info})
+    return jsonlib.dumps(containers).encode('utf-8')
+
+
+def _chunks(data):
+    return (data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+
+
+def as_dicts(data, fields=None):
+    return list(iter_json_array(_chunks(data), fields=fields))
+
+
+def as_models(data, fields=None):
+    return [Container.from_dict(item) for item in iter_json_array(_chunks(data), fields=fields, raw=Container.raw_fields)]
+
+
+def dict_row(c):
+    """改成Container之前的container_row."""
+    networks = c['info']['NetworkSettings']['Networks']
+    ns = ['%s:%s' % (name, network['IPAddress']) for name, network in networks.items()]
+    return [c['name'], c['container_id'], c['nodename'], c['podname'], c['appname'], c['sha'][:7], c['entrypoint'], c['env'], c['cpu_quota'], ','.join(ns)]
+
+
+def bench(name, func, row, data, rounds, fields=None):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(data, fields)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    items = func(data, fields)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for item in items:
+        row(item)
+    render = time.perf_counter() - start
+    print('%-18s decode %8.1f ms  retained %7.1f MB  peak %7.1f MB  render %7.1f ms'
+          % (name, best * 1000, retained / 1e6, peak / 1e6, render * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--containers', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    data = build_listing(args.containers)
+    print('%d containers, %.1f MB of JSON' % (args.containers, len(data) / 1e6))
+    bench('dict', as_dicts, dict_row, data, args.rounds)
+    bench('Container', as_models, container_row, data, args.rounds)
+    bench('dict + fields', as_dicts, dict_row, data, args.rounds, CONTAINER_FIELDS)
+    bench('Container + fields', as_models, container_row, data, args.rounds, CONTAINER_FIELDS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""比较request_stream原来的iter_lines + simplejson和现在的iter_ndjson.
+
+    python benchmarks/bench_ndjson.py [--mb 20]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import simplejson as jsonlib
+from requests.models import Response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from citadelpy import stream  # noqa: E402
+from citadelpy.stream import CHUNK_SIZE, iter_ndjson  # noqa: E402
+
+
+def build_log(size):
+    """像/build那样的stream消息, 一行一条."""
+    lines = []
+    total = i = 0
+    while total < size:
+        line = jsonlib.dumps({'error': '', 'status': '', 'progress': '', 'stream': 'Step %d : RUN make %s\n' % (i, 'x' * (i % 200))}) + '\n'
+        lines.append(line)
+        total += len(line)
+        i += 1
+    return ''.join(lines).encode('utf-8'), i
+
+
+def _response(data):
+    resp = Response()
+    resp.status_code = 200
+    resp.raw = io.BytesIO(data)
+    return resp
+
+
+def old_path(data):
+    return sum(1 for line in _response(data).iter_lines() if jsonlib.loads(line) is not None)
+
+
+def new_path(data, loads=None):
+    return sum(1 for _ in iter_ndjson(_response(data).iter_content(CHUNK_SIZE), loads=loads))
+
+
+def bench(name, func, data, expected, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        count = func(data)
+        elapsed = time.perf_counter() - start
+        assert count == expected, (name, count, expected)
+        best = elapsed if best is None else min(best, elapsed)
+    print('%-28s %8.1f ms  %8.1f MB/s' % (name, best * 1000, len(data) / best / 1e6))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=float, default=20)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    data, count = build_log(int(args.mb * 1024 * 1024))
+    print('%d lines, %.1f MB' % (count, len(data) / 1e6))
+    base = bench('iter_lines + simplejson', old_path, data, count, args.rounds)
+    bench('iter_ndjson + simplejson', lambda d: new_path(d, stream._simplejson_loads), data, count, args.rounds)
+    if stream.orjson is not None:
+        best = bench('iter_ndjson + orjson', new_path, data, count, args.rounds)
+        print('speedup with orjson: %.1fx' % (base / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""corecli的冷启动时间.
+
+每一项都新起一个python进程跑, 取多次里的中位数, 再用-X importtime列出
+import corecli.cli.cli以及子命令module时最花时间的几个module.
+
+    python benchmarks/bench_startup.py [--rounds 10] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MAIN = 'import sys; sys.argv[0] = "corecli"; from corecli.cli.cli import main; main()'
+
+CASES = [
+    ('import corecli.cli.cli', ['-c', 'import corecli.cli.cli'], []),
+    ('corecli --help', ['-c', MAIN], ['--help']),
+    ('corecli remove --help', ['-c', MAIN], ['remove', '--help']),
+    ('corecli app:get --help', ['-c', MAIN], ['app:get', '--help']),
+    ('corecli deploy:batch --help', ['-c', MAIN], ['deploy:batch', '--help']),
+]
+
+
+_config = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+_config.write('{"citadel_url": "http://127.0.0.1:1", "auth_token": "bench"}')
+_config.close()
+
+
+def _env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    # 不要读到真的配置文件
+    env['CITADEL_CONFIG_PATH'] = _config.name
+    return env
+
+
+def wall_time(args, rounds):
+    env = _env()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def import_times(args):
+    """-X importtime的输出, 返回{module: (self_us, cumulative_us)}, 只算顶层module."""
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, env=_env(),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    times = {}
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        # 缩进的是被别的module带进来的
+        if name[1:].startswith(' '):
+            continue
+        times[name.strip()] = (int(self_us), int(cumulative))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    try:
+        run(args)
+    finally:
+        os.unlink(_config.name)
+
+
+def run(args):
+    baseline = wall_time(['-c', 'pass'], args.rounds)
+    print('%-30s %8.1f ms' % ('python -c pass', baseline * 1000))
+    for name, python_args, cli_args in CASES:
+        elapsed = wall_time(python_args + cli_args, args.rounds)
+        print('%-30s %8.1f ms  (+%.1f ms)' % (name, elapsed * 1000, (elapsed - baseline) * 1000))
+
+    for name, python_args, cli_args in CASES[1:]:
+        times = import_times(python_args + cli_args)
+        total = sum(cumulative for _, cumulative in times.values())
+        print('\n%s: %.1f ms in top level imports' % (name, total / 1000.0))
+        for module, (_, cumulative) in sorted(times.items(), key=lambda item: -item[1][1])[:args.top]:
+            print('  %-28s %8.1f ms' % (module, cumulative / 1000.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+"""离线的整体benchmark: 本地起一个假的citadel, 跑commands里的每个子命令和CoreAPI的主要方法.
+
+    python benchmarks/bench_suite.py                    # 跑一遍, 和benchmarks/baseline.json比较
+    python benchmarks/bench_suite.py --save-baseline    # 这次的结果存成baseline
+    python benchmarks/bench_suite.py --only app: --only get_app --rounds 10
+    python benchmarks/bench_suite.py --latency 0.05 --error-rate 0.02 --containers 20000
+
+假的citadel (tests/stub.py) 在一个子进程里跑, 每个请求的延迟, 容器列表的大小, 流接口每秒
+多少行, 出错 (503) 的比例都可以调.
+每个子命令每一轮都新起一个corecli进程, 时间包括启动, 内存是那个进程退出时自己读的峰值RSS
+(/proc/self/status的VmHWM, fork出来的进程的ru_maxrss会带上父进程的); 先跑一次不算,
+所以inventory:sync量的是增量同步.
+CoreAPI的方法在这个进程里用--concurrency个线程跑, 报告延迟的分位数和吞吐. 计时之后用
+tracemalloc再跑一批, 内存是这一批Python分配的峰值, 每个方法分开算.
+和baseline比的时候, p50 / p90 / 内存峰值变差超过--threshold的算退步, 有退步的话返回1.
+baseline和机器有关, 换了机器先--save-baseline.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import simplejson as jsonlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from citadelpy import CoreAPI  # noqa: E402
+from citadelpy.models import Container  # noqa: E402
+from corecli.cli.commands import commands  # noqa: E402
+from corecli.cli.utils import CONTAINER_FIELDS  # noqa: E402
+from tests.stub import StubCitadel, StubResponse  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+# 子进程退出的时候把自己的峰值RSS (KB) 写到CORECLI_BENCH_RSS这个文件里
+MAIN = '''
+import atexit, os, sys
+
+def _peak_rss():
+    kb = 0
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    kb = int(line.split()[1])
+    except IOError:
+        import resource
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(os.environ['CORECLI_BENCH_RSS'], 'w') as f:
+        f.write(str(kb))
+
+atexit.register(_peak_rss)
+sys.argv[0] = 'corecli'
+from corecli.cli.cli import main
+main()
+'''
+
+APP = 'foo'
+REPO = 'git@gitlab.ricebook.net:platform/foo.git'
+SHA = 'a' * 40
+NEW_SHA = 'b' * 40
+OLD_SHA = 'c' * 40
+ETAG = '"bench"'
+
+# 比较的指标, 都是越小越好; 时间的指标还要差得超过--min-delta秒才算退步
+METRICS = ('p50', 'p90', 'peak_rss_kb', 'peak_alloc_kb')
+TIME_METRICS = ('p50', 'p90')
+
+# 没法在这里跑的子命令和原因
+SKIPPED = {
+    'daemon': 'long running server, see tests/test_daemon.py',
+}
+
+
+def _container(i, params, sha=SHA, podname=None):
+    pod = i % params['pods']
+    node = 'pod%d-node%d' % (pod, i % params['nodes'])
+    return {'name': '%s_web_%d' % (APP, i), 'container_id': '%064x' % i, 'nodename': node,
+            'podname': podname or 'pod%d' % pod, 'appname': APP, 'sha': sha, 'entrypoint': 'web', 'env': 'prod',
+            'cpu_quota': 1,
+            'info': {'NetworkSettings': {'Networks': {'calico': {'IPAddress': '10.%d.%d.%d' % (i >> 16, (i >> 8) & 255, i & 255)}}},
+                     'State': {'Running': True}, 'Blob': 'x' * params['info_bytes']}}
+
+
+def _stream(params, message):
+    """流接口: 一共stream_lines行, 每秒stream_rate行."""
+    interval = 1.0 / params['stream_rate'] if params['stream_rate'] else 0
+    return lambda req: StubResponse(lines=[message(req, i) for i in range(params['stream_lines'])], interval=interval)
+
+
+def _per_id(make):
+    def _response(req):
+        return StubResponse(lines=[make(container_id) for container_id in req.json['ids']])
+    return _response
+
+
+def build_stub(params):
+    """一个有APP, pods个pod, 每个pod nodes个节点, 一共containers个容器的citadel."""
+    stub = StubCitadel(latency=params['latency'], error_rate=params['error_rate'], record=False, seed=1)
+    containers = [_container(i, params) for i in range(params['containers'])]
+    # upgrade:rolling和release:offline用的老release, 容器少一点
+    old = [_container(i, params, sha=OLD_SHA) for i in range(params['old_containers'])]
+    listing = dict(json=containers, headers={'ETag': ETAG})
+
+    stub.add('GET', '/app/%s' % APP, json={'name': APP, 'git': REPO, 'created': '2016-01-01 00:00:00'})
+    stub.add('GET', '/app/%s/env' % APP, json=[{'envname': 'prod'}, {'envname': 'test'}])
+    env = {'envname': 'prod', 'vars': dict(('KEY_%d' % i, 'value-%d' % i) for i in range(50))}
+    stub.add('GET', '/app/%s/env/prod' % APP, json=env)
+    stub.add('PUT', '/app/%s/env/prod' % APP, json=env)
+    stub.add('GET', '/app/%s/containers' % APP, **listing)
+    specs = {'appname': APP, 'entrypoints': {'web': {'cmd': 'python app.py', 'ports': ['5000/tcp']}}, 'build': ['make']}
+    releases = [{'sha': '%040x' % i, 'image': 'hub.ricebook.net/%s:%07x' % (APP, i), 'created': '2016-01-01', 'specs': specs}
+                for i in range(params['releases'])]
+    releases.append({'sha': SHA, 'image': 'hub.ricebook.net/%s:%s' % (APP, SHA[:7]), 'created': '2016-01-01', 'specs': specs})
+    stub.add('GET', '/app/%s/releases' % APP, json=releases, headers={'ETag': ETAG})
+    stub.add('GET', '/app/%s/version/%s' % (APP, SHA), json=releases[-1])
+    stub.add('GET', '/app/%s/version/%s/containers' % (APP, SHA), **listing)
+    stub.add('GET', '/app/%s/version/%s/containers' % (APP, OLD_SHA), json=old)
+    stub.add('POST', '/app/register', json={'sha': SHA})
+
+    stub.add('GET', '/pod', json=[{'name': 'pod%d' % p, 'desc': 'benchmark pod %d' % p} for p in range(params['pods'])])
+    for p in range(params['pods']):
+        podname = 'pod%d' % p
+        nodes = ['%s-node%d' % (podname, n) for n in range(params['nodes'])]
+        stub.add('GET', '/pod/%s' % podname, json={'name': podname, 'desc': 'benchmark pod %d' % p})
+        stub.add('GET', '/pod/%s/nodes' % podname, json=[{'name': n, 'podname': podname, 'available': True,
+                                                          'cpu': dict((str(c), 10) for c in range(8)), 'info': {'Blob': 'x' * params['info_bytes']}}
+                                                         for n in nodes])
+        memcap = dict((n, {'total': 64 << 30, 'used': 8 << 30, 'used_by_memcap': 8 << 30, 'diff': 0}) for n in nodes)
+        stub.add('GET', '/pod/%s/getmemcap' % podname, json=memcap)
+        stub.add('POST', '/pod/%s/syncmemcap' % podname, json=memcap)
+        stub.add('GET', '/pod/%s/containers' % podname, json=[c for c in containers if c['podname'] == podname], headers={'ETag': ETAG})
+        for n in nodes:
+            stub.add('GET', '/log/%s/%s' % (n, APP), _stream(params, lambda req, i, n=n: {
+                'datetime': '2016-01-01 00:00:%02d.%06d' % (i // 1000000 % 60, i % 1000000), 'type': 'stdout', 'entrypoint': 'web',
+                'id': '%064x' % i, 'ident': n, 'data': 'GET /ping 200 %d' % i}))
+
+    stub.add('POST', '/build', _stream(params, lambda req, i: {'error': '', 'status': '', 'progress': '', 'stream': 'Step %d : RUN make\n' % i}))
+    stub.add('POST', '/deploy', lambda req: StubResponse(lines=[{'success': True, 'id': 'new%d' % i, 'name': '%s_web_new%d' % (APP, i)}
+                                                                for i in range(req.json.get('count') or 1)]))
+    stub.add('POST', '/remove', _per_id(lambda container_id: {'success': True, 'id': container_id, 'message': ''}))
+    stub.add('POST', '/upgrade', _per_id(lambda container_id: {'success': True, 'id': container_id, 'new_id': 'new-' + container_id,
+                                                               'new_name': '%s_web' % APP}))
+    for c in old:
+        stub.add('GET', '/container/new-%s' % c['container_id'], json=dict(c, container_id='new-' + c['container_id'], sha=NEW_SHA))
+    return stub
+
+
+def _serve(params, conn):
+    stub = build_stub(params).start()
+    conn.send(stub.url)
+    conn.recv()
+    stub.stop()
+
+
+class StubProcess:
+    """在子进程里跑build_stub(params), 这个进程的CPU和内存不算在benchmark里."""
+
+    def __init__(self, params):
+        self.params = params
+
+    def __enter__(self):
+        ctx = multiprocessing.get_context('fork')
+        self._conn, child = ctx.Pipe()
+        self._process = ctx.Process(target=_serve, args=(self.params, child), daemon=True)
+        self._process.start()
+        self.url = self._conn.recv()
+        return self
+
+    def __exit__(self, *exc):
+        self._conn.send('stop')
+        self._process.join(5)
+
+
+def command_scenarios(workdir):
+    """{子命令: corecli的参数}, 和commands的顺序一样, inventory:sync在inventory:query前面."""
+    with open(os.path.join(workdir, 'envs.json'), 'w') as f:
+        jsonlib.dump({APP: {'prod': dict(('KEY_%d' % i, 'value-%d' % (i + i % 2)) for i in range(50))}}, f)
+    with open(os.path.join(workdir, 'deploy.json'), 'w') as f:
+        jsonlib.dump({'repo': REPO, 'sha': SHA, 'defaults': {'entrypoint': 'web', 'memory': 536870912},
+                      'targets': [{'pod': 'pod%d' % p, 'count': 2} for p in range(2)]}, f)
+
+    def _path(name):
+        return os.path.join(workdir, name)
+
+    return {
+        'app:get': ['app:get', APP],
+        'app:envs': ['app:envs', APP],
+        'app:env': ['app:env', 'get', 'prod', '--app', APP],
+        'app:release': ['app:release', APP],
+        'app:container': ['app:container', APP],
+        'release:get': ['release:get', APP, SHA],
+        'release:specs': ['release:specs', APP, SHA],
+        'release:container': ['release:container', APP, SHA],
+        'release:offline': ['release:offline', APP, OLD_SHA, '--journal', _path('removed.journal')],
+        'pod:get': ['pod:get'],
+        'pod:container': ['pod:container', 'pod0'],
+        'pod:getmemcap': ['pod:getmemcap', 'pod0'],
+        'pod:syncmemcap': ['pod:syncmemcap', 'pod0'],
+        'pod:plan': ['pod:plan', 'pod0', 'pod1', '--count', '20', '--cpu', '1'],
+        'env:sync': ['env:sync', _path('envs.json'), '--dry-run'],
+        'inventory:sync': ['inventory:sync', '--db', _path('inventory.sqlite')],
+        'inventory:query': ['inventory:query', '--db', _path('inventory.sqlite'), '--app', APP],
+        # CoreAPI.get_networks已经不能用了, 这个命令总是失败, 只能看看启动加报错的时间
+        'network:get': ['network:get'],
+        'register': ['register', APP, SHA, REPO],
+        'deploy': ['deploy', 'pod0', 'web', '--repo', REPO, '--sha', SHA, '--count', '3'],
+        'deploy:batch': ['deploy:batch', _path('deploy.json')],
+        'build': ['build', REPO, SHA],
+        'build:many': ['build:many', '%s@%s' % (REPO, SHA), '%s@%s' % (REPO, NEW_SHA), '--log-dir', _path('build-logs')],
+        'remove': ['remove', 'c1', 'c2', 'c3', '--journal', _path('removed.journal')],
+        'upgrade': ['upgrade', 'c1', 'c2', '--repo', REPO, '--sha', NEW_SHA],
+        'upgrade:rolling': ['upgrade:rolling', APP, OLD_SHA, '--repo', REPO, '--sha', NEW_SHA, '--batch-size', '5',
+                            '--health-interval', '0.01'],
+        'log': ['log', 'pod0-node0', APP],
+    }
+
+
+def percentile(samples, q):
+    """nearest-rank, samples不用先排序."""
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered), int(math.ceil(q / 100.0 * len(ordered)))) - 1)]
+
+
+def summarize(samples, wall, items, errors, **memory):
+    """memory: peak_rss_kb (命令) 或者peak_alloc_kb (CoreAPI的方法)."""
+    result = {
+        'count': len(samples),
+        'p50': percentile(samples, 50),
+        'p90': percentile(samples, 90),
+        'p99': percentile(samples, 99),
+        'ops_per_s': len(samples) / wall if wall else 0,
+        'items_per_s': items / wall if wall else 0,
+        'errors': errors,
+    }
+    result.update(memory)
+    return result
+
+
+def run_process(argv, env):
+    """新起一个corecli进程, 返回(秒, exit code, 峰值RSS KB)."""
+    rss_path = env['CORECLI_BENCH_RSS']
+    if os.path.exists(rss_path):
+        os.remove(rss_path)
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', MAIN] + argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    proc.wait()
+    elapsed = time.perf_counter() - start
+    try:
+        with open(rss_path) as f:
+            rss = int(f.read() or 0)
+    except IOError:
+        rss = 0
+    return elapsed, proc.returncode, rss
+
+
+def bench_commands(url, workdir, rounds, only, output=None):
+    config = os.path.join(workdir, 'corecli.json')
+    with open(config, 'w') as f:
+        jsonlib.dump({'citadel_url': url, 'auth_token': 'bench'}, f)
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''), XDG_CACHE_HOME=os.path.join(workdir, 'cache'),
+               CORECLI_BENCH_RSS=os.path.join(workdir, 'peak_rss'))
+    env.pop('CITADEL_CONFIG_PATH', None)
+    prefix = ['--config-path', config, '--output', output] if output else ['--config-path', config]
+
+    scenarios = [('startup', ['--help'])] + list(command_scenarios(workdir).items())
+    results = {}
+    for name, argv in scenarios:
+        key = 'command %s' % name
+        if not _selected(key, only):
+            continue
+        # 先跑一次不算, 免得第一个进程去读磁盘上的.pyc
+        run_process(prefix + argv, env)
+        samples, errors, rss = [], 0, 0
+        start = time.perf_counter()
+        for _ in range(rounds):
+            elapsed, code, maxrss = run_process(prefix + argv, env)
+            samples.append(elapsed)
+            errors += code != 0
+            rss = max(rss, maxrss)
+        results[key] = summarize(samples, time.perf_counter() - start, 0, errors, peak_rss_kb=rss)
+        _report(key, results[key])
+    for name in commands:
+        if name in SKIPPED and _selected('command %s' % name, only):
+            print('%-40s skipped: %s' % ('command %s' % name, SKIPPED[name]))
+    return results
+
+
+def api_scenarios():
+    """[(名字, func(core) -> 处理了多少个元素)]"""
+    def _count(items):
+        return sum(1 for _ in items)
+
+    return [
+        ('get_app', lambda core: len(core.get_app(APP))),
+        ('get_app_releases', lambda core: len(core.get_app_releases(APP))),
+        ('get_release', lambda core: len(core.get_release(APP, SHA))),
+        ('get_app_env', lambda core: len(core.get_app_env(APP, 'prod')['vars'])),
+        ('get_pods', lambda core: len(core.get_pods())),
+        ('get_pod_nodes', lambda core: len(core.get_pod_nodes('pod0'))),
+        ('get_memcap', lambda core: len(core.get_memcap('pod0'))),
+        ('get_app_containers', lambda core: len(core.get_app_containers(APP))),
+        ('iter_app_containers', lambda core: _count(core.iter_app_containers(APP))),
+        ('iter_app_containers fields+model', lambda core: _count(core.iter_app_containers(APP, fields=CONTAINER_FIELDS, model=Container))),
+        ('poll_app_containers 304', lambda core: int(core.poll_app_containers(APP, ETAG)[0] is None)),
+        ('build stream', lambda core: _count(core.build(REPO, SHA))),
+        ('deploy stream', lambda core: _count(core.deploy(REPO, SHA, 'pod0', '', 'web', 1, 536870912, 3))),
+        ('remove stream', lambda core: _count(core.remove(['c1', 'c2', 'c3']))),
+        ('stream_logs', lambda core: _count(core.stream_logs('pod0-node0', APP, reconnect=0))),
+    ]
+
+
+def bench_api(url, requests, concurrency, only):
+    core = CoreAPI(url, auth_token='bench', pool_size=concurrency)
+    results = {}
+    for name, func in api_scenarios():
+        key = 'api %s' % name
+        if not _selected(key, only):
+            continue
+
+        def _call(_):
+            start = time.perf_counter()
+            try:
+                items, error = func(core), 0
+            except Exception:
+                items, error = 0, 1
+            return time.perf_counter() - start, items, error
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # 每个线程先调一次不算, 连接池里的连接都建好
+            list(executor.map(_call, range(concurrency)))
+            start = time.perf_counter()
+            calls = list(executor.map(_call, range(requests)))
+            wall = time.perf_counter() - start
+
+            # tracemalloc会拖慢, 不和计时一起跑
+            tracemalloc.start()
+            try:
+                list(executor.map(_call, range(concurrency)))
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        results[key] = summarize([c[0] for c in calls], wall, sum(c[1] for c in calls), sum(c[2] for c in calls),
+                                 peak_alloc_kb=peak // 1024)
+        _report(key, results[key])
+    return results
+
+
+def _selected(key, only):
+    return not only or any(pattern in key for pattern in only)
+
+
+def _report(key, r):
+    memory = 'rss %6.1f MB' % (r['peak_rss_kb'] / 1024.0) if 'peak_rss_kb' in r else 'alloc %6.1f MB' % (r['peak_alloc_kb'] / 1024.0)
+    print('%-40s p50 %8.1f ms  p90 %8.1f ms  p99 %8.1f ms  %8.1f ops/s  %10.0f items/s  %s  errors %d'
+          % (key, r['p50'] * 1000, r['p90'] * 1000, r['p99'] * 1000, r['ops_per_s'], r['items_per_s'], memory, r['errors']))
+
+
+def compare(results, baseline, threshold, min_delta=0):
+    """返回[(名字, 指标, baseline的值, 这次的值)], 只包括变差超过threshold的."""
+    regressions = []
+    for key, current in sorted(results.items()):
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in METRICS:
+            before, after = base.get(metric), current.get(metric)
+            if not before or after is None or after <= before * (1 + threshold):
+                continue
+            if metric in TIME_METRICS and after - before <= min_delta:
+                continue
+            regressions.append((key, metric, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rounds', type=int, default=5, help='runs of each command')
+    parser.add_argument('--requests', type=int, default=50, help='calls of each CoreAPI method')
+    parser.add_argument('--concurrency', type=int, default=4, help='threads calling CoreAPI at the same time')
+    parser.add_argument('--latency', type=float, default=0.002, help='seconds the stub waits before every response')
+    parser.add_argument('--containers', type=int, default=2000, help='containers of the app, split over the pods')
+    parser.add_argument('--old-containers', type=int, default=20, help='containers of the old release used by upgrade:rolling / release:offline')
+    parser.add_argument('--info-bytes', type=int, default=2000, help='size of the info blob of every container and node')
+    parser.add_argument('--pods', type=int, default=4)
+    parser.add_argument('--nodes', type=int, default=10, help='nodes per pod')
+    parser.add_argument('--releases', type=int, default=100)
+    parser.add_argument('--stream-lines', type=int, default=200, help='lines of every /build and /log stream')
+    parser.add_argument('--stream-rate', type=float, default=0, help='lines per second of streams, 0 for as fast as possible')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests the stub answers with 503')
+    parser.add_argument('--output', default=None, help='--output passed to every command, e.g. json')
+    parser.add_argument('--only', action='append', default=[], help='only run benchmarks whose name contains this, can be repeated')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare with')
+    parser.add_argument('--save-baseline', default=False, action='store_true', help='write the results to --baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slower than baseline by more than this fraction is a regression')
+    parser.add_argument('--min-delta', type=float, default=0.005, help='seconds slower than baseline that are still noise')
+    parser.add_argument('--json', default=None, help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    params = dict((key, getattr(args, key)) for key in ('latency', 'containers', 'old_containers', 'info_bytes', 'pods', 'nodes',
+                                                        'releases', 'stream_lines', 'stream_rate', 'error_rate'))
+    workdir = tempfile.mkdtemp(prefix='corecli-bench-')
+    try:
+        with StubProcess(params) as stub:
+            results = bench_commands(stub.url, workdir, args.rounds, args.only, args.output)
+            results.update(bench_api(stub.url, args.requests, args.concurrency, args.only))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {'params': params, 'python': sys.version.split()[0], 'results': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            jsonlib.dump(report, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            jsonlib.dump(report, f, indent=2, sort_keys=True)
+        print('baseline saved to %s' % args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print('no baseline at %s, run with --save-baseline first' % args.baseline)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = jsonlib.load(f)
+    if baseline.get('params') != params:
+        print('baseline %s was run with different parameters, not comparing' % args.baseline)
+        return 0
+    regressions = compare(results, baseline['results'], args.threshold, args.min_delta)
+    for key, metric, before, after in regressions:
+        print('REGRESSION %-40s %-12s %10.4g -> %10.4g (%+.0f%%)' % (key, metric, before, after, (after / before - 1) * 100))
+    if regressions:
+        return 1
+    print('no regressions against %s (threshold %.0f%%)' % (args.baseline, args.threshold * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
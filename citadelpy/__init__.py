@@ -0,0 +1,617 @@
+# -*- coding: utf-8 -*-
+import copy
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import simplejson as jsonlib
+from requests import Session
+from requests.exceptions import ChunkedEncodingError, ConnectionError as RequestsConnectionError, Timeout
+from urllib3.util.retry import Retry
+
+from citadelpy.stream import CHUNK_SIZE, JSONArrayError, field_spec, iter_json_array, iter_ndjson, loads_raw, project
+from citadelpy.timing import RequestTiming, TimedHTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+# 读流的时候连接断掉 / 超时, 可以重连
+_STREAM_DROPPED = (ChunkedEncodingError, RequestsConnectionError, Timeout)
+
+
+class CoreAPIError(Exception):
+    pass
+
+
+def register_payload(appname, sha, git, branch=None):
+    return {
+        'name': appname,
+        'sha': sha,
+        'git': git,
+        'branch': branch,
+    }
+
+
+def build_payload(repo, sha, artifact='', uid='', **kwargs):
+    payload = {'repo': repo, 'sha': sha, 'artifact': artifact, 'uid': uid}
+    payload.update(kwargs)
+    return payload
+
+
+def deploy_payload(repo, sha, podname, nodename, entrypoint, cpu_quota, memory, count, networks=None, envname=None, extra_env=None, **kwargs):
+    payload = {}
+    payload['repo'] = repo
+    payload['sha'] = sha
+    payload['podname'] = podname
+    payload['nodename'] = nodename
+    payload['entrypoint'] = entrypoint
+    payload['cpu_quota'] = cpu_quota
+    payload['memory'] = memory
+    payload['count'] = count
+    if networks and isinstance(networks, dict):
+        payload['networks'] = networks
+
+    if envname:
+        payload['envname'] = envname
+
+    if extra_env and isinstance(extra_env, (list, tuple)):
+        payload['extra_env'] = list(extra_env)
+
+    payload.update(kwargs)
+    return payload
+
+
+def remove_payload(ids, **kwargs):
+    if not isinstance(ids, (list, tuple)):
+        ids = [ids]
+    payload = {'ids': ids}
+    payload.update(kwargs)
+    return payload
+
+
+def upgrade_payload(ids, repo, sha, **kwargs):
+    if not isinstance(ids, (list, tuple)):
+        ids = [ids]
+    payload = {'ids': ids, 'repo': repo, 'sha': sha}
+    payload.update(kwargs)
+    return payload
+
+
+def _loads(body, fields=None, model=None):
+    """model: citadelpy.models里的类, 返回这个类的对象 (或者list), model.raw_fields保留原始的JSON."""
+    if model is None:
+        value = jsonlib.loads(body)
+        if not fields:
+            return value
+        spec = field_spec(fields)
+        return [project(item, spec) for item in value] if isinstance(value, list) else project(value, spec)
+
+    value = loads_raw(body, model.raw_fields, fields=fields)
+    if isinstance(value, list):
+        return [model.from_dict(item) for item in value]
+    return model.from_dict(value)
+
+
+def _array_parser(fields=None, model=None):
+    """给_stream用的parse, 见iter_json_array."""
+    if model is None:
+        return lambda chunks: iter_json_array(chunks, fields=fields)
+    return lambda chunks: (model.from_dict(item) for item in iter_json_array(chunks, fields=fields, raw=model.raw_fields))
+
+
+class JitterRetry(Retry):
+    """指数退避再乘一个0.5~1.5的随机数, 免得一堆客户端同时重试."""
+
+    def get_backoff_time(self):
+        return super(JitterRetry, self).get_backoff_time() * random.uniform(0.5, 1.5)
+
+
+def _retry(retries, backoff_factor):
+    kwargs = {
+        'total': retries,
+        'backoff_factor': backoff_factor,
+        'status_forcelist': (502, 503, 504),
+        'raise_on_status': False,
+    }
+    # 只有幂等的方法才会在读超时和5xx之后重试, 连接失败的时候请求还没发出去, 什么方法都可以重试
+    try:
+        return JitterRetry(allowed_methods=IDEMPOTENT_METHODS, **kwargs)
+    except TypeError:
+        return JitterRetry(method_whitelist=IDEMPOTENT_METHODS, **kwargs)
+
+
+class CoreAPI:
+
+    def __init__(self, host, version='v1', timeout=None, password='', auth_token='', zone=None, cache=None,
+                 connect_timeout=None, read_timeout=None, pool_size=10, retries=0, backoff_factor=0.3, releases=None):
+        """cache: 一个citadelpy.cache.ResponseCache, 不传就不缓存.
+        releases: 一个citadelpy.releases.ReleaseIndex, find_release先查它, 不传就每次都问citadel.
+        timeout: 连接和读的超时, connect_timeout / read_timeout可以分别覆盖.
+        pool_size: 每个host最多保留多少个keep-alive连接, 多线程用的时候不要小于线程数.
+        retries: GET这种幂等请求失败之后最多重试几次, 退避时间是backoff_factor * 2^n再加上随机抖动.
+        """
+        self.zone = zone
+        self.cache = cache
+        self.releases = releases
+        self.host = host
+        self.version = version
+        self.timeout = timeout
+        if connect_timeout is not None or read_timeout is not None:
+            self.timeout = (connect_timeout if connect_timeout is not None else timeout,
+                            read_timeout if read_timeout is not None else timeout)
+        self.auth_token = auth_token
+
+        self.base = '%s/api/%s' % (self.host, version)
+        # 连接池 (adapter) 是线程安全的, 所有线程共用; Session本身不是, 每个线程一个
+        self.adapter = TimedHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                                        max_retries=_retry(retries, backoff_factor))
+        self._local = threading.local()
+        self.hooks = {'before_request': [], 'after_request': []}
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = Session()
+            session.headers.update({'X-Neptulon-Token': self.auth_token})
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            self._local.session = session
+        return session
+
+    def map(self, method, args_iterable, workers=8):
+        """在workers个线程里并发调用method, 按args_iterable的顺序返回结果, 有异常就抛出第一个.
+        method: 方法名或者callable, 比如'get_app_containers'.
+        args_iterable里每一项: tuple当作位置参数, dict当作关键字参数, 其他的当作唯一的参数.
+        """
+        func = getattr(self, method) if isinstance(method, str) else method
+
+        def _call(args):
+            if isinstance(args, tuple):
+                return func(*args)
+            if isinstance(args, dict):
+                return func(**args)
+            return func(args)
+
+        args_list = list(args_iterable)
+        if not args_list:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(args_list)))) as executor:
+            return list(executor.map(_call, args_list))
+
+    def pool_stats(self):
+        """连接复用情况, connections是新建的连接数, reused是复用已有连接的请求数."""
+        connections = requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            requests += pool.num_requests
+        return {'connections': connections, 'requests': requests, 'reused': max(0, requests - connections)}
+
+    def with_zone(self, zone):
+        """返回一个指向另一个zone的CoreAPI, 共用同一个session."""
+        api = copy.copy(self)
+        api.zone = zone
+        return api
+
+    def fork(self, zone=None, cache=None):
+        """返回一个共用连接池的CoreAPI, zone和cache另外指定, hook不共享.
+        corecli daemon每个命令用一个, 连接可以一直复用下去.
+        """
+        api = copy.copy(self)
+        api.zone = zone
+        api.cache = cache
+        api.hooks = {'before_request': [], 'after_request': []}
+        return api
+
+    def add_hook(self, event, func):
+        """event: 'before_request'或者'after_request', func(timing)会拿到一个citadelpy.timing.RequestTiming.
+        after_request在请求结束之后调用, 出错了也会调用, 流接口是在流读完之后.
+        """
+        self.hooks[event].append(func)
+
+    def _before_request(self, method, path, params):
+        if not self.hooks['before_request'] and not self.hooks['after_request']:
+            return None
+        timing = RequestTiming(method, path, params)
+        for hook in self.hooks['before_request']:
+            hook(timing)
+        return timing
+
+    def _after_request(self, timing):
+        if timing is None:
+            return
+        timing.finish()
+        for hook in self.hooks['after_request']:
+            hook(timing)
+
+    def request(self, path, method='GET', params=None, data=None, json=None, fields=None, model=None, **kwargs):
+        """Wrap around requests.request method
+        fields: 只要返回的object (或者list里每个object) 的这些key, 可以用a.b.c指定嵌套的key.
+        会作为fields参数发给citadel, citadel不支持的话在本地去掉别的key.
+        model: 返回citadelpy.models里的这个类的对象, 不返回dict.
+        """
+        url = self.base + path
+        params = dict(params or {})
+        if fields:
+            params['fields'] = ','.join(fields)
+        timing = self._before_request(method, path, params)
+        try:
+            return self._request(url, path, method, params, data, json, timing, fields, model, **kwargs)
+        except Exception as e:
+            if timing is not None:
+                timing.error = str(e)
+            raise
+        finally:
+            self._after_request(timing)
+
+    def _request(self, url, path, method, params, data, json, timing, fields, model, **kwargs):
+        cache_key = entry = None
+        if self.cache is not None and method == 'GET' and self.cache.ttl(path) is not None:
+            cache_key = self.cache.key(self.zone, path, params)
+            entry = self.cache.get(cache_key)
+            if entry is not None and entry.fresh:
+                if timing is not None:
+                    timing.cached = True
+                return self._decode(entry.body, timing, fields, model)
+            if entry is not None and entry.etag:
+                kwargs['headers'] = dict(kwargs.get('headers') or {}, **{'If-None-Match': entry.etag})
+
+        params['zone'] = self.zone
+        resp = self.session.request(url=url,
+                                    method=method,
+                                    params=params,
+                                    data=data,
+                                    json=json,
+                                    timeout=self.timeout,
+                                    **kwargs)
+        if timing is not None:
+            timing.headers_received(resp)
+            timing.body_received(len(resp.content))
+
+        code = resp.status_code
+        if code == 304 and entry is not None:
+            self.cache.touch(cache_key, path)
+            if timing is not None:
+                timing.cached = True
+            return self._decode(entry.body, timing, fields, model)
+        if code != 200:
+            raise CoreAPIError('Citadel internal error: code {}, body {}'.format(code, resp.text))
+        try:
+            responson = self._decode(resp.text, timing, fields, model)
+        except ValueError:
+            raise CoreAPIError('Citadel did not return json, code {}, body {}'.format(resp.status_code, resp.text))
+        if cache_key is not None:
+            self.cache.set(cache_key, self.zone, path, resp.text, resp.headers.get('ETag'))
+        return responson
+
+    @staticmethod
+    def _decode(body, timing, fields=None, model=None):
+        if timing is None:
+            return _loads(body, fields, model)
+        start = time.perf_counter()
+        try:
+            return _loads(body, fields, model)
+        finally:
+            timing.decode += time.perf_counter() - start
+
+    def _invalidate(self, prefix='/'):
+        if self.cache is not None:
+            self.cache.invalidate(self.zone, prefix)
+
+    def _invalidate_after(self, stream, prefix='/'):
+        try:
+            for m in stream:
+                yield m
+        finally:
+            self._invalidate(prefix)
+
+    def request_stream(self, path, method='GET', params=None, data=None, json=None, **kwargs):
+        # 坏行和空行在iter_ndjson里记warning跳过, 一条坏消息不值得中断整个build/deploy
+        return self._stream(path, method, params, data, json, iter_ndjson)
+
+    def request_array(self, path, params=None, page_size=None, fields=None, model=None):
+        """GET一个返回JSON数组的接口, 边下载边产生数组里的元素, 不会把整个数组读进内存.
+        不走缓存. page_size: 带上start / limit分页请求, 每页一个请求;
+        citadel不支持分页 (忽略了这两个参数) 的时候也能得到正确的结果.
+        fields, model: 同request.
+        """
+        params = dict(params or {})
+        if fields:
+            params['fields'] = ','.join(fields)
+        parse = _array_parser(fields, model)
+
+        if not page_size:
+            for item in self._stream(path, 'GET', params, None, None, parse):
+                yield item
+            return
+
+        start = 0
+        first = None
+        while True:
+            count = 0
+            page = dict(params, start=start, limit=page_size)
+            for item in self._stream(path, 'GET', page, None, None, parse):
+                if count == 0:
+                    if start == 0:
+                        first = item
+                    elif item == first:
+                        # 又从头返回了, 说明不支持分页, 第一页已经是全部了
+                        return
+                count += 1
+                yield item
+            # 一页比page_size多, 也是不支持分页, 已经全部返回了
+            if count != page_size:
+                return
+            start += page_size
+
+    def poll_array(self, path, etag=None, params=None, fields=None, model=None):
+        """带If-None-Match GET一个返回JSON数组的接口, 返回(元素的list, ETag).
+        和上次一样 (304) 的时候list是None, citadel不返回ETag的时候ETag是None.
+        fields, model: 同request.
+        """
+        params = dict(params or {})
+        if fields:
+            params['fields'] = ','.join(fields)
+        headers = {'If-None-Match': etag} if etag else None
+        response = {}
+        items = list(self._stream(path, 'GET', params, None, None, _array_parser(fields, model),
+                                  headers=headers, response=response))
+        if response['status'] == 304:
+            return None, etag
+        return items, response['etag']
+
+    def _stream(self, path, method, params, data, json, parse, headers=None, response=None):
+        """response: 传一个dict进来的话会填上status和etag."""
+        url = self.base + path
+        params = dict(params or {}, zone=self.zone)
+        timing = self._before_request(method, path, params)
+        try:
+            resp = self.session.request(url=url,
+                                        method=method,
+                                        params=params,
+                                        data=data,
+                                        json=json,
+                                        headers=headers,
+                                        timeout=self.timeout,
+                                        stream=True)
+            if timing is not None:
+                timing.headers_received(resp)
+
+            code = resp.status_code
+            if response is not None:
+                response['status'] = code
+                response['etag'] = resp.headers.get('ETag')
+            if code == 304 and headers and 'If-None-Match' in headers:
+                return
+            if code != 200:
+                raise CoreAPIError('Citadel internal error: code {}, body {}'.format(code, resp.text))
+            try:
+                for m in parse(self._count_bytes(resp.iter_content(CHUNK_SIZE), timing)):
+                    yield m
+            except JSONArrayError as e:
+                raise CoreAPIError('Citadel did not return a json array: {}'.format(e))
+        except Exception as e:
+            if timing is not None:
+                timing.error = str(e)
+            raise
+        finally:
+            self._after_request(timing)
+
+    @staticmethod
+    def _count_bytes(chunks, timing):
+        if timing is None:
+            for chunk in chunks:
+                yield chunk
+            return
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        timing.body_received(size)
+
+    def get_app(self, appname):
+        return self.request('/app/%s' % appname)
+
+    def get_app_containers(self, appname, fields=None, model=None):
+        return self.request('/app/%s/containers' % appname, fields=fields, model=model)
+
+    def iter_app_containers(self, appname, page_size=None, fields=None, model=None):
+        """同get_app_containers, 一个一个地产生容器, 见request_array."""
+        return self.request_array('/app/%s/containers' % appname, page_size=page_size, fields=fields, model=model)
+
+    def poll_app_containers(self, appname, etag=None, fields=None, model=None):
+        """同get_app_containers, 见poll_array."""
+        return self.poll_array('/app/%s/containers' % appname, etag, fields=fields, model=model)
+
+    def get_app_releases(self, appname, model=None):
+        return self.request('/app/%s/releases' % appname, model=model)
+
+    def get_app_envs(self, appname):
+        return self.request('/app/%s/env' % appname)
+
+    def get_app_env(self, appname, envname):
+        return self.request('/app/%s/env/%s' % (appname, envname))
+
+    def set_app_env(self, appname, envname, **kwargs):
+        try:
+            return self.request('/app/%s/env/%s' % (appname, envname), method='PUT', json=kwargs)
+        finally:
+            self._invalidate('/app/%s' % appname)
+
+    def delete_app_env(self, appname, envname):
+        try:
+            return self.request('/app/%s/env/%s' % (appname, envname), method='DELETE')
+        finally:
+            self._invalidate('/app/%s' % appname)
+
+    def get_release(self, appname, sha, model=None):
+        return self.request('/app/%s/version/%s' % (appname, sha), model=model)
+
+    def get_release_containers(self, appname, sha, fields=None, model=None):
+        return self.request('/app/%s/version/%s/containers' % (appname, sha), fields=fields, model=model)
+
+    def iter_release_containers(self, appname, sha, page_size=None, fields=None, model=None):
+        """同get_release_containers, 一个一个地产生容器, 见request_array."""
+        return self.request_array('/app/%s/version/%s/containers' % (appname, sha), page_size=page_size, fields=fields, model=model)
+
+    def poll_release_containers(self, appname, sha, etag=None, fields=None, model=None):
+        """同get_release_containers, 见poll_array."""
+        return self.poll_array('/app/%s/version/%s/containers' % (appname, sha), etag, fields=fields, model=model)
+
+    def sync_releases(self, appname):
+        """用/app/<name>/releases刷新本地的release索引, 带着上次的ETag, 没变就不用下载."""
+        if self.releases is None:
+            return
+        releases, etag = self.poll_array('/app/%s/releases' % appname, self.releases.etag(self.zone, appname))
+        if releases is not None:
+            self.releases.update(self.zone, appname, releases, etag)
+
+    def find_release(self, appname, sha):
+        """返回{'sha', 'image', 'created'}, 没有这个release返回None, sha可以是前缀.
+        本地索引里有而且镜像已经build好的时候不发请求, 否则先刷新索引再找.
+        """
+        if self.releases is None:
+            matches = [r for r in self.get_app_releases(appname) if r['sha'].startswith(sha)]
+            return matches[0] if len(matches) == 1 else None
+
+        release = self.releases.find(self.zone, appname, sha)
+        if release is None or not release.image:
+            self.sync_releases(appname)
+            release = self.releases.find(self.zone, appname, sha)
+        if release is None:
+            return None
+        return {'sha': release.sha, 'image': release.image, 'created': release.created}
+
+    def register_release(self, appname, sha, git, branch=None):
+        payload = register_payload(appname, sha, git, branch=branch)
+        try:
+            result = self.request('/app/register', method='POST', json=payload)
+        finally:
+            self._invalidate('/app/%s' % appname)
+        if self.releases is not None:
+            self.releases.update(self.zone, appname, [{'sha': sha}], complete=False)
+        return result
+
+    def get_container(self, container_id):
+        return self.request('/container/%s' % container_id)
+
+    def get_networks(self):
+        raise NotImplementedError('/api/v1/network has been removed, please use /pod/[podname]/networks')
+
+    def get_pod_networks(self, podname):
+        return self.request('/pod/{}/networks'.format(podname))
+
+    def get_pods(self):
+        return self.request('/pod')
+
+    def get_pod(self, podname):
+        return self.request('/pod/%s' % podname)
+
+    def get_pod_nodes(self, podname, model=None):
+        return self.request('/pod/%s/nodes' % podname, model=model)
+
+    def get_pod_containers(self, podname, fields=None, model=None):
+        return self.request('/pod/%s/containers' % podname, fields=fields, model=model)
+
+    def iter_pod_containers(self, podname, page_size=None, fields=None, model=None):
+        """同get_pod_containers, 一个一个地产生容器, 见request_array."""
+        return self.request_array('/pod/%s/containers' % podname, page_size=page_size, fields=fields, model=model)
+
+    def poll_pod_containers(self, podname, etag=None, fields=None, model=None):
+        """同get_pod_containers, 见poll_array."""
+        return self.poll_array('/pod/%s/containers' % podname, etag, fields=fields, model=model)
+
+    def get_memcap(self, podname):
+        return self.request('/pod/%s/getmemcap' % podname)
+
+    def sync_memcap(self, podname):
+        return self.request('/pod/%s/syncmemcap' % podname, method='POST')
+
+    def build(self, repo, sha, artifact='', uid='', **kwargs):
+        """把一个仓库打包成可以部署的镜像.
+        repo: 仓库地址, 如git@github.com:name/project.git.
+        sha: 要打包的版本号, git sha值.
+        artifact: 一些可能需要的其他文件, 是一个URL, 例如 gitlab.com/api/v3/project/:name/build/:build/artifacts.
+        uid: 镜像内部对应的用户的uid, 不传的话默认使用app的id.
+        """
+        payload = build_payload(repo, sha, artifact, uid, **kwargs)
+        return self.request_stream('/build', method='POST', json=payload)
+
+    def deploy(self, repo, sha, podname, nodename, entrypoint, cpu_quota, memory, count, networks=None, envname=None, extra_env=None, **kwargs):
+        """部署一个仓库.
+        repo: 仓库地址, 如git@github.com:name/project.git.
+        sha: 要部署的版本号, git sha值.
+        podname: 要部署的区域, 例如dev, 或者nova.
+        entrypoint: 对应app.yaml里的entrypoints的名字.
+        cpu_quota: 需要的cpu个数, 例如1, 或者1.5, 如果是public的部署, 传0.
+        memory: 最小4MB.
+        networks: 要绑定的网络, 例如{'10.102.0.0/16': '10.102.2.37'}, key是CIDR, value是IP.
+                  意思是绑定CIDR里的这个IP. 如果随机选择不指定IP, IP传空字符串''.
+        envname: 要注入的一组环境变量的名字, 例如dev, 会把名字为dev的这一组环境变量注入容器.
+        extra_env: 额外需要注入的环境变量, 格式是['ENV_NAME1=value1', 'ENV_NAME2=key2=value2'].
+        """
+        payload = deploy_payload(repo, sha, podname, nodename, entrypoint, cpu_quota, memory, count, networks, envname, extra_env, **kwargs)
+        return self._invalidate_after(self.request_stream('/deploy', method='POST', json=payload), '/pod/%s' % podname)
+
+    def remove(self, ids, **kwargs):
+        """删除这些容器.
+        ids: 容器ID, 需要填写完整的64个字符的字符串ID, 是一个list.
+        """
+        payload = remove_payload(ids, **kwargs)
+        # 只有容器ID, 不知道影响了哪个app/pod, 整个zone的缓存都不要了
+        return self._invalidate_after(self.request_stream('/remove', method='POST', json=payload))
+
+    def upgrade(self, ids, repo, sha, **kwargs):
+        """更新这些容器. 把ids的容器按照原来的规格部署, 但是镜像替换成repo+sha组合确定的镜像.
+        ids: 容器ID, 需要填写完整的64个字符的字符串ID, 是一个list.
+        repo: 仓库地址, 如git@github.com:name/project.git.
+        sha: 要打包的版本号, git sha值.
+        """
+        payload = upgrade_payload(ids, repo, sha, **kwargs)
+        return self._invalidate_after(self.request_stream('/upgrade', method='POST', json=payload))
+
+    def stream_logs(self, nodename, appname, entrypoint=None, container=None, type=None, since=None, reconnect=5, backoff=0.5):
+        """一直产生nodename上appname的日志, 每条是{'datetime', 'type', 'entrypoint', 'id', 'ident', 'data'}.
+        entrypoint / container / type: 只要这些日志, 作为参数发给citadel在服务端过滤.
+        since: 从这个时间开始.
+        连接断了会带上最后一条的datetime作为since重新连, 重连回来的和已经产生过的重复的会被去掉.
+        连续reconnect次都连不上就抛CoreAPIError, 两次之间等backoff * 2^n秒, 最多10秒.
+        """
+        params = dict((key, value) for key, value in (('entrypoint', entrypoint), ('container', container), ('type', type)) if value)
+        path = '/log/%s/%s' % (nodename, appname)
+        last, seen = since, set()
+        failures = 0
+        while True:
+            if last:
+                params['since'] = last
+            try:
+                for m in self.request_stream(path, params=params):
+                    ts = m.get('datetime')
+                    if ts is not None:
+                        if last is not None and ts < last:
+                            continue
+                        # 同一个时间可能有好几条, 记下来, 重连回来的时候去重
+                        key = (m.get('id'), m.get('data'))
+                        if ts != last:
+                            last, seen = ts, set()
+                        elif key in seen:
+                            continue
+                        seen.add(key)
+                    failures = 0
+                    yield m
+                return
+            except _STREAM_DROPPED as e:
+                failures += 1
+                if failures > reconnect:
+                    raise CoreAPIError('log stream of %s on %s dropped: %s' % (appname, nodename, e))
+                delay = min(backoff * 2 ** (failures - 1), 10)
+                logger.warning('log stream of %s on %s dropped, reconnect in %.1fs: %s', appname, nodename, delay, e)
+                time.sleep(delay)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""asyncio flavour of CoreAPI, needs python 3.6+ and aiohttp.
+
+    async with AsyncCoreAPI(host, auth_token=token) as core:
+        apps = await asyncio.gather(*[core.get_app(name) for name in names])
+        async for m in core.deploy(...):
+            print(m)
+"""
+import logging
+
+import aiohttp
+import simplejson as jsonlib
+
+from citadelpy import CoreAPIError, build_payload, deploy_payload, register_payload, remove_payload, upgrade_payload
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCoreAPI:
+
+    def __init__(self, host, version='v1', timeout=None, password='', auth_token='', zone=None, limit_per_host=10, keepalive_timeout=30):
+        """limit_per_host: 对同一个citadel最多同时开多少个连接, 超过的请求会排队.
+        keepalive_timeout: 空闲的keep-alive连接保留多少秒.
+        """
+        self.zone = zone
+        self.host = host
+        self.version = version
+        self.timeout = timeout
+        self.auth_token = auth_token
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+
+        self.base = '%s/api/%s' % (self.host, version)
+        self._session = None
+
+    @property
+    def session(self):
+        # ClientSession has to be created inside a running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=0,
+                                             limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  headers={'X-Neptulon-Token': self.auth_token},
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                                  json_serialize=jsonlib.dumps)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _params(self, params):
+        params = dict(params or {})
+        # aiohttp refuses None values, requests silently drops them
+        if self.zone is not None:
+            params['zone'] = self.zone
+        return params
+
+    async def request(self, path, method='GET', params=None, data=None, json=None, **kwargs):
+        """Wrap around aiohttp request, same contract as CoreAPI.request"""
+        url = self.base + path
+        async with self.session.request(method, url, params=self._params(params), data=data, json=json, **kwargs) as resp:
+            body = await resp.text()
+            code = resp.status
+        if code != 200:
+            raise CoreAPIError('Citadel internal error: code {}, body {}'.format(code, body))
+        try:
+            responson = jsonlib.loads(body)
+        except ValueError:
+            raise CoreAPIError('Citadel did not return json, code {}, body {}'.format(code, body))
+        return responson
+
+    async def request_stream(self, path, method='GET', params=None, data=None, json=None, **kwargs):
+        url = self.base + path
+        async with self.session.request(method, url, params=self._params(params), data=data, json=json, **kwargs) as resp:
+            code = resp.status
+            if code != 200:
+                body = await resp.text()
+                raise CoreAPIError('Citadel internal error: code {}, body {}'.format(code, body))
+            async for line in resp.content:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield jsonlib.loads(line)
+                except (ValueError, TypeError):
+                    raise CoreAPIError(line)
+
+    async def get_app(self, appname):
+        return await self.request('/app/%s' % appname)
+
+    async def get_app_containers(self, appname):
+        return await self.request('/app/%s/containers' % appname)
+
+    async def get_app_releases(self, appname):
+        return await self.request('/app/%s/releases' % appname)
+
+    async def get_app_envs(self, appname):
+        return await self.request('/app/%s/env' % appname)
+
+    async def get_app_env(self, appname, envname):
+        return await self.request('/app/%s/env/%s' % (appname, envname))
+
+    async def set_app_env(self, appname, envname, **kwargs):
+        return await self.request('/app/%s/env/%s' % (appname, envname), method='PUT', json=kwargs)
+
+    async def delete_app_env(self, appname, envname):
+        return await self.request('/app/%s/env/%s' % (appname, envname), method='DELETE')
+
+    async def get_release(self, appname, sha):
+        return await self.request('/app/%s/version/%s' % (appname, sha))
+
+    async def get_release_containers(self, appname, sha):
+        return await self.request('/app/%s/version/%s/containers' % (appname, sha))
+
+    async def register_release(self, appname, sha, git, branch=None):
+        payload = register_payload(appname, sha, git, branch=branch)
+        return await self.request('/app/register', method='POST', json=payload)
+
+    async def get_container(self, container_id):
+        return await self.request('/container/%s' % container_id)
+
+    async def get_pod_networks(self, podname):
+        return await self.request('/pod/{}/networks'.format(podname))
+
+    async def get_pods(self):
+        return await self.request('/pod')
+
+    async def get_pod(self, podname):
+        return await self.request('/pod/%s' % podname)
+
+    async def get_pod_nodes(self, podname):
+        return await self.request('/pod/%s/nodes' % podname)
+
+    async def get_pod_containers(self, podname):
+        return await self.request('/pod/%s/containers' % podname)
+
+    async def get_memcap(self, podname):
+        return await self.request('/pod/%s/getmemcap' % podname)
+
+    async def sync_memcap(self, podname):
+        return await self.request('/pod/%s/syncmemcap' % podname, method='POST')
+
+    def build(self, repo, sha, artifact='', uid='', **kwargs):
+        """同CoreAPI.build, 返回async iterator."""
+        payload = build_payload(repo, sha, artifact, uid, **kwargs)
+        return self.request_stream('/build', method='POST', json=payload)
+
+    def deploy(self, repo, sha, podname, nodename, entrypoint, cpu_quota, memory, count, networks=None, envname=None, extra_env=None, **kwargs):
+        """同CoreAPI.deploy, 返回async iterator."""
+        payload = deploy_payload(repo, sha, podname, nodename, entrypoint, cpu_quota, memory, count, networks, envname, extra_env, **kwargs)
+        return self.request_stream('/deploy', method='POST', json=payload)
+
+    def remove(self, ids, **kwargs):
+        """同CoreAPI.remove, 返回async iterator."""
+        return self.request_stream('/remove', method='POST', json=remove_payload(ids, **kwargs))
+
+    def upgrade(self, ids, repo, sha, **kwargs):
+        """同CoreAPI.upgrade, 返回async iterator."""
+        return self.request_stream('/upgrade', method='POST', json=upgrade_payload(ids, repo, sha, **kwargs))
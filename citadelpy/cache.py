@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""本地磁盘上的响应缓存, 只缓存很少变化的只读接口.
+
+数据放在一个sqlite文件里, 可以被多个corecli进程同时使用.
+key是zone + path + params, 每个接口有自己的TTL, 总条数超过max_entries
+的时候按最近访问时间淘汰. 过期的条目如果有ETag, 会带上If-None-Match去
+citadel确认一下, 返回304就直接续期.
+"""
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import namedtuple
+from contextlib import closing
+
+import simplejson as jsonlib
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'corecli', 'responses.sqlite')
+
+# (path pattern, ttl seconds), 第一个匹配的生效, 不在这里的接口不缓存
+DEFAULT_TTLS = (
+    (r'^/pod$', 300),
+    (r'^/pod/[^/]+$', 300),
+    (r'^/pod/[^/]+/networks$', 300),
+    (r'^/app/[^/]+$', 60),
+    (r'^/app/[^/]+/releases$', 60),
+)
+
+CacheEntry = namedtuple('CacheEntry', ['body', 'etag', 'fresh'])
+
+
+class ResponseCache:
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=1000, ttls=None, refresh=False):
+        """ttls: 额外的{path pattern: ttl}, 会覆盖DEFAULT_TTLS里同样的pattern.
+        refresh: 为True的时候不使用没过期的条目, 每次都去citadel确认, 但是仍然会写缓存.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.refresh = refresh
+
+        overrides = dict(ttls or {})
+        rules = [(pattern, overrides.pop(pattern, ttl)) for pattern, ttl in DEFAULT_TTLS]
+        rules = list(overrides.items()) + rules
+        self._ttls = [(re.compile(pattern), ttl) for pattern, ttl in rules]
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._initialized:
+            conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                         'key TEXT PRIMARY KEY, zone TEXT, path TEXT, etag TEXT, body TEXT, '
+                         'expires_at REAL, accessed_at REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def ttl(self, path):
+        """返回path的TTL, None表示这个接口不缓存."""
+        for pattern, ttl in self._ttls:
+            if pattern.match(path):
+                return ttl
+        return None
+
+    @staticmethod
+    def key(zone, path, params=None):
+        return jsonlib.dumps([zone or '', path, params or {}], sort_keys=True)
+
+    def get(self, key):
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute('SELECT body, etag, expires_at FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+                conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning('response cache read failed: %s', e)
+            return None
+
+        body, etag, expires_at = row
+        return CacheEntry(body, etag, not self.refresh and expires_at > now)
+
+    def set(self, key, zone, path, body, etag=None):
+        ttl = self.ttl(path)
+        if ttl is None:
+            return
+
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (key, zone or '', path, etag, body, now + ttl, now))
+                conn.execute('DELETE FROM responses WHERE key IN ('
+                             'SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                             (self.max_entries,))
+                conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning('response cache write failed: %s', e)
+
+    def touch(self, key, path):
+        """304之后续期."""
+        ttl = self.ttl(path)
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute('UPDATE responses SET expires_at = ?, accessed_at = ? WHERE key = ?', (now + (ttl or 0), now, key))
+                conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning('response cache write failed: %s', e)
+
+    def invalidate(self, zone, prefix='/'):
+        """删掉zone下path等于prefix或者在prefix下面的所有条目, prefix为'/'就是整个zone."""
+        prefix = prefix.rstrip('/')
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute("DELETE FROM responses WHERE zone = ? AND (path = ? OR substr(path, 1, ?) = ?)",
+                             (zone or '', prefix, len(prefix) + 1, prefix + '/'))
+                conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning('response cache invalidate failed: %s', e)
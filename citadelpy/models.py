@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""容器, release, 节点的轻量表示.
+
+列表接口一次返回上万个容器的时候, 每个容器一个嵌套的dict很占内存, 大部分字段
+也用不到. 这里用__slots__只存表格里要用的字段, 大块的info / specs保留原始的JSON
+(bytes), 访问的时候才解析. CoreAPI的方法传model=Container之类的参数就返回这些对象,
+直接从响应里的原始JSON构造, info不会以dict的形式留在内存里.
+"""
+import simplejson as jsonlib
+
+
+def _raw(value):
+    """bytes是原始的JSON, 原样保留; 已经解析过的值重新编码成紧凑的JSON."""
+    if value is None or isinstance(value, bytes):
+        return value
+    return jsonlib.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def _parse(raw):
+    return jsonlib.loads(raw) if raw else None
+
+
+class _Model:
+
+    __slots__ = ()
+
+    # 用来算hash的字段, 相等的对象这些字段一定相等
+    key_fields = ()
+
+    def __eq__(self, other):
+        # 原始JSON的空格, 转义可能不一样, 比较解析出来的值
+        if type(self) is not type(other):
+            return False
+        return all(getattr(self, k.lstrip('_')) == getattr(other, k.lstrip('_')) for k in self.__slots__)
+
+    def __hash__(self):
+        return hash((type(self).__name__,) + tuple(getattr(self, k) for k in self.key_fields))
+
+
+class Container(_Model):
+
+    __slots__ = ('name', 'container_id', 'nodename', 'podname', 'appname', 'sha', 'entrypoint', 'env', 'cpu_quota', '_info')
+
+    # 这些key在解析的时候保留原始的JSON, 见citadelpy.stream.decode_object
+    raw_fields = ('info',)
+    key_fields = ('container_id',)
+
+    def __init__(self, name='', container_id='', nodename='', podname='', appname='', sha='', entrypoint='', env='',
+                 cpu_quota=None, info=None):
+        self.name = name
+        self.container_id = container_id
+        self.nodename = nodename
+        self.podname = podname
+        self.appname = appname
+        self.sha = sha
+        self.entrypoint = entrypoint
+        self.env = env
+        self.cpu_quota = cpu_quota
+        self._info = _raw(info)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d.get('name') or '', d.get('container_id') or '', d.get('nodename') or '', d.get('podname') or '',
+                   d.get('appname') or '', d.get('sha') or '', d.get('entrypoint') or '', d.get('env') or '',
+                   d.get('cpu_quota'), d.get('info'))
+
+    @property
+    def info(self):
+        """docker inspect的结果, 每次访问都重新解析, 不会缓存."""
+        return _parse(self._info) or {}
+
+    @property
+    def networks(self):
+        """{网络名: {'IPAddress': ...}}"""
+        settings = self.info.get('NetworkSettings') or {}
+        return settings.get('Networks') or {}
+
+    def __repr__(self):
+        return '<Container %s %s>' % (self.name, self.container_id[:7])
+
+
+class Release(_Model):
+
+    __slots__ = ('appname', 'sha', 'image', 'created', '_specs')
+
+    raw_fields = ('specs',)
+    key_fields = ('appname', 'sha')
+
+    def __init__(self, appname='', sha='', image='', created='', specs=None):
+        self.appname = appname
+        self.sha = sha
+        self.image = image
+        self.created = created
+        self._specs = _raw(specs)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d.get('appname') or d.get('name') or '', d.get('sha') or '', d.get('image') or '',
+                   d.get('created') or '', d.get('specs'))
+
+    @property
+    def specs(self):
+        return _parse(self._specs)
+
+    def __repr__(self):
+        return '<Release %s %s>' % (self.appname, self.sha[:7])
+
+
+class Node(_Model):
+
+    __slots__ = ('name', 'podname', 'endpoint', 'available', 'cpu', 'memory', '_info')
+
+    raw_fields = ('info',)
+    key_fields = ('podname', 'name')
+
+    def __init__(self, name='', podname='', endpoint='', available=True, cpu=None, memory=None, info=None):
+        self.name = name
+        self.podname = podname
+        self.endpoint = endpoint
+        self.available = available
+        self.cpu = cpu
+        self.memory = memory
+        self._info = _raw(info)
+
+    @classmethod
+    def from_dict(cls, d):
+        available = d.get('available')
+        return cls(d.get('name') or '', d.get('podname') or '', d.get('endpoint') or '',
+                   True if available is None else bool(available), d.get('cpu'), d.get('memory'), d.get('info'))
+
+    @property
+    def info(self):
+        """docker info的结果, 访问的时候才解析."""
+        return _parse(self._info) or {}
+
+    def __repr__(self):
+        return '<Node %s>' % self.name
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""本地的release索引: 每个app有哪些release, 镜像有没有build好.
+
+数据放在一个sqlite文件里, 可以被多个corecli进程同时使用. 从/app/<name>/releases
+填进来, 之后带着上次的ETag增量刷新, 没变就不用下载. register / build成功之后
+也会直接记进来.
+"""
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from citadelpy.models import Release
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'corecli', 'releases.sqlite')
+
+
+class ReleaseIndex:
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._initialized:
+            conn.execute('CREATE TABLE IF NOT EXISTS releases ('
+                         'zone TEXT, appname TEXT, sha TEXT, image TEXT, created TEXT, '
+                         'PRIMARY KEY (zone, appname, sha))')
+            conn.execute('CREATE TABLE IF NOT EXISTS apps (zone TEXT, appname TEXT, etag TEXT, synced_at REAL, '
+                         'PRIMARY KEY (zone, appname))')
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def find(self, zone, appname, sha):
+        """sha可以是前缀, 返回citadelpy.models.Release, 没有或者前缀对应多个release的时候返回None."""
+        try:
+            with closing(self._connect()) as conn:
+                rows = conn.execute('SELECT appname, sha, image, created FROM releases '
+                                    'WHERE zone = ? AND appname = ? AND substr(sha, 1, ?) = ? LIMIT 2',
+                                    (zone or '', appname, len(sha), sha)).fetchall()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning('release index read failed: %s', e)
+            return None
+        return Release(*rows[0]) if len(rows) == 1 else None
+
+    def etag(self, zone, appname):
+        """上次同步的ETag, 没同步过返回None."""
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute('SELECT etag FROM apps WHERE zone = ? AND appname = ?', (zone or '', appname)).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning('release index read failed: %s', e)
+            return None
+        return row[0] if row else None
+
+    def update(self, zone, appname, releases, etag=None, complete=True):
+        """releases: /app/<name>/releases的结果. complete为True的时候这是app的全部release,
+        不在里面的会被删掉, 同时记下etag.
+        """
+        rows = [(zone or '', appname, r['sha'], r.get('image') or '', r.get('created') or '') for r in releases]
+        try:
+            with closing(self._connect()) as conn:
+                if complete:
+                    conn.execute('DELETE FROM releases WHERE zone = ? AND appname = ?', (zone or '', appname))
+                    conn.execute('INSERT OR REPLACE INTO apps VALUES (?, ?, ?, ?)', (zone or '', appname, etag, time.time()))
+                # 只知道有这个release, 不知道镜像的时候不要把已经记下的镜像冲掉
+                conn.executemany('INSERT INTO releases VALUES (?, ?, ?, ?, ?) ON CONFLICT (zone, appname, sha) DO UPDATE SET '
+                                 "image = CASE WHEN excluded.image != '' THEN excluded.image ELSE image END, "
+                                 "created = CASE WHEN excluded.created != '' THEN excluded.created ELSE created END", rows)
+                conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning('release index write failed: %s', e)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""流式解析citadel返回的NDJSON (一行一个JSON) 和JSON数组.
+
+数据按大块读进一个复用的bytearray, 用memoryview切出每一行直接交给JSON
+解析, 不会为每一行再生成一个字符串. 装了orjson就用orjson, 否则用simplejson.
+"""
+import codecs
+import logging
+import re
+
+import simplejson as jsonlib
+from simplejson.decoder import scanstring
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class NDJSONError(ValueError):
+    pass
+
+
+class JSONArrayError(ValueError):
+    pass
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def _simplejson_loads(line):
+    return jsonlib.loads(line.tobytes())
+
+
+def default_loads():
+    """orjson能直接解析memoryview, simplejson需要先变成bytes."""
+    return orjson.loads if orjson is not None else _simplejson_loads
+
+
+def iter_ndjson(chunks, loads=None, strict=False):
+    """chunks: 产生bytes的iterable, 比如resp.iter_content(CHUNK_SIZE).
+    空行 (keep-alive) 会被跳过. 坏掉的行, 以及流结束时不完整的最后一行,
+    strict为False的时候记一条warning然后跳过, 为True的时候抛NDJSONError.
+    """
+    loads = loads or default_loads()
+    buf = bytearray()
+    skip = object()
+
+    def _bad_line(line):
+        raw = line.tobytes()
+        if raw.strip():
+            if strict:
+                raise NDJSONError(raw)
+            logger.warning('skip bad line in stream: %r', raw[:200])
+        return skip
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buf += chunk
+        start = 0
+        find = buf.find
+        view = memoryview(buf)
+        try:
+            while True:
+                end = find(b'\n', start)
+                if end < 0:
+                    break
+                line = view[start:end]
+                start = end + 1
+                try:
+                    record = loads(line)
+                except ValueError:
+                    record = _bad_line(line)
+                line.release()
+                if record is not skip:
+                    yield record
+        finally:
+            view.release()
+        # 剩下的半行留在buf开头等下一块
+        del buf[:start]
+
+    if buf:
+        view = memoryview(buf)
+        try:
+            try:
+                record = loads(view)
+            except ValueError:
+                record = _bad_line(view)
+        finally:
+            view.release()
+        if record is not skip:
+            yield record
+
+
+def field_spec(fields):
+    """['name', 'info.NetworkSettings.Networks'] -> {'name': True, 'info': {'NetworkSettings': {'Networks': True}}}"""
+    spec = {}
+    for field in fields:
+        node = spec
+        parts = field.split('.')
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+            if node is True:
+                break
+        else:
+            node[parts[-1]] = True
+    return spec
+
+
+def project(value, spec):
+    """只保留spec (field_spec的结果) 里的key, value不是dict的时候原样返回."""
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for key, want in spec.items():
+        if key not in value:
+            continue
+        result[key] = value[key] if want is True else project(value[key], want)
+    return result
+
+
+def decode_object(s, pos, raw_decode, raw_keys):
+    """和raw_decode一样从s[pos]开始解析一个JSON值, 返回(value, end).
+    值是object的时候, raw_keys里的key不保留解析出来的结果, 只保留原始的JSON (utf-8 bytes),
+    用到的时候再解析, 大的嵌套值就不会一直占着内存.
+    """
+    if s[pos:pos + 1] != '{':
+        return raw_decode(s, pos)
+    match_ws = _WHITESPACE.match
+    obj = {}
+    pos = match_ws(s, pos + 1).end()
+    if s[pos:pos + 1] == '}':
+        return obj, pos + 1
+    while True:
+        if s[pos:pos + 1] != '"':
+            raise ValueError('expecting property name at %d' % pos)
+        key, pos = scanstring(s, pos + 1)
+        pos = match_ws(s, pos).end()
+        if s[pos:pos + 1] != ':':
+            raise ValueError('expecting : at %d' % pos)
+        pos = match_ws(s, pos + 1).end()
+        # raw的值也要整个解析一遍才知道在哪结束, 但是解析出来的马上就丢了
+        value, end = raw_decode(s, pos)
+        obj[key] = s[pos:end].encode('utf-8') if key in raw_keys else value
+        pos = match_ws(s, end).end()
+        c = s[pos:pos + 1]
+        if c == '}':
+            return obj, pos + 1
+        if c != ',':
+            raise ValueError('expecting , or } at %d' % pos)
+        pos = match_ws(s, pos + 1).end()
+
+
+def _raw_keys(raw, spec):
+    """fields只要某个raw key里的一部分的时候, 这个key还是解析之后裁剪, 裁剪完一般就很小了."""
+    return frozenset(raw or ()) - frozenset(key for key, want in (spec or {}).items() if want is not True)
+
+
+def loads_raw(s, raw, decoder=None, fields=None):
+    """解析一个完整的JSON文档, object (或者数组里的object) 的raw里的key保留原始的JSON, 见decode_object.
+    fields: 同iter_json_array.
+    """
+    if isinstance(s, bytes):
+        s = s.decode('utf-8')
+    pos = _WHITESPACE.match(s).end()
+    if s[pos:pos + 1] == '[':
+        return list(iter_json_array([s], decoder, fields, raw))
+    spec = field_spec(fields) if fields else None
+    value, end = decode_object(s, pos, (decoder or jsonlib.JSONDecoder()).raw_decode, _raw_keys(raw, spec))
+    if _WHITESPACE.match(s, end).end() != len(s):
+        raise ValueError('extra data at %d' % end)
+    return project(value, spec) if spec else value
+
+
+def iter_json_array(chunks, decoder=None, fields=None, raw=None):
+    """chunks: 产生bytes (或者str) 的iterable, 内容是一个JSON数组.
+    一边读一边产生数组里的元素, 内存里只有当前的一块和没解析完的那个元素.
+    不是数组, 或者数组不完整的时候抛JSONArrayError.
+    fields: 元素是object的时候只保留这些key, 可以用a.b.c指定嵌套的key.
+    每个元素解析完马上就丢掉别的key, 同一时间只有一个完整的元素在内存里.
+    raw: 元素是object的时候这些key保留原始的JSON, 见decode_object和_raw_keys.
+    """
+    raw_decode = (decoder or jsonlib.JSONDecoder()).raw_decode
+    # 用python逐个跳过不要的key反而比C写的raw_decode整个解析再丢掉慢好几倍
+    spec = field_spec(fields) if fields else None
+    decode_item = raw_decode
+    raw_keys = _raw_keys(raw, spec)
+    if raw_keys:
+
+        def _decode_raw(s, pos):
+            return decode_object(s, pos, raw_decode, raw_keys)
+        decode_item = _decode_raw
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    match_ws = _WHITESPACE.match
+    buf = ''
+    # 一个元素没收全的时候raw_decode会失败, 等buf至少翻倍再试, 总的解析量还是线性的
+    retry_at = 0
+    # start: 等'[', first: 等第一个元素或者']', item: 等元素, sep: 等','或者']', end: 数组结束了
+    state = 'start'
+
+    def _error(message):
+        return JSONArrayError('%s: %r' % (message, buf[pos:pos + 200]))
+
+    final = False
+    chunks = iter(chunks)
+    while not final:
+        chunk = next(chunks, None)
+        if chunk is None:
+            final = True
+            buf += utf8.decode(b'', final=True)
+        elif isinstance(chunk, str):
+            buf += chunk
+        elif chunk:
+            buf += utf8.decode(chunk)
+        if not final and len(buf) < retry_at:
+            continue
+
+        pos = 0
+        while True:
+            pos = match_ws(buf, pos).end()
+            if pos == len(buf):
+                break
+            c = buf[pos]
+            if state == 'start':
+                if c != '[':
+                    raise _error('not a JSON array')
+                state = 'first'
+                pos += 1
+            elif state == 'sep' or (state == 'first' and c == ']'):
+                if c == ']':
+                    state = 'end'
+                elif c == ',' and state == 'sep':
+                    state = 'item'
+                else:
+                    raise _error('expecting , or ]')
+                pos += 1
+            elif state == 'end':
+                raise _error('extra data after JSON array')
+            else:
+                try:
+                    item, end = decode_item(buf, pos)
+                except ValueError:
+                    if final:
+                        raise _error('bad or truncated item')
+                    break
+                if not final and (end == len(buf) or buf[end] not in ' \t\n\r,]'):
+                    # 块末尾的数字可能还没完, 比如1.5后面还有e10
+                    break
+                pos = end
+                state = 'sep'
+                yield project(item, spec) if spec else item
+
+        buf = buf[pos:]
+        retry_at = 2 * len(buf)
+
+    if state != 'end':
+        raise JSONArrayError('JSON array is truncated')
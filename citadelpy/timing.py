@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""CoreAPI请求的耗时拆分, 给before_request / after_request hook用.
+
+requests本身只告诉我们从发请求到收到header用了多久 (resp.elapsed),
+建连接的时间是把urllib3的connection换成会计时的子类拿到的,
+记在当前线程上, 因为一个请求从头到尾都在同一个线程里.
+"""
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+_local = threading.local()
+
+
+def _take_connect_time():
+    spent = getattr(_local, 'connect', 0.0)
+    _local.connect = 0.0
+    return spent
+
+
+class _TimedConnectMixin:
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super(_TimedConnectMixin, self).connect()
+        finally:
+            _local.connect = getattr(_local, 'connect', 0.0) + time.perf_counter() - start
+
+
+class TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """和HTTPAdapter一样, 只是新建连接的时候会计时."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+
+class RequestTiming:
+    """一次请求的信息, 时间都是秒.
+    connect: 建TCP/TLS连接, 复用连接的时候是0.
+    ttfb: 连接建好之后到收到响应header.
+    body: 读响应body, 流接口是整个流读完的时间.
+    decode: 解析JSON.
+    """
+
+    def __init__(self, method, path, params=None):
+        self.method = method
+        self.path = path
+        self.params = params
+        self.status = None
+        self.bytes = 0
+        self.cached = False
+        self.error = None
+        self.connect = 0.0
+        self.ttfb = 0.0
+        self.body = 0.0
+        self.decode = 0.0
+        self.elapsed = 0.0
+        self.start = time.perf_counter()
+        self._headers = 0.0
+        _take_connect_time()
+
+    def headers_received(self, resp):
+        self.status = resp.status_code
+        self.connect = _take_connect_time()
+        self._headers = resp.elapsed.total_seconds()
+        self.ttfb = max(0.0, self._headers - self.connect)
+
+    def body_received(self, size):
+        self.bytes = size
+        self.body = max(0.0, time.perf_counter() - self.start - self._headers)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.start
+        return self
+
+    def as_dict(self):
+        return {
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'bytes': self.bytes,
+            'cached': self.cached,
+            'error': self.error,
+            'connect': self.connect,
+            'ttfb': self.ttfb,
+            'body': self.body,
+            'decode': self.decode,
+            'elapsed': self.elapsed,
+        }
@@ -1,9 +1,13 @@
 # coding: utf-8
 import os
+import re
+import threading
+import time
 
 import click
 
-from corecli.cli.utils import error, info, get_commit_hash, get_remote_url
+from corecli.cli.removal import lookup_nodenames, remove_containers, removal_options
+from corecli.cli.utils import error, info, warn, get_appname, get_commit_hash, get_remote_url, ensure_single_zone, echo, run_parallel
 
 
 def _get_repo(repo):
@@ -12,6 +16,16 @@ def _get_repo(repo):
     return repo
 
 
+def _networks_dict(networks):
+    ns = []
+    for n in networks:
+        ps = n.split(':', 1)
+        if len(ps) == 1:
+            ps.append('')
+        ns.append(ps)
+    return dict(ns)
+
+
 def _get_sha(sha):
     sha = sha or get_commit_hash()
     if not sha:
@@ -26,16 +40,33 @@ def _get_sha(sha):
 @click.option('--artifact', default='', help='artifact url to use')
 @click.option('--uid', default='', help='uid of user inside container image')
 @click.option('--with-artifacts', default=False, help='automatically detect gitlab artifacts file to upload', is_flag=True)
+@click.option('--skip-existing', default=False, help='do nothing if the release of this sha already has an image', is_flag=True)
+@click.option('--app', default='', help='appname for --skip-existing, default is from app.yaml')
 @click.pass_context
-def build(ctx, repo, sha, artifact, uid, with_artifacts):
+def build(ctx, repo, sha, artifact, uid, with_artifacts, skip_existing, app):
+    ensure_single_zone(ctx)
     repo = _get_repo(repo)
     sha = _get_sha(sha)
 
+    core = ctx.obj['coreapi']
+    if skip_existing:
+        appname = app or get_appname()
+        if not appname:
+            raise click.UsageError('--skip-existing needs --app or app.yaml')
+        from citadelpy import CoreAPIError
+        try:
+            release = core.find_release(appname, sha)
+        except CoreAPIError as e:
+            click.echo(warn('Can not check existing releases, build anyway: %s' % e))
+            release = None
+        if release and release['image']:
+            click.echo(info('Release %s %s already has image %s, skip build.' % (appname, sha, release['image'])))
+            return
+
     gitlab_build_id = ''
     if os.getenv('GITLAB_CI', '') and with_artifacts:
         gitlab_build_id = os.getenv('CI_BUILD_ID', '')
 
-    core = ctx.obj['coreapi']
     for m in core.build(repo, sha, artifact, uid, gitlab_build_id=gitlab_build_id):
         if m['error']:
             click.echo(error(m['error']))
@@ -52,6 +83,114 @@ def build(ctx, repo, sha, artifact, uid, with_artifacts):
     click.echo(info('Build %s %s done.' % (repo, sha)))
 
 
+def _read_build_specs(builds, manifest):
+    """builds: REPO@SHA, manifest: YAML / JSON, [{repo, sha, artifact, uid}]. 返回[dict]."""
+    specs = []
+    for spec in builds:
+        repo, sep, sha = spec.rpartition('@')
+        # git@host:x.git里也有@, sha只能是十六进制
+        if not sep or not repo or not re.match(r'^[0-9a-fA-F]{7,40}$', sha):
+            raise click.BadParameter('%s is not REPO@SHA' % spec, param_hint='BUILDS')
+        specs.append({'repo': repo, 'sha': sha})
+
+    if manifest:
+        import yaml
+
+        with open(manifest) as f:
+            items = yaml.safe_load(f) or []
+        if isinstance(items, dict):
+            items = items.get('builds') or []
+        for item in items:
+            if not item.get('repo') or not item.get('sha'):
+                raise click.UsageError('every build in %s needs repo and sha: %s' % (manifest, item))
+            specs.append(dict(item))
+    return specs
+
+
+def _build_names(specs):
+    names = ['%s-%s' % (os.path.basename(s['repo']).rsplit('.git', 1)[0] or 'build', s['sha'][:7]) for s in specs]
+    return [name if names.count(name) == 1 else '%s-%d' % (name, i) for i, name in enumerate(names)]
+
+
+@click.argument('builds', nargs=-1)
+@click.option('--manifest', default=None, type=click.Path(exists=True, dir_okay=False), help='YAML / JSON list of {repo, sha, artifact, uid} to build as well')
+@click.option('--artifact', default='', help='artifact url for builds that do not set their own')
+@click.option('--uid', default='', help='uid of user inside container image for builds that do not set their own')
+@click.option('--parallel', default=4, type=int, help='how many /build streams to run at the same time')
+@click.option('--log-dir', default='build-logs', help='directory for the full log of every build, one file each')
+@click.pass_context
+def build_many(ctx, builds, manifest, artifact, uid, parallel, log_dir):
+    """build every REPO@SHA concurrently, one status line each"""
+    from corecli.cli.progress import StatusBoard
+
+    ensure_single_zone(ctx)
+    specs = _read_build_specs(builds, manifest)
+    if not specs:
+        click.echo(error('No builds given'))
+        ctx.exit(-1)
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+
+    core = ctx.obj['coreapi']
+    names = _build_names(specs)
+    board = StatusBoard(names)
+
+    def _build(i):
+        """返回失败的原因, 成功返回None."""
+        spec = specs[i]
+        board.update(i, 'building', final=True)
+        failure = None
+        with open(os.path.join(log_dir, names[i] + '.log'), 'w') as log:
+            log.write('build %s %s\n' % (spec['repo'], spec['sha']))
+            try:
+                for m in core.build(spec['repo'], spec['sha'], spec.get('artifact') or artifact, spec.get('uid') or uid):
+                    if m['error']:
+                        failure = m['error']
+                        break
+                    if m['stream']:
+                        log.write(m['stream'])
+                    if m['status']:
+                        log.write(m['status'] + '\n')
+                        if m['progress']:
+                            log.write(m['progress'] + '\n')
+                        # 一行状态, 完整的在日志里
+                        board.update(i, m['status'].strip().split('\n')[0][:80])
+            except Exception as e:
+                failure = str(e)
+            if failure:
+                log.write('ERROR: %s\n' % failure)
+        board.update(i, error('failed: %s' % failure) if failure else info('done'), final=True)
+        return failure
+
+    started = time.time()
+    results = run_parallel(_build, range(len(specs)), parallel)
+    board.close()
+
+    failed = [i for i, failure, _ in results if failure]
+    for i in failed:
+        click.echo(error('%s failed, see %s' % (names[i], os.path.join(log_dir, names[i] + '.log'))))
+    if failed:
+        click.echo(error('%d of %d builds failed' % (len(failed), len(specs))))
+        ctx.exit(-1)
+    click.echo(info('%d builds done in %.1fs, logs in %s' % (len(specs), time.time() - started, log_dir)))
+
+
+def preflight_option(f):
+    return click.option('--preflight', default=False, is_flag=True, help='check with pod:plan that all containers fit before deploying, fail fast if not')(f)
+
+
+def _preflight(ctx, core, targets):
+    """targets: [(podname, memory, cpu, count, nodename)], 放不下就直接退出, 不开始部署."""
+    from citadelpy import CoreAPIError
+    from corecli.cli.planner import PlanError, preflight
+
+    try:
+        preflight(core, targets)
+    except (CoreAPIError, PlanError) as e:
+        click.echo(error('Preflight check failed: %s' % e))
+        ctx.exit(-1)
+
+
 @click.argument('podname')
 @click.argument('entrypoint')
 @click.option('--repo', default='', help='git repository url, default is from `git remote get-url origin`')
@@ -59,27 +198,21 @@ def build(ctx, repo, sha, artifact, uid, with_artifacts):
 @click.option('--cpu', default=0, type=float, help='how many CPUs to set, e.g. --cpu 1.5')
 @click.option('--memory', default=536870912, type=float, help='how much memory to set, e.g. --memory 536870912')
 @click.option('--count', default=1, type=int, help='how many containers to deploy, e.g. --count 2')
-@click.option('--networks', default='', help='networks to bind, NetworkName:IP, e.g. --networks network:10.102.0.37 --networks network', multiple=True)
+@click.option('--networks', default=(), help='networks to bind, NetworkName:IP, e.g. --networks network:10.102.0.37 --networks network', multiple=True)
 @click.option('--nodename', default='', help='nodename to deploy, e.g. --nodename zzz1')
 @click.option('--envname', default='', help='envname to use')
-@click.option('--extraenv', default='', help='extra environment variables, e.g. --extraenv KEY1=VALUE1 --extraenv KEY2=VALUE2', multiple=True)
+@click.option('--extraenv', default=(), help='extra environment variables, e.g. --extraenv KEY1=VALUE1 --extraenv KEY2=VALUE2', multiple=True)
+@preflight_option
 @click.pass_context
-def deploy(ctx, podname, entrypoint, repo, sha, cpu, memory, count, networks, nodename, envname, extraenv):
-
-    def _networks_dict(networks):
-        ns = []
-        for n in networks:
-            ps = n.split(':', 1)
-            if len(ps) == 1:
-                ps.append('')
-            ns.append(ps)
-        return dict(ns)
-
+def deploy(ctx, podname, entrypoint, repo, sha, cpu, memory, count, networks, nodename, envname, extraenv, preflight):
+    ensure_single_zone(ctx)
     networks = _networks_dict(networks)
     repo = _get_repo(repo)
     sha = _get_sha(sha)
 
     core = ctx.obj['coreapi']
+    if preflight:
+        _preflight(ctx, core, [(podname, memory, cpu, count, nodename)])
     for m in core.deploy(repo, sha, podname, nodename, entrypoint, cpu, memory, count, networks, envname, extraenv):
         if not m['success']:
             click.echo(error(m['error']))
@@ -87,19 +220,121 @@ def deploy(ctx, podname, entrypoint, repo, sha, cpu, memory, count, networks, no
             click.echo(info('Container %s / %s created successfully' % (m['id'], m['name'])))
 
 
+def _read_deploy_manifest(path):
+    """manifest是YAML或者JSON, 可以直接是target的列表, 也可以是
+    {repo: ..., sha: ..., defaults: {...}, targets: [...]}.
+    每个target: pod, node, entrypoint, cpu, memory, count, networks, envname, extraenv.
+    """
+    import yaml
+
+    with open(path) as f:
+        manifest = yaml.safe_load(f) or {}
+    if isinstance(manifest, list):
+        manifest = {'targets': manifest}
+
+    defaults = dict(manifest.get('defaults') or {})
+    targets = []
+    for t in manifest.get('targets') or []:
+        target = dict(defaults, **t)
+        if not target.get('pod') or not target.get('entrypoint'):
+            raise click.UsageError('every target in %s needs pod and entrypoint: %s' % (path, t))
+        networks = target.get('networks') or {}
+        if not isinstance(networks, dict):
+            networks = _networks_dict(networks)
+        targets.append({
+            'pod': target['pod'],
+            'node': target.get('node') or '',
+            'entrypoint': target['entrypoint'],
+            'cpu': float(target.get('cpu', 0)),
+            'memory': float(target.get('memory', 536870912)),
+            'count': int(target.get('count', 1)),
+            'networks': networks,
+            'envname': target.get('envname') or '',
+            'extraenv': list(target.get('extraenv') or []),
+        })
+    return manifest.get('repo', ''), manifest.get('sha', ''), targets
+
+
+def _target_names(targets):
+    names = ['%s/%s/%s' % (t['pod'], t['node'] or '*', t['entrypoint']) for t in targets]
+    return [name if names.count(name) == 1 else '%s#%d' % (name, i) for i, name in enumerate(names)]
+
+
+@click.argument('manifest', type=click.Path(exists=True, dir_okay=False))
+@click.option('--repo', default='', help='git repository url, overrides manifest, default is from `git remote get-url origin`')
+@click.option('--sha', default='', help='git commit hash, overrides manifest, default is from `git rev-parse HEAD`')
+@click.option('--parallel', default=4, type=int, help='how many /deploy streams to run at the same time')
+@preflight_option
+@click.pass_context
+def deploy_batch(ctx, manifest, repo, sha, parallel, preflight):
+    ensure_single_zone(ctx)
+    manifest_repo, manifest_sha, targets = _read_deploy_manifest(manifest)
+    if not targets:
+        click.echo(error('No targets in %s' % manifest))
+        ctx.exit(-1)
+
+    repo = _get_repo(repo or manifest_repo)
+    sha = _get_sha(sha or manifest_sha)
+    core = ctx.obj['coreapi']
+    if preflight:
+        _preflight(ctx, core, [(t['pod'], t['memory'], t['cpu'], t['count'], t['node']) for t in targets])
+
+    def _deploy(item):
+        name, t = item
+        created, errors = 0, []
+        for m in core.deploy(repo, sha, t['pod'], t['node'], t['entrypoint'], t['cpu'], t['memory'], t['count'], t['networks'], t['envname'], t['extraenv']):
+            if not m['success']:
+                errors.append(m['error'])
+                echo(error('[%s] %s' % (name, m['error'])))
+            else:
+                created += 1
+                echo(info('[%s] Container %s / %s created successfully' % (name, m['id'], m['name'])))
+        return created, errors
+
+    results = run_parallel(_deploy, zip(_target_names(targets), targets), parallel)
+
+    from prettytable import PrettyTable
+    table = PrettyTable(['target', 'count', 'created', 'failed', 'error'])
+    table.align['error'] = 'l'
+    failed_targets = 0
+    for (name, t), res, exc in results:
+        if exc is not None:
+            created, errors = 0, [str(exc)]
+        else:
+            created, errors = res
+        failed = t['count'] - created
+        if failed or errors:
+            failed_targets += 1
+        table.add_row([name, t['count'], created, failed, error('; '.join(errors)) if errors else ''])
+    click.echo(table)
+
+    if failed_targets:
+        click.echo(error('%d of %d targets failed' % (failed_targets, len(targets))))
+        ctx.exit(-1)
+    click.echo(info('Deploy %s %s to %d targets done.' % (repo, sha, len(targets))))
+
+
 @click.argument('ids', nargs=-1)
+@removal_options
+@click.option('--by-node', default=False, is_flag=True, help='look up the node of every container first and chunk per node, costs one request per id')
 @click.pass_context
-def remove(ctx, ids):
+def remove(ctx, ids, chunk_size, parallel, retries, journal, by_node):
+    ensure_single_zone(ctx)
     if not ids:
         click.echo(error('No ids given'))
         ctx.exit(-1)
 
     core = ctx.obj['coreapi']
-    for m in core.remove(ids):
-        if m['success']:
-            click.echo(info('Container %s removed successfully' % m['id']))
-        else:
-            click.echo(error('Fail to remove %s, error: %s' % (m['id'], m['message'])))
+    # 默认按给的顺序分块; 一块就能删完的时候也不用查nodename
+    if by_node and len(ids) > chunk_size:
+        containers = lookup_nodenames(core, ids, parallel)
+    else:
+        containers = [(container_id, None) for container_id in ids]
+
+    failed = remove_containers(core, containers, chunk_size, parallel, retries, journal)
+    if failed:
+        click.echo(error('%d containers not removed: %s' % (len(failed), ' '.join(failed))))
+        ctx.exit(-1)
 
 
 @click.argument('ids', nargs=-1)
@@ -107,6 +342,7 @@ def remove(ctx, ids):
 @click.option('--sha', default='', help='git commit hash, default is from `git rev-parse HEAD`')
 @click.pass_context
 def upgrade(ctx, ids, repo, sha):
+    ensure_single_zone(ctx)
     if not ids:
         click.echo(error('No ids given'))
         ctx.exit(-1)
@@ -122,16 +358,120 @@ def upgrade(ctx, ids, repo, sha):
             click.echo(error('Fail to upgrade %s, error: %s' % (m['id'], m['error'])))
 
 
-@click.argument('nodename')
+def _container_ready(container, sha):
+    try:
+        running = container['info']['State']['Running']
+    except (KeyError, TypeError):
+        running = False
+    return bool(running) and container.get('sha', '').startswith(sha)
+
+
+def _wait_healthy(core, ids, sha, timeout, interval):
+    """等ids对应的容器都跑起来并且是sha这个版本, 返回没有就绪的id."""
+    from citadelpy import CoreAPIError
+
+    pending = set(ids)
+    deadline = time.time() + timeout
+    while pending:
+        for container_id in list(pending):
+            try:
+                container = core.get_container(container_id)
+            except CoreAPIError:
+                continue
+            if _container_ready(container, sha):
+                pending.discard(container_id)
+        if not pending or time.time() >= deadline:
+            break
+        time.sleep(interval)
+    return pending
+
+
 @click.argument('appname')
+@click.argument('from_sha')
+@click.option('--repo', default='', help='git repository url, default is from `git remote get-url origin`')
+@click.option('--sha', default='', help='git commit hash to upgrade to, default is from `git rev-parse HEAD`')
+@click.option('--batch-size', default=10, type=int, help='how many containers to upgrade in one wave')
+@click.option('--parallel', default=1, type=int, help='how many waves to run at the same time')
+@click.option('--max-unavailable', default=0, type=int, help='cap on containers being upgraded at once, limits --batch-size and --parallel, 0 means no cap')
+@click.option('--max-failures', default=0, type=int, help='stop starting new waves once more containers than this failed')
+@click.option('--health-timeout', default=60, type=float, help='seconds to wait for new containers to be running')
+@click.option('--health-interval', default=2, type=float, help='seconds between health checks')
 @click.pass_context
-def log(ctx, nodename, appname):
+def upgrade_rolling(ctx, appname, from_sha, repo, sha, batch_size, parallel, max_unavailable, max_failures, health_timeout, health_interval):
+    ensure_single_zone(ctx)
+    repo = _get_repo(repo)
+    sha = _get_sha(sha)
     core = ctx.obj['coreapi']
-    logs = core.log(nodename, appname)
 
-    if logs is None:
-        click.echo(error('wrong nodename %s' % nodename))
+    ids = [c['container_id'] for c in core.get_release_containers(appname, from_sha, fields=['container_id']) if c]
+    if not ids:
+        click.echo(error('No containers found for %s %s' % (appname, from_sha)))
         ctx.exit(-1)
 
-    for m in logs:
-        click.echo('[%s, %s, %s, %s, %s] %s' % (m['datetime'], m['type'], m['entrypoint'], m['id'][:7], m['ident'], m['data']))
+    batch_size = max(1, batch_size)
+    if max_unavailable:
+        # 一波里的容器同时升级, 所以一波也不能超过max_unavailable
+        batch_size = min(batch_size, max_unavailable)
+        parallel = min(parallel, max(1, max_unavailable // batch_size))
+    waves = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+    total = len(waves)
+
+    lock = threading.Lock()
+    stop = threading.Event()
+    failures = [0]
+
+    def _fail(count):
+        with lock:
+            failures[0] += count
+            if failures[0] > max_failures:
+                stop.set()
+
+    def _wave(item):
+        index, wave_ids = item
+        tag = '[wave %d/%d]' % (index + 1, total)
+        if stop.is_set():
+            echo(warn('%s skipped, too many failures' % tag))
+            return None
+
+        started = time.time()
+        new_ids = []
+        try:
+            for m in core.upgrade(wave_ids, repo, sha):
+                if m['success']:
+                    new_ids.append(m['new_id'])
+                    echo(info('%s Container %s upgrade to %s / %s successfully' % (tag, m['id'], m['new_id'], m['new_name'])))
+                else:
+                    echo(error('%s Fail to upgrade %s, error: %s' % (tag, m['id'], m['error'])))
+        except Exception:
+            # 要在这里算失败, 后面的波才能看到stop
+            _fail(len(wave_ids))
+            raise
+        # ids citadel did not report on count as failed too
+        failed = len(wave_ids) - len(new_ids)
+        upgraded = time.time()
+
+        unhealthy = _wait_healthy(core, new_ids, sha, health_timeout, health_interval)
+        for container_id in unhealthy:
+            echo(error('%s Container %s not running %s after %ss' % (tag, container_id, sha[:7], health_timeout)))
+        _fail(failed + len(unhealthy))
+        return len(new_ids), len(new_ids) - len(unhealthy), upgraded - started, time.time() - upgraded
+
+    results = run_parallel(_wave, enumerate(waves), parallel)
+
+    from prettytable import PrettyTable
+    table = PrettyTable(['wave', 'containers', 'upgraded', 'healthy', 'upgrade(s)', 'health(s)', 'status'])
+    for (index, wave_ids), res, exc in results:
+        if exc is not None:
+            table.add_row([index + 1, len(wave_ids), '', '', '', '', error(str(exc))])
+        elif res is None:
+            table.add_row([index + 1, len(wave_ids), '', '', '', '', warn('skipped')])
+        else:
+            upgraded, healthy, upgrade_time, health_time = res
+            status = info('ok') if healthy == len(wave_ids) else error('failed')
+            table.add_row([index + 1, len(wave_ids), upgraded, healthy, '%.1f' % upgrade_time, '%.1f' % health_time, status])
+    click.echo(table)
+
+    if failures[0] > max_failures or stop.is_set():
+        click.echo(error('Rolling upgrade of %s stopped, %d containers failed' % (appname, failures[0])))
+        ctx.exit(-1)
+    click.echo(info('Rolling upgrade of %s %s to %s done, %d containers in %d waves.' % (appname, from_sha[:7], sha[:7], len(ids), total)))
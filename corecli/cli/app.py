@@ -1,22 +1,9 @@
 # coding: utf-8
 import click
-import yaml
-from prettytable import PrettyTable
 
-from corecli.cli.utils import get_appname, get_commit_hash, get_remote_url, get_current_branch, error, info
-
-
-def _container_table(containers):
-    table = PrettyTable(['name', 'id', 'nodename', 'podname', 'appname', 'sha', 'entrypoint', 'env', 'cpu', 'ip'])
-    for c in containers:
-        try:
-            networks = c['info']['NetworkSettings']['Networks']
-        except KeyError:
-            networks = {}
-
-        ns = ['%s:%s' % (name, network['IPAddress']) for name, network in networks.items()]
-        table.add_row([c['name'], c['container_id'], c['nodename'], c['podname'], c['appname'], c['sha'][:7], c['entrypoint'], c['env'], c['cpu_quota'], ','.join(ns)])
-    return table
+from corecli.cli.removal import remove_containers, removal_options
+from corecli.cli.utils import get_appname, get_commit_hash, get_remote_url, get_current_branch, error, info, echo_table, echo_rows, fetch_zones, ensure_single_zone, page_size_option, CONTAINER_FIELDS, CONTAINER_HEADER, container_key, container_row
+from corecli.cli.watch import watch_options, watch_rows
 
 
 def _get_appname(appname):
@@ -36,29 +23,24 @@ def _get_sha(sha):
 @click.argument('appname', required=False)
 @click.pass_context
 def get_app(ctx, appname):
-    core = ctx.obj['coreapi']
     appname = _get_appname(appname)
-    app = core.get_app(appname)
 
-    table = PrettyTable(['name', 'git', 'created'])
-    table.align['git'] = 'l'
-    table.add_row([app['name'], app['git'], app['created']])
-    click.echo(table)
+    def _rows(core):
+        app = core.get_app(appname)
+        return [[app['name'], app['git'], app['created']]]
+
+    echo_table(ctx, ['name', 'git', 'created'], _rows, align={'git': 'l'})
 
 
 @click.argument('appname', required=False)
 @click.pass_context
 def get_app_envs(ctx, appname):
-    core = ctx.obj['coreapi']
     appname = _get_appname(appname)
-    envs = core.get_app_envs(appname)
 
-    table = PrettyTable(['name'])
-    table.align['name'] = 'l'
+    def _rows(core):
+        return [[env['envname']] for env in core.get_app_envs(appname)]
 
-    for env in envs:
-        table.add_row([env['envname']])
-    click.echo(table)
+    echo_table(ctx, ['name'], _rows, align={'name': 'l'})
 
 
 @click.argument('action')
@@ -71,16 +53,16 @@ def app_env(ctx, action, envname, envvars, app):
     core = ctx.obj['coreapi']
 
     if action == 'get':
-        env = core.get_app_env(appname, envname)
+        def _rows(core):
+            env = core.get_app_env(appname, envname)
+            return [[key, value] for key, value in env['vars'].items()]
 
-        table = PrettyTable(['key', 'value'])
-        table.align['value'] = 'l'
-
-        for key, value in env['vars'].items():
-            table.add_row([key, value])
-        click.echo(table)
+        echo_table(ctx, ['key', 'value'], _rows, align={'value': 'l'})
         return
 
+    if action in ('set', 'delete', 'remove'):
+        ensure_single_zone(ctx)
+
     if action == 'set':
         kv = {}
         for v in envvars:
@@ -103,82 +85,124 @@ def app_env(ctx, action, envname, envvars, app):
 
 
 @click.argument('appname', required=False)
+@page_size_option
+@watch_options
 @click.pass_context
-def get_app_containers(ctx, appname):
-    core = ctx.obj['coreapi']
+def get_app_containers(ctx, appname, page_size, watch, interval, max_interval):
+    from citadelpy.models import Container
+
     appname = _get_appname(appname)
+    if watch:
+        watch_rows(ctx, CONTAINER_HEADER, lambda core, etag: core.poll_app_containers(appname, etag, fields=CONTAINER_FIELDS, model=Container),
+                   container_row, container_key, interval, max_interval)
+        return
+
+    def _rows(core):
+        return (container_row(c) for c in core.iter_app_containers(appname, page_size=page_size, fields=CONTAINER_FIELDS, model=Container))
 
-    containers = core.get_app_containers(appname)
-    click.echo(_container_table(containers))
+    echo_rows(ctx, CONTAINER_HEADER, _rows)
 
 
 @click.argument('appname', required=False)
 @click.pass_context
 def get_app_releases(ctx, appname):
-    core = ctx.obj['coreapi']
+    from citadelpy.models import Release
+
     appname = _get_appname(appname)
-    releases = core.get_app_releases(appname)
 
-    table = PrettyTable(['name', 'sha', 'image', 'created'])
-    for r in releases:
-        table.add_row([appname, r['sha'], r['image'], r['created']])
-    click.echo(table)
+    def _rows(core):
+        return [[appname, r.sha, r.image, r.created] for r in core.get_app_releases(appname, model=Release)]
+
+    echo_table(ctx, ['name', 'sha', 'image', 'created'], _rows)
 
 
 @click.argument('appname', required=False)
 @click.argument('sha', required=False)
 @click.pass_context
 def get_release(ctx, appname, sha):
-    core = ctx.obj['coreapi']
+    from citadelpy.models import Release
+
     appname = _get_appname(appname)
     sha = _get_sha(sha)
 
-    r = core.get_release(appname, sha)
+    def _rows(core):
+        r = core.get_release(appname, sha, model=Release)
+        return [[appname, r.sha, r.image, r.created]]
 
-    table = PrettyTable(['name', 'sha', 'image', 'created'])
-    table.add_row([appname, r['sha'], r['image'], r['created']])
-    click.echo(table)
+    echo_table(ctx, ['name', 'sha', 'image', 'created'], _rows)
 
 
 @click.argument('appname', required=False)
 @click.argument('sha', required=False)
 @click.pass_context
 def get_release_specs(ctx, appname, sha):
-    core = ctx.obj['coreapi']
+    import yaml
+    from citadelpy.models import Release
+
     appname = _get_appname(appname)
     sha = _get_sha(sha)
 
-    release = core.get_release(appname, sha)
-    click.echo(yaml.safe_dump(release['specs'], default_flow_style=False))
+    if not ctx.obj['zones']:
+        release = ctx.obj['coreapi'].get_release(appname, sha, model=Release)
+        click.echo(yaml.safe_dump(release.specs, default_flow_style=False))
+        return
+
+    for zone, release, exc in fetch_zones(ctx, lambda core: core.get_release(appname, sha, model=Release)):
+        click.echo('# zone: %s' % zone)
+        if exc is not None:
+            click.echo(error(str(exc)))
+            continue
+        click.echo(yaml.safe_dump(release.specs, default_flow_style=False))
 
 
 @click.argument('appname', required=False)
 @click.argument('sha', required=False)
+@page_size_option
+@watch_options
 @click.pass_context
-def get_release_containers(ctx, appname, sha):
-    core = ctx.obj['coreapi']
+def get_release_containers(ctx, appname, sha, page_size, watch, interval, max_interval):
+    from citadelpy.models import Container
+
     appname = _get_appname(appname)
     sha = _get_sha(sha)
+    if watch:
+        watch_rows(ctx, CONTAINER_HEADER, lambda core, etag: core.poll_release_containers(appname, sha, etag, fields=CONTAINER_FIELDS, model=Container),
+                   container_row, container_key, interval, max_interval)
+        return
 
-    containers = core.get_release_containers(appname, sha)
-    click.echo(_container_table(containers))
+    def _rows(core):
+        return (container_row(c) for c in core.iter_release_containers(appname, sha, page_size=page_size, fields=CONTAINER_FIELDS, model=Container))
+
+    echo_rows(ctx, CONTAINER_HEADER, _rows)
 
 
 @click.argument('appname', required=False)
 @click.argument('sha', required=False)
+@removal_options
 @click.pass_context
-def delete_release_containers(ctx, appname, sha):
+def delete_release_containers(ctx, appname, sha, chunk_size, parallel, retries, journal):
+    ensure_single_zone(ctx)
     core = ctx.obj['coreapi']
     appname = _get_appname(appname)
     sha = _get_sha(sha)
 
-    containers = core.get_release_containers(appname, sha)
-    ids = [c['container_id'] for c in containers if c]
-    for m in core.remove(ids):
-        if m['success']:
-            click.echo(info('Container %s removed successfully' % m['id']))
-        else:
-            click.echo(error('Fail to remove %s, error: %s' % (m['id'], m['message'])))
+    # nodename用来按node分块
+    containers = core.get_release_containers(appname, sha, fields=['container_id', 'nodename'])
+    containers = [(c['container_id'], c.get('nodename')) for c in containers if c]
+    failed = remove_containers(core, containers, chunk_size, parallel, retries, journal)
+    if failed:
+        click.echo(error('%d containers not removed: %s' % (len(failed), ' '.join(failed))))
+        ctx.exit(-1)
+
+
+def _registered(core, appname, sha):
+    from citadelpy import CoreAPIError
+
+    try:
+        return core.find_release(appname, sha) is not None
+    except CoreAPIError:
+        # 新的app还没有releases
+        return False
 
 
 @click.argument('appname', required=False)
@@ -186,10 +210,23 @@ def delete_release_containers(ctx, appname, sha):
 @click.argument('git', required=False)
 @click.pass_context
 def register_release(ctx, appname, sha, git):
+    from citadelpy import CoreAPIError
+
+    ensure_single_zone(ctx)
     core = ctx.obj['coreapi']
     appname = _get_appname(appname)
     sha = _get_sha(sha)
     git = git or get_remote_url(remote=ctx.obj['remotename'])
+    # 已经注册过的直接算成功, 流水线重试的时候不会报错
+    if _registered(core, appname, sha):
+        click.echo(info('Release %s %s already registered.' % (appname, sha)))
+        return
+
     branch = get_current_branch()
-    core.register_release(appname, sha, git, branch=branch)
+    try:
+        core.register_release(appname, sha, git, branch=branch)
+    except CoreAPIError:
+        # 可能是同时跑的另一个register先注册上了
+        if not _registered(core, appname, sha):
+            raise
     click.echo(info('Register %s %s %s done.' % (appname, sha, git)))
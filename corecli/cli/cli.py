@@ -1,23 +1,137 @@
 # -*- coding: utf-8 -*-
-import logging
+import importlib
+import os
 from os import getenv
 from os.path import expanduser
 
 import click
 
-from citadelpy import CoreAPI
+from corecli.cli import profile as profiling
 from corecli.cli.commands import commands
-from corecli.cli.utils import read_json_file
+from corecli.cli.output import FORMATS
+from corecli.cli.utils import debug_log, read_json_file, warn
 
 
-@click.group()
+def _zones(config, zones, all_zones):
+    if all_zones:
+        if not config.get('zones'):
+            raise click.UsageError('--all-zones needs a "zones" list in config file')
+        return list(config['zones'])
+    return [z.strip() for z in zones.split(',') if z.strip()]
+
+
+def _cache(config, refresh):
+    """config里"cache"为true, 或者是{"path": ..., "max_entries": ..., "ttls": {pattern: seconds}}的时候才启用."""
+    cache_config = config.get('cache')
+    if not cache_config:
+        return None
+    from citadelpy.cache import DEFAULT_CACHE_PATH, ResponseCache
+
+    if not isinstance(cache_config, dict):
+        cache_config = {}
+    return ResponseCache(path=expanduser(cache_config.get('path', DEFAULT_CACHE_PATH)),
+                         max_entries=cache_config.get('max_entries', 1000),
+                         ttls=cache_config.get('ttls'),
+                         refresh=refresh)
+
+
+def _release_index(config):
+    """config里"release_index"为true, 或者是{"path": ...}的时候才启用."""
+    index_config = config.get('release_index')
+    if not index_config:
+        return None
+    from citadelpy.releases import DEFAULT_INDEX_PATH, ReleaseIndex
+
+    if not isinstance(index_config, dict):
+        index_config = {}
+    return ReleaseIndex(path=expanduser(index_config.get('path', DEFAULT_INDEX_PATH)))
+
+
+def _profile_report(profiler, trace_path):
+    click.echo(profiler.report(), err=True)
+    if trace_path:
+        profiler.write_trace(trace_path)
+        click.echo('trace written to {}'.format(trace_path), err=True)
+
+
+class LazyGroup(click.Group):
+    """lazy_commands: {子命令: 'module:function'}, 第一次用到子命令的时候才import.
+    这样corecli --help或者只跑一个子命令的时候, 不会把别的子命令依赖的yaml,
+    prettytable, requests都import进来.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.lazy_commands = kwargs.pop('lazy_commands', {})
+        super(LazyGroup, self).__init__(*args, **kwargs)
+
+    def list_commands(self, ctx):
+        return sorted(set(self.commands) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            module, _, name = self.lazy_commands[cmd_name].partition(':')
+            with profiling.span('import', module):
+                function = getattr(importlib.import_module(module), name)
+            self.command(cmd_name)(function)
+        return super(LazyGroup, self).get_command(ctx, cmd_name)
+
+
+# 可以写在配置文件里的CoreAPI连接参数
+_CONNECTION_OPTIONS = ('timeout', 'connect_timeout', 'read_timeout', 'pool_size', 'retries', 'backoff_factor')
+
+# corecli daemon里跑的时候是{'configs': {}, 'clients': {}}, 解析过的配置文件
+# 和建好的CoreAPI留着给后面的命令用
+_warm = None
+
+
+def _read_config(config_path):
+    if _warm is None:
+        return read_json_file(config_path)
+    try:
+        mtime = os.stat(config_path).st_mtime_ns
+    except OSError:
+        mtime = None
+    key = (config_path, mtime)
+    if key not in _warm['configs']:
+        _warm['configs'][key] = read_json_file(config_path)
+    return _warm['configs'][key]
+
+
+def _coreapi(config, zone, cache):
+    from citadelpy import CoreAPI
+
+    url = config['citadel_url'].strip('/')
+    connection = dict((key, config[key]) for key in _CONNECTION_OPTIONS if config.get(key) is not None)
+    if _warm is None:
+        return CoreAPI(url, auth_token=config['auth_token'], zone=zone, cache=cache, **connection)
+
+    key = (url, config['auth_token'], tuple(sorted(connection.items())))
+    if key not in _warm['clients']:
+        _warm['clients'][key] = CoreAPI(url, auth_token=config['auth_token'], **connection)
+    return _warm['clients'][key].fork(zone=zone, cache=cache)
+
+
+@click.group(cls=LazyGroup, lazy_commands=commands)
 @click.option('--zone', help='citadel zone, if not provided, will use citadel server default zone')
+@click.option('--zones', default='', help='comma separated zones to query in parallel, e.g. --zones c1,c2, write commands refuse it')
+@click.option('--all-zones', default=False, help='query every zone listed in config "zones" in parallel, write commands refuse it', is_flag=True)
 @click.option('--config-path', default=expanduser('~/.corecli.json'), help='config file, json', envvar='CITADEL_CONFIG_PATH')
 @click.option('--remotename', default='origin', help='git remote name, default to origin', envvar='CORECLI_REPO_NAME')
 @click.option('--debug', default=False, help='enable debug output', is_flag=True)
+@click.option('--no-cache', default=False, help='bypass the local response cache and release index, enabled by "cache" / "release_index" in config file', is_flag=True)
+@click.option('--refresh', default=False, help='revalidate cached responses with citadel before use, needs "cache" in config file', is_flag=True)
+@click.option('--output', default='table', type=click.Choice(FORMATS), help='table, or json / jsonl / csv / tsv for scripts, streamed row by row')
+@click.option('--profile', default=False, help='print a per-phase timing breakdown (http, git, render...) at exit', is_flag=True)
+@click.option('--profile-trace', default='', help='write a Chrome trace-event JSON file, implies --profile')
 @click.pass_context
-def core_commands(ctx, zone, config_path, remotename, debug):
-    config = read_json_file(config_path)
+def core_commands(ctx, zone, zones, all_zones, config_path, remotename, debug, no_cache, refresh, output, profile, profile_trace):
+    profiler = None
+    if profile or profile_trace:
+        profiler = profiling.enable()
+        ctx.call_on_close(lambda: _profile_report(profiler, profile_trace))
+
+    with profiling.span('config', config_path):
+        config = _read_config(config_path)
     if not config:
         config = {}
         config['auth_token'] = getenv('CITADEL_AUTH_TOKEN')
@@ -25,19 +139,27 @@ def core_commands(ctx, zone, config_path, remotename, debug):
         click.echo('config saved to {}'.format(config_path))
 
     if debug:
+        import logging
         logging.basicConfig(level=logging.DEBUG, format='[%(asctime)s] [%(process)d] [%(levelname)s] [%(filename)s @ %(lineno)s]: %(message)s', datefmt='%Y-%m-%d %H:%M:%S %z')
 
     if not config['auth_token']:
         raise Exception('CITADEL_AUTH_TOKEN not found')
 
-    coreapi = CoreAPI(config['citadel_url'].strip('/'), auth_token=config['auth_token'], zone=zone)
+    cache = None if no_cache else _cache(config, refresh)
+    if refresh and cache is None:
+        click.echo(warn('--refresh has no effect, response cache is off (set "cache" in {})'.format(config_path)), err=True)
+    with profiling.span('setup', 'CoreAPI'):
+        coreapi = _coreapi(config, zone, cache)
+    coreapi.releases = None if no_cache else _release_index(config)
+    if debug:
+        ctx.call_on_close(lambda: click.echo(debug_log('connection pool: %s', coreapi.pool_stats()), err=True))
+    if profiler is not None:
+        coreapi.add_hook('after_request', profiler.on_request)
     ctx.obj['coreapi'] = coreapi
+    ctx.obj['zones'] = _zones(config, zones, all_zones)
     ctx.obj['remotename'] = remotename
     ctx.obj['debug'] = debug
-
-
-for command, function in commands.items():
-    core_commands.command(command)(function)
+    ctx.obj['output'] = output
 
 
 def main():
@@ -0,0 +1,83 @@
+# coding: utf-8
+"""corecli的入口.
+
+corecli daemon在跑的话, 把命令行, 当前目录和环境变量发给它, 它执行完把
+stdout / stderr原样传回来; daemon没在跑就在本进程里执行.
+这个module只用标准库, 走daemon的时候不用import click和requests.
+
+协议: 客户端发一行JSON {"argv", "cwd", "env", "tty", "err_tty"},
+daemon回一串帧, 每帧是1字节的类型 + 4字节的长度 + 内容,
+类型o是stdout, e是stderr, x是退出码, 收到x就结束了.
+"""
+import json
+import os
+import socket
+import struct
+import sys
+
+
+SOCKET_ENV = 'CORECLI_DAEMON_SOCKET'
+NO_DAEMON_ENV = 'CORECLI_NO_DAEMON'
+FRAME_HEADER = struct.Struct('>cI')
+
+
+def default_socket_path():
+    runtime = os.getenv('XDG_RUNTIME_DIR') or os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'corecli')
+    return os.getenv(SOCKET_ENV) or os.path.join(runtime, 'corecli.sock')
+
+
+def _read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise EOFError
+    return data
+
+
+def run_remote(argv, path=None):
+    """让daemon执行argv, 返回退出码. daemon没在跑返回None."""
+    path = path or default_socket_path()
+    if not os.path.exists(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        # daemon退出的时候没来得及删掉socket文件
+        sock.close()
+        return None
+
+    request = {
+        'argv': list(argv),
+        'cwd': os.getcwd(),
+        'env': dict(os.environ),
+        'tty': sys.stdout.isatty(),
+        'err_tty': sys.stderr.isatty(),
+    }
+    outputs = {b'o': sys.stdout, b'e': sys.stderr}
+    with sock, sock.makefile('rb') as f:
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        try:
+            while True:
+                kind, size = FRAME_HEADER.unpack(_read_exactly(f, FRAME_HEADER.size))
+                payload = _read_exactly(f, size)
+                if kind == b'x':
+                    return int(payload)
+                stream = outputs[kind]
+                stream.flush()
+                stream.buffer.write(payload)
+                stream.buffer.flush()
+        except EOFError:
+            sys.stderr.write('corecli daemon closed the connection before the command finished\n')
+            return 1
+
+
+def main():
+    argv = sys.argv[1:]
+    if not os.getenv(NO_DAEMON_ENV) and 'daemon' not in argv:
+        code = run_remote(argv)
+        if code is not None:
+            sys.exit(code)
+
+    from corecli.cli.cli import main as run_local
+    run_local()
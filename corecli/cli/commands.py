@@ -1,58 +1,40 @@
 # coding: utf-8
-
-from corecli.cli.app import (
-    get_app,
-    get_app_releases,
-    get_app_containers,
-    get_app_envs,
-    app_env,
-    get_release,
-    get_release_specs,
-    get_release_containers,
-    delete_release_containers,
-    register_release,
-)
-
-from corecli.cli.action import (
-    build,
-    remove,
-    upgrade,
-    deploy,
-    log,
-)
-
-from corecli.cli.rpc import (
-    get_networks,
-    get_pod,
-)
-
-from corecli.cli.pod import (
-    get_memcap,
-    sync_memcap,
-)
+"""子命令 -> 'module:function', 用到哪个子命令才import对应的module."""
 
 commands = {
-    'app:get': get_app,
-    'app:envs': get_app_envs,
-    'app:env': app_env,
-    'app:release': get_app_releases,
-    'app:container': get_app_containers,
-
-    'release:get': get_release,
-    'release:specs': get_release_specs,
-    'release:container': get_release_containers,
-    'release:offline': delete_release_containers,
-
-    'pod:get': get_pod,
-    'pod:getmemcap': get_memcap,
-    'pod:syncmemcap': sync_memcap,
-
-    'network:get': get_networks,
-
-    'register': register_release,
-    'deploy': deploy,
-    'build': build,
-    'remove': remove,
-    'upgrade': upgrade,
-    'log': log,
+    'app:get': 'corecli.cli.app:get_app',
+    'app:envs': 'corecli.cli.app:get_app_envs',
+    'app:env': 'corecli.cli.app:app_env',
+    'app:release': 'corecli.cli.app:get_app_releases',
+    'app:container': 'corecli.cli.app:get_app_containers',
+
+    'release:get': 'corecli.cli.app:get_release',
+    'release:specs': 'corecli.cli.app:get_release_specs',
+    'release:container': 'corecli.cli.app:get_release_containers',
+    'release:offline': 'corecli.cli.app:delete_release_containers',
+
+    'pod:get': 'corecli.cli.rpc:get_pod',
+    'pod:container': 'corecli.cli.pod:get_pod_containers',
+    'pod:getmemcap': 'corecli.cli.pod:get_memcap',
+    'pod:syncmemcap': 'corecli.cli.pod:sync_memcap',
+    'pod:plan': 'corecli.cli.pod:plan_pod',
+
+    'env:sync': 'corecli.cli.env:sync_envs',
+
+    'inventory:sync': 'corecli.cli.inventory:sync_inventory',
+    'inventory:query': 'corecli.cli.inventory:query_inventory',
+
+    'network:get': 'corecli.cli.rpc:get_networks',
+
+    'register': 'corecli.cli.app:register_release',
+    'deploy': 'corecli.cli.action:deploy',
+    'deploy:batch': 'corecli.cli.action:deploy_batch',
+    'build': 'corecli.cli.action:build',
+    'build:many': 'corecli.cli.action:build_many',
+    'remove': 'corecli.cli.action:remove',
+    'upgrade': 'corecli.cli.action:upgrade',
+    'upgrade:rolling': 'corecli.cli.action:upgrade_rolling',
+    'log': 'corecli.cli.logs:log',
+
+    'daemon': 'corecli.cli.daemon:daemon',
 }
@@ -0,0 +1,188 @@
+# coding: utf-8
+"""corecli daemon: 常驻进程, 在unix socket上一个一个地执行客户端发来的命令.
+
+import, 解析配置文件, 和citadel的连接池都只做一次, 后面的命令直接复用.
+协议见corecli.cli.client.
+
+命令是串行执行的: 执行的时候要切换当前目录, 环境变量和sys.stdout,
+这些都是整个进程共享的. 同时来的客户端在listen队列里排队.
+"""
+import io
+import os
+import signal
+import socket
+import sys
+import threading
+import traceback
+
+import click
+import simplejson as json
+
+from corecli.cli import profile as profiling
+from corecli.cli.client import FRAME_HEADER, default_socket_path
+
+
+class _Shutdown(BaseException):
+    """SIGTERM, 不会被命令里的except Exception / SystemExit吞掉."""
+
+
+def _shutdown(signum, frame):
+    raise _Shutdown()
+
+
+class _Channel(io.RawIOBase):
+    """把写进来的内容作为一帧发给客户端, 多个线程写的时候帧不会交错."""
+
+    def __init__(self, conn, kind, tty, lock):
+        self._conn = conn
+        self._kind = kind
+        self._tty = tty
+        self._lock = lock
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self._tty
+
+    def write(self, data):
+        data = bytes(data)
+        if data:
+            send(self._conn, self._kind, data, self._lock)
+        return len(data)
+
+
+def send(conn, kind, payload, lock):
+    with lock:
+        conn.sendall(FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _text_stream(conn, kind, tty, lock):
+    return io.TextIOWrapper(_Channel(conn, kind, tty, lock), encoding='utf-8', errors='replace', write_through=True)
+
+
+def _invoke(argv):
+    from corecli.cli.cli import core_commands
+
+    try:
+        rv = core_commands.main(args=argv, prog_name='corecli', obj={}, standalone_mode=False)
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.Abort:
+        click.echo('Aborted!', err=True)
+        return 1
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else int(e.code is not None)
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return rv if isinstance(rv, int) else 0
+
+
+def run(argv, cwd, env, stdout, stderr):
+    """在cwd和env下执行一条corecli命令, 输出写到stdout / stderr, 返回退出码."""
+    saved = os.getcwd(), dict(os.environ), sys.stdout, sys.stderr, sys.stdin
+    try:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+        # 没有办法转发stdin, 要确认的命令直接Abort
+        sys.stdout, sys.stderr, sys.stdin = stdout, stderr, io.StringIO()
+        return _invoke(argv)
+    finally:
+        cwd, environ, sys.stdout, sys.stderr, sys.stdin = saved
+        os.environ.clear()
+        os.environ.update(environ)
+        os.chdir(cwd)
+        profiling.disable()
+
+
+def handle(conn):
+    with conn.makefile('rb') as f:
+        request = json.loads(f.readline())
+
+    lock = threading.Lock()
+    stdout = _text_stream(conn, b'o', request.get('tty', False), lock)
+    stderr = _text_stream(conn, b'e', request.get('err_tty', False), lock)
+    code = run(request['argv'], request['cwd'], request['env'], stdout, stderr)
+    send(conn, b'x', str(code).encode('ascii'), lock)
+
+
+def _listen(path):
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+        else:
+            raise click.UsageError('corecli daemon is already listening on %s' % path)
+        finally:
+            probe.close()
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # bind之后listen之前连会被拒绝, 先用临时的名字, listen之后再改名, 客户端看到文件就能连
+    tmp_path = '%s.%d' % (path, os.getpid())
+    # 只有自己能连
+    umask = os.umask(0o177)
+    try:
+        server.bind(tmp_path)
+    finally:
+        os.umask(umask)
+    try:
+        server.listen(64)
+        os.rename(tmp_path, path)
+    except OSError:
+        server.close()
+        os.unlink(tmp_path)
+        raise
+    return server
+
+
+def serve(path, idle_timeout=0):
+    """一直跑到SIGTERM / Ctrl-C, 或者idle_timeout秒没有命令."""
+    from corecli.cli import cli
+
+    cli._warm = {'configs': {}, 'clients': {}}
+    server = _listen(path)
+    server.settimeout(idle_timeout or None)
+    signal.signal(signal.SIGTERM, _shutdown)
+    click.echo('corecli daemon listening on %s' % path, err=True)
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                click.echo('corecli daemon idle for %ds, exit' % idle_timeout, err=True)
+                return
+            conn.settimeout(None)
+            with conn:
+                try:
+                    handle(conn)
+                except (OSError, ValueError, KeyError) as e:
+                    # 客户端中途断开, 或者发来的不是合法的请求
+                    click.echo('corecli daemon: drop request: %s' % e, err=True)
+    except _Shutdown:
+        click.echo('corecli daemon stopped', err=True)
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        cli._warm = None
+
+
+@click.option('--socket', 'socket_path', default=None, help='unix socket to listen on, default $CORECLI_DAEMON_SOCKET or $XDG_RUNTIME_DIR/corecli.sock')
+@click.option('--idle-timeout', default=3600, type=int, help='exit after this many seconds without commands, 0 to never exit')
+@click.pass_context
+def daemon(ctx, socket_path, idle_timeout):
+    """keep imports, config and citadel connections warm for later corecli runs"""
+    from corecli.cli import cli
+
+    if cli._warm is not None:
+        raise click.UsageError('already running inside corecli daemon')
+    serve(socket_path or default_socket_path(), idle_timeout)
@@ -0,0 +1,160 @@
+# coding: utf-8
+"""env:sync: 把很多app的环境变量同步成文件里写的样子.
+
+先并发拿现在的值, 在本地按key比较, 只PUT变了的那些, PUT也是并发的.
+"""
+import os
+
+import click
+import simplejson as json
+
+from corecli.cli.utils import ensure_single_zone, error, info, warn, run_parallel
+
+
+_EXTENSIONS = ('.yaml', '.yml', '.json')
+
+
+def _value(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        raise click.UsageError('env values must be scalars, got %r' % (value,))
+    return json.dumps(value)
+
+
+def _load(path):
+    import yaml
+
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+def _add(desired, appname, envname, envvars, source):
+    if not isinstance(envvars, dict):
+        raise click.UsageError('%s: %s/%s must be a mapping of KEY: value' % (source, appname, envname))
+    if (appname, envname) in desired:
+        raise click.UsageError('%s: %s/%s is defined more than once' % (source, appname, envname))
+    desired[appname, envname] = dict((str(key), _value(value)) for key, value in envvars.items())
+
+
+def read_desired(path):
+    """path是一个文件: {app: {env: {KEY: value}}};
+    或者是一个目录: 里面的文件同上, 子目录<app>/<env>.yaml里是{KEY: value}.
+    返回{(appname, envname): {KEY: value}}, value都是字符串.
+    """
+    desired = {}
+    if not os.path.isdir(path):
+        files = [(path, None, None)]
+    else:
+        files = []
+        for name in sorted(os.listdir(path)):
+            full = os.path.join(path, name)
+            if os.path.isdir(full):
+                files.extend((os.path.join(full, f), name, os.path.splitext(f)[0])
+                             for f in sorted(os.listdir(full)) if f.endswith(_EXTENSIONS))
+            elif name.endswith(_EXTENSIONS):
+                files.append((full, None, None))
+
+    for source, appname, envname in files:
+        content = _load(source)
+        if appname is not None:
+            _add(desired, appname, envname, content, source)
+            continue
+        if not isinstance(content, dict):
+            raise click.UsageError('%s must be a mapping of app: {env: {KEY: value}}' % source)
+        for appname, envs in content.items():
+            if not isinstance(envs, dict):
+                raise click.UsageError('%s: %s must be a mapping of env: {KEY: value}' % (source, appname))
+            for envname, envvars in envs.items():
+                _add(desired, str(appname), str(envname), envvars, source)
+    return desired
+
+
+def diff_env(current, desired):
+    """返回[(change, key, old, new)], change是+ / - / ~, 按key排序."""
+    changes = []
+    for key in sorted(set(current) | set(desired)):
+        if key not in current:
+            changes.append(('+', key, None, desired[key]))
+        elif key not in desired:
+            changes.append(('-', key, current[key], None))
+        elif current[key] != desired[key]:
+            changes.append(('~', key, current[key], desired[key]))
+    return changes
+
+
+def fetch_current(core, appnames, pairs, parallel):
+    """返回{(appname, envname): vars}, 还不存在的env是None. 先拿每个app有哪些env, 再拿存在的env的值."""
+    existing = {}
+    for appname, envs, exc in run_parallel(core.get_app_envs, appnames, parallel):
+        if exc is not None:
+            raise exc
+        existing[appname] = set(env['envname'] for env in envs)
+
+    current = dict((pair, None) for pair in pairs if pair[1] not in existing[pair[0]])
+    for pair, env, exc in run_parallel(lambda pair: core.get_app_env(*pair), [p for p in pairs if p not in current], parallel):
+        if exc is not None:
+            raise exc
+        current[pair] = dict(env.get('vars') or {})
+    return current
+
+
+def _describe(change, key, old, new, show_values):
+    if not show_values:
+        return '  %s %s' % (change, key)
+    if change == '+':
+        return '  + %s=%s' % (key, new)
+    if change == '-':
+        return '  - %s=%s' % (key, old)
+    return '  ~ %s: %s -> %s' % (key, old, new)
+
+
+@click.argument('path', type=click.Path(exists=True))
+@click.option('--dry-run', default=False, is_flag=True, help='only print what would change')
+@click.option('--merge', default=False, is_flag=True, help='only add and change keys, keep keys that are not in PATH')
+@click.option('--show-values', default=False, is_flag=True, help='print values in the diff, not only keys')
+@click.option('--parallel', default=8, type=int, help='how many requests to run at the same time')
+@click.pass_context
+def sync_envs(ctx, path, dry_run, merge, show_values, parallel):
+    """make env sets of many apps match PATH, a file or directory"""
+    from citadelpy import CoreAPIError
+
+    ensure_single_zone(ctx)
+    desired = read_desired(path)
+    if not desired:
+        click.echo(warn('No env sets in %s' % path))
+        return
+
+    core = ctx.obj['coreapi']
+    pairs = sorted(desired)
+    try:
+        current = fetch_current(core, sorted(set(appname for appname, _ in pairs)), pairs, parallel)
+    except CoreAPIError as e:
+        click.echo(error(str(e)))
+        ctx.exit(-1)
+
+    updates = []
+    for pair in pairs:
+        old = current[pair] or {}
+        target = dict(old, **desired[pair]) if merge else desired[pair]
+        changes = diff_env(old, target)
+        if not changes and current[pair] is not None:
+            continue
+        updates.append((pair, target))
+        click.echo('%s/%s%s' % (pair[0], pair[1], ' (new)' if current[pair] is None else ''))
+        for change in changes:
+            click.echo(_describe(*change, show_values=show_values))
+
+    unchanged = len(pairs) - len(updates)
+    if dry_run or not updates:
+        click.echo(info('%d env sets to change, %d unchanged%s' % (len(updates), unchanged, ', dry run' if dry_run else '')))
+        return
+
+    results = run_parallel(lambda item: core.set_app_env(item[0][0], item[0][1], **item[1]), updates, parallel)
+    failed = [(pair, exc) for (pair, _), _, exc in results if exc is not None]
+    for (appname, envname), exc in failed:
+        click.echo(error('%s/%s: %s' % (appname, envname, exc)))
+    if failed:
+        click.echo(error('%d of %d env sets failed to update' % (len(failed), len(updates))))
+        ctx.exit(-1)
+    click.echo(info('%d env sets updated, %d unchanged' % (len(updates), unchanged)))
@@ -0,0 +1,219 @@
+# coding: utf-8
+"""inventory:sync / inventory:query: 整个集群的容器放在本地的一个sqlite里, 查的时候不用问citadel.
+
+sync并发地拉每个pod的容器和节点, 每个pod记下ETag, 下次sync的时候没变的pod
+citadel返回304, 不用重新下载, 也不用重写. 没了的pod整个删掉.
+query按节点, app, sha, IP, entrypoint查, 这些列都有索引.
+"""
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import click
+
+from corecli.cli.utils import CONTAINER_FIELDS, CONTAINER_HEADER, error, info, warn, run_parallel
+
+
+DEFAULT_INVENTORY_PATH = os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'corecli', 'inventory.sqlite')
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS pods (zone TEXT, podname TEXT, etag TEXT, synced_at REAL, PRIMARY KEY (zone, podname))',
+    'CREATE TABLE IF NOT EXISTS nodes (zone TEXT, podname TEXT, nodename TEXT, available INTEGER, PRIMARY KEY (zone, nodename))',
+    'CREATE TABLE IF NOT EXISTS containers (zone TEXT, container_id TEXT, name TEXT, podname TEXT, nodename TEXT, '
+    'appname TEXT, sha TEXT, entrypoint TEXT, env TEXT, cpu_quota REAL, PRIMARY KEY (zone, container_id))',
+    'CREATE TABLE IF NOT EXISTS ips (zone TEXT, container_id TEXT, network TEXT, ip TEXT)',
+    'CREATE INDEX IF NOT EXISTS containers_pod ON containers (zone, podname)',
+    'CREATE INDEX IF NOT EXISTS containers_node ON containers (nodename)',
+    'CREATE INDEX IF NOT EXISTS containers_app ON containers (appname, entrypoint)',
+    'CREATE INDEX IF NOT EXISTS containers_sha ON containers (sha)',
+    'CREATE INDEX IF NOT EXISTS containers_entrypoint ON containers (entrypoint)',
+    'CREATE INDEX IF NOT EXISTS ips_ip ON ips (ip)',
+    'CREATE INDEX IF NOT EXISTS ips_container ON ips (zone, container_id)',
+)
+
+# 没有filter的时候也能用, 每个filter一个条件, 参数是用户给的值
+_FILTERS = (
+    ('node', 'c.nodename = ?'),
+    ('pod', 'c.podname = ?'),
+    ('app', 'c.appname = ?'),
+    ('entrypoint', 'c.entrypoint = ?'),
+    ('ip', 'EXISTS (SELECT 1 FROM ips i WHERE i.ip = ? AND i.zone = c.zone AND i.container_id = c.container_id)'),
+)
+
+
+class Inventory:
+
+    def __init__(self, path=DEFAULT_INVENTORY_PATH):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def etags(self, zone):
+        with closing(self._connect()) as conn:
+            return dict(conn.execute('SELECT podname, etag FROM pods WHERE zone = ?', (zone or '',)))
+
+    def replace_pod(self, zone, podname, containers, nodes, etag):
+        """一个事务里把pod的容器和节点整个换掉. containers, nodes: citadelpy.models的Container, Node."""
+        zone = zone or ''
+        container_rows, ip_rows = [], []
+        for c in containers:
+            container_rows.append((zone, c.container_id, c.name, podname, c.nodename, c.appname, c.sha, c.entrypoint, c.env, c.cpu_quota))
+            ip_rows.extend((zone, c.container_id, network, n.get('IPAddress')) for network, n in c.networks.items())
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute('DELETE FROM ips WHERE zone = ? AND container_id IN '
+                         '(SELECT container_id FROM containers WHERE zone = ? AND podname = ?)', (zone, zone, podname))
+            conn.execute('DELETE FROM containers WHERE zone = ? AND podname = ?', (zone, podname))
+            conn.execute('DELETE FROM nodes WHERE zone = ? AND podname = ?', (zone, podname))
+            conn.executemany('INSERT OR REPLACE INTO containers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', container_rows)
+            conn.executemany('INSERT INTO ips VALUES (?, ?, ?, ?)', ip_rows)
+            conn.executemany('INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?)',
+                             [(zone, podname, n.name, int(n.available)) for n in nodes])
+            conn.execute('INSERT OR REPLACE INTO pods VALUES (?, ?, ?, ?)', (zone, podname, etag, time.time()))
+
+    def touch_pod(self, zone, podname):
+        with closing(self._connect()) as conn, conn:
+            conn.execute('UPDATE pods SET synced_at = ? WHERE zone = ? AND podname = ?', (time.time(), zone or '', podname))
+
+    def remove_pods_except(self, zone, podnames):
+        """删掉zone里不在podnames里的pod, 返回删掉的pod."""
+        zone = zone or ''
+        with closing(self._connect()) as conn, conn:
+            gone = [p for (p,) in conn.execute('SELECT podname FROM pods WHERE zone = ?', (zone,)) if p not in podnames]
+            for podname in gone:
+                conn.execute('DELETE FROM ips WHERE zone = ? AND container_id IN '
+                             '(SELECT container_id FROM containers WHERE zone = ? AND podname = ?)', (zone, zone, podname))
+                for table in ('containers', 'nodes', 'pods'):
+                    conn.execute('DELETE FROM %s WHERE zone = ? AND podname = ?' % table, (zone, podname))
+        return gone
+
+    def query(self, sha=None, **filters):
+        """filters: node, pod, app, entrypoint, ip, 都是等于; sha是前缀. 返回[(zone, row)], row同CONTAINER_HEADER."""
+        conditions, params = [], []
+        for name, condition in _FILTERS:
+            if filters.get(name):
+                conditions.append(condition)
+                params.append(filters[name])
+        if sha:
+            # 前缀查询也能用上索引
+            conditions.append('c.sha >= ? AND c.sha < ?')
+            params.extend([sha, sha + '\U0010ffff'])
+
+        sql = ('SELECT c.zone, c.name, c.container_id, c.nodename, c.podname, c.appname, c.sha, c.entrypoint, c.env, c.cpu_quota, '
+               "(SELECT group_concat(i.network || ':' || i.ip, ',') FROM ips i WHERE i.zone = c.zone AND i.container_id = c.container_id) "
+               'FROM containers c')
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY c.zone, c.appname, c.nodename, c.name'
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [(zone, [name, cid, node, pod, app, (sha or '')[:7], entrypoint, env, cpu, ips or ''])
+                for zone, name, cid, node, pod, app, sha, entrypoint, env, cpu, ips in rows]
+
+    def synced_at(self):
+        """最早同步的pod是什么时候同步的, 没同步过返回None."""
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT min(synced_at) FROM pods').fetchone()[0]
+
+
+def sync_zone(core, inventory, parallel=8):
+    """同步core.zone的所有pod, 返回(变了的pod, 没变的pod, 删掉的pod, [(失败的pod, exception)]).
+    失败的pod保留上次同步的内容.
+    """
+    from citadelpy.models import Container, Node
+
+    podnames = [p['name'] for p in core.get_pods()]
+    etags = inventory.etags(core.zone)
+
+    def _fetch(podname):
+        containers, etag = core.poll_pod_containers(podname, etags.get(podname), fields=CONTAINER_FIELDS, model=Container)
+        if containers is None:
+            return None
+        return containers, core.get_pod_nodes(podname, model=Node), etag
+
+    changed, unchanged, failed = [], [], []
+    for podname, result, exc in run_parallel(_fetch, podnames, parallel):
+        if exc is not None:
+            failed.append((podname, exc))
+        elif result is None:
+            inventory.touch_pod(core.zone, podname)
+            unchanged.append(podname)
+        else:
+            # 写sqlite只在这一个线程里做, 不用互相等锁
+            inventory.replace_pod(core.zone, podname, *result)
+            changed.append(podname)
+    return changed, unchanged, inventory.remove_pods_except(core.zone, set(podnames)), failed
+
+
+def _inventory_option(f):
+    return click.option('--db', default=DEFAULT_INVENTORY_PATH, help='inventory sqlite file')(f)
+
+
+@_inventory_option
+@click.option('--parallel', default=8, type=int, help='how many pods to fetch at the same time')
+@click.pass_context
+def sync_inventory(ctx, db, parallel):
+    """fetch containers and nodes of every pod into the local inventory"""
+    from citadelpy import CoreAPIError
+
+    store = Inventory(db)
+    core = ctx.obj['coreapi']
+    zones = ctx.obj['zones'] or [core.zone]
+    failed = False
+    for zone in zones:
+        started = time.time()
+        name = zone or 'default zone'
+        try:
+            changed, unchanged, removed, errors = sync_zone(core.with_zone(zone), store, parallel)
+        except CoreAPIError as e:
+            click.echo(error('%s: %s' % (name, e)))
+            failed = True
+            continue
+        for podname, exc in errors:
+            click.echo(error('%s: pod %s: %s' % (name, podname, exc)))
+        failed = failed or bool(errors)
+        click.echo(info('%s: %d pods updated, %d unchanged, %d removed, %d failed in %.1fs'
+                        % (name, len(changed), len(unchanged), len(removed), len(errors), time.time() - started)))
+    if failed:
+        ctx.exit(-1)
+
+
+@_inventory_option
+@click.option('--node', default='', help='containers on this node')
+@click.option('--pod', default='', help='containers in this pod')
+@click.option('--app', default='', help='containers of this app')
+@click.option('--sha', default='', help='containers running this sha, prefix is fine')
+@click.option('--ip', default='', help='container with this IP')
+@click.option('--entrypoint', default='', help='containers of this entrypoint')
+@click.pass_context
+def query_inventory(ctx, db, node, pod, app, sha, ip, entrypoint):
+    """look up containers in the local inventory, run `inventory:sync` first"""
+    from corecli.cli.output import renderer
+
+    store = Inventory(db)
+    synced_at = store.synced_at()
+    if synced_at is None:
+        click.echo(error('Inventory %s is empty, run `corecli inventory:sync` first' % db))
+        ctx.exit(-1)
+    age = time.time() - synced_at
+    if age > 3600:
+        click.echo(warn('Inventory was synced %.1f hours ago' % (age / 3600)), err=True)
+
+    rows = store.query(node=node, pod=pod, app=app, sha=sha, ip=ip, entrypoint=entrypoint)
+    out = renderer(ctx.obj['output'], ['zone'] + CONTAINER_HEADER, sample=len(rows) or 1)
+    for zone, row in rows:
+        out.add_row([zone] + row)
+    out.close()
@@ -0,0 +1,165 @@
+# coding: utf-8
+"""corecli log: 跟一个或者几个节点上的app日志.
+
+几个节点同时跟的时候每个节点一个线程, 收到的日志先在一个小窗口 (--merge-window秒)
+里按datetime排好再输出, 不同节点的日志交错在一起也是按时间顺序的.
+输出是攒一批写一次, 不是一行一个click.echo.
+"""
+import heapq
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+
+import click
+
+from corecli.cli.utils import ensure_single_zone, error
+
+
+def format_log(m):
+    return '[%s, %s, %s, %s, %s] %s' % (m.get('datetime'), m.get('type'), m.get('entrypoint'), (m.get('id') or '')[:7], m.get('ident'), m.get('data'))
+
+
+class BatchWriter:
+    """攒到max_lines行或者离上次写过了interval秒就写一次."""
+
+    def __init__(self, max_lines=1000, interval=0.1, echo=click.echo):
+        self.max_lines = max_lines
+        self.interval = interval
+        self.echo = echo
+        self._lines = []
+        self._flushed_at = time.time()
+
+    def write(self, line):
+        self._lines.append(line)
+        if len(self._lines) >= self.max_lines or time.time() - self._flushed_at >= self.interval:
+            self.flush()
+
+    def idle(self):
+        if time.time() - self._flushed_at >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            self.echo('\n'.join(self._lines))
+            self._lines = []
+        self._flushed_at = time.time()
+
+
+class TailBuffer:
+    """只留最后n行, 结束的时候一起写出去."""
+
+    def __init__(self, n, echo=click.echo):
+        self._lines = deque(maxlen=n)
+        self.echo = echo
+
+    def write(self, line):
+        self._lines.append(line)
+
+    def idle(self):
+        pass
+
+    def flush(self):
+        if self._lines:
+            self.echo('\n'.join(self._lines))
+            self._lines.clear()
+
+
+def merge_streams(streams, window=0.5, poll=0.05):
+    """streams: {name: 产生日志的iterable}, 每个一个线程读.
+    产生(name, m, None), 某个stream出错的时候产生(name, None, exception),
+    一段时间没有新的日志的时候产生(None, None, None).
+    收到之后最多等window秒, 这段时间里到的按datetime排序之后再产生.
+    """
+    results = queue.Queue(10000)
+    done = object()
+    stop = threading.Event()
+
+    def _put(value):
+        while not stop.is_set():
+            try:
+                results.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(name, stream):
+        try:
+            for m in stream:
+                if not _put((name, m, None)):
+                    return
+        except Exception as e:
+            _put((name, None, e))
+        finally:
+            _put((name, done, None))
+
+    for name, stream in streams.items():
+        threading.Thread(target=_run, args=(name, stream), daemon=True).start()
+
+    heap = []
+    seq = itertools.count()
+    remaining = len(streams)
+    try:
+        while remaining or heap:
+            try:
+                name, m, exc = results.get(timeout=poll)
+            except queue.Empty:
+                # 告诉调用的人现在没有新的日志, 可以把攒着的写出去
+                yield None, None, None
+            else:
+                if m is done:
+                    remaining -= 1
+                elif exc is not None:
+                    yield name, None, exc
+                else:
+                    heapq.heappush(heap, (str(m.get('datetime') or ''), next(seq), time.time(), name, m))
+
+            # 时间最早的一条等够了window就吐出来, 都结束了就不用再等了;
+            # 它后面的要等它出去, 所以最多等两个window
+            deadline = time.time() - window if remaining else float('inf')
+            while heap and (heap[0][2] <= deadline or len(heap) > 10000):
+                _, _, _, name, m = heapq.heappop(heap)
+                yield name, m, None
+    finally:
+        stop.set()
+
+
+@click.argument('nodename')
+@click.argument('appname')
+@click.option('--entrypoint', default='', help='only logs of this entrypoint')
+@click.option('--container', default='', help='only logs of this container id')
+@click.option('--type', 'log_type', default='', help='only logs of this type, e.g. stdout / stderr')
+@click.option('--since', default='', help='start from this datetime, in the same format as the log datetime')
+@click.option('--tail', default=0, type=int, help='keep only the last N lines in memory and print them when the stream ends or on Ctrl-C')
+@click.option('--merge-window', default=0.5, type=float, help='seconds to hold lines from several nodes to print them in time order')
+@click.pass_context
+def log(ctx, nodename, appname, entrypoint, container, log_type, since, tail, merge_window):
+    """follow logs of APPNAME on NODENAME, NODENAME can be n1,n2 to follow several nodes"""
+    ensure_single_zone(ctx)
+    core = ctx.obj['coreapi']
+    nodenames = [n for n in nodename.split(',') if n]
+    if not nodenames:
+        raise click.BadParameter('no nodename given', param_hint='NODENAME')
+
+    streams = dict((n, core.stream_logs(n, appname, entrypoint=entrypoint, container=container, type=log_type, since=since or None))
+                   for n in nodenames)
+    out = TailBuffer(tail) if tail else BatchWriter()
+    failed = []
+    try:
+        for name, m, exc in merge_streams(streams, window=merge_window if len(nodenames) > 1 else 0):
+            if name is None:
+                out.idle()
+                continue
+            if exc is not None:
+                click.echo(error('%s: %s' % (name, exc)), err=True)
+                failed.append(name)
+                continue
+            out.write(format_log(m))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        out.flush()
+    if failed:
+        ctx.exit(-1)
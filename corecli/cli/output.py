@@ -0,0 +1,188 @@
+# coding: utf-8
+"""表格输出, 行来一行打一行, 不用等全部结果.
+
+table: 和PrettyTable一样的格式, 列宽只按前sample行算, 后面更宽的行会超出去.
+中文这种宽字符按两列算, 单元格里的换行拆成多行.
+json: 一个数组, 每行是一个以表头为key的object, 一行一行地输出, 不会攒到最后.
+jsonl: 一行一个object, 没有外面的数组.
+csv: 第一行是表头, 引号和转义按RFC 4180.
+tsv: 一行一条, tab分隔, 第一行是表头, 单元格里的\\, tab和换行转义成\\\\, \\t, \\n.
+
+出错的行用add_error(prefix, message)加, json / jsonl里是{..., "error": message}.
+"""
+import csv
+import json
+import re
+
+import click
+from wcwidth import wcswidth
+
+
+FORMATS = ('table', 'json', 'jsonl', 'csv', 'tsv')
+
+_ANSI = re.compile(r'\x1b\[[0-9;]*m')
+
+
+def _width(text):
+    # 和PrettyTable一样按终端上占的列数算, 控制字符wcswidth返回-1
+    return max(wcswidth(_ANSI.sub('', text)), 0)
+
+
+def _split(row):
+    """每个单元格按换行拆开, 补齐成同样的行数."""
+    cells = [cell.split('\n') for cell in row]
+    height = max(len(lines) for lines in cells) if cells else 1
+    return [[lines[i] if i < len(lines) else '' for lines in cells] for i in range(height)]
+
+
+def _justify(text, width, align):
+    excess = width - _width(text)
+    if excess <= 0:
+        return text
+    if align == 'l':
+        return text + ' ' * excess
+    if align == 'r':
+        return ' ' * excess + text
+    # 和PrettyTable一样, 多出来的一个空格放在哪边取决于内容长度的奇偶
+    left = excess // 2
+    if excess % 2 and not _width(text) % 2:
+        left += 1
+    return ' ' * left + text + ' ' * (excess - left)
+
+
+class StreamingTable:
+
+    def __init__(self, header, align=None, sample=100, echo=click.echo):
+        self.header = [str(h) for h in header]
+        self.align = [(align or {}).get(h, 'c') for h in self.header]
+        self.sample = sample
+        self.echo = echo
+        self._buffered = []
+        self._widths = None
+
+    def _border(self):
+        return '+' + '+'.join('-' * (w + 2) for w in self._widths) + '+'
+
+    def _line(self, cells):
+        return '|' + '|'.join(' %s ' % _justify(c, w, a) for c, w, a in zip(cells, self._widths, self.align)) + '|'
+
+    def _echo_row(self, row):
+        for cells in _split(row):
+            self.echo(self._line(cells))
+
+    def _start(self):
+        rows = [self.header] + self._buffered
+        self._widths = [max(_width(line) for row in rows for line in row[i].split('\n')) for i in range(len(self.header))]
+        border = self._border()
+        self.echo(border)
+        self._echo_row(self.header)
+        self.echo(border)
+        for row in self._buffered:
+            self._echo_row(row)
+        self._buffered = None
+
+    def add_row(self, row):
+        row = [str(cell) for cell in row]
+        if self._widths is not None:
+            self._echo_row(row)
+            return
+        self._buffered.append(row)
+        if len(self._buffered) >= self.sample:
+            self._start()
+
+    def add_error(self, prefix, message):
+        from corecli.cli.utils import error
+        self.add_row(list(prefix) + [error(message)] + [''] * (len(self.header) - len(prefix) - 1))
+
+    def close(self):
+        if self._widths is None:
+            self._start()
+        self.echo(self._border())
+
+
+def _padded(header, prefix, message):
+    return list(prefix) + [message] + [''] * (len(header) - len(prefix) - 1)
+
+
+def _tsv_cell(cell):
+    return str(cell).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class TSVWriter:
+
+    def __init__(self, header, echo=click.echo):
+        self.header = header
+        self.echo = echo
+        self.add_row(header)
+
+    def add_row(self, row):
+        self.echo('\t'.join(_tsv_cell(cell) for cell in row))
+
+    def add_error(self, prefix, message):
+        self.add_row(_padded(self.header, prefix, message))
+
+    def close(self):
+        pass
+
+
+class CSVWriter:
+
+    def __init__(self, header, echo=click.echo):
+        self.header = header
+        self.echo = echo
+        # csv.writer只要一个有write方法的对象, 每行写一次
+        self._writer = csv.writer(self, lineterminator='\n')
+        self.add_row(header)
+
+    def write(self, line):
+        self.echo(line, nl=False)
+
+    def add_row(self, row):
+        self._writer.writerow(row)
+
+    def add_error(self, prefix, message):
+        self.add_row(_padded(self.header, prefix, message))
+
+    def close(self):
+        pass
+
+
+class JSONWriter:
+    """array=False就是jsonl."""
+
+    def __init__(self, header, array=True, echo=click.echo):
+        self.header = [str(h) for h in header]
+        self.array = array
+        self.echo = echo
+        self._count = 0
+        self._encode = json.JSONEncoder(ensure_ascii=False, default=str).encode
+
+    def _write(self, record):
+        line = self._encode(record)
+        if self.array:
+            line = ('[' if not self._count else ',') + line
+        self._count += 1
+        self.echo(line)
+
+    def add_row(self, row):
+        self._write(dict(zip(self.header, row)))
+
+    def add_error(self, prefix, message):
+        record = dict(zip(self.header, prefix))
+        record['error'] = message
+        self._write(record)
+
+    def close(self):
+        if self.array:
+            self.echo(']' if self._count else '[]')
+
+
+def renderer(fmt, header, align=None, sample=100):
+    """fmt: FORMATS里的一个. table格式的时候前sample行用来算列宽."""
+    if fmt == 'tsv':
+        return TSVWriter(header)
+    if fmt == 'csv':
+        return CSVWriter(header)
+    if fmt in ('json', 'jsonl'):
+        return JSONWriter(header, array=fmt == 'json')
+    return StreamingTable(header, align=align, sample=sample)
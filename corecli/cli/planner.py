@@ -0,0 +1,196 @@
+# coding: utf-8
+"""按getmemcap和pod的节点信息算一批容器放不放得下, 放在哪.
+
+每个节点的空闲内存是total - used_by_memcap, 也就是citadel调度的时候看到的memcap.
+节点的cpu是{核: 剩下的份额}, CPU_SHARE份是一整个核, 和citadel一样整数部分要独占核,
+小数部分可以和别的容器共用一个核. 没有cpu信息的节点只看内存.
+
+放的时候按best fit: 先放大的, 每个容器放到放得下的节点里空闲内存最少的那个,
+空闲内存排好序, 用bisect找节点, 剩下的大块留给后面的容器. citadel实际的调度
+不一定这么放, 这里只是回答"放不放得下", 放得下citadel就不会在部署到一半的时候报内存不够.
+"""
+import bisect
+
+from corecli.cli.utils import run_parallel
+
+
+CPU_SHARE = 10
+
+
+class PlanError(Exception):
+    pass
+
+
+class NodeCapacity:
+
+    def __init__(self, podname, name, memory, cores=None):
+        self.podname = podname
+        self.name = name
+        self.memory = memory
+        # None表示不知道cpu, 不检查
+        self.cores = dict(cores) if cores is not None else None
+        self.placed = 0
+        self.free_memory_before = memory
+        self.free_cpu_before = self.free_cpu
+
+    @property
+    def free_cpu(self):
+        if self.cores is None:
+            return None
+        return sum(self.cores.values()) / float(CPU_SHARE)
+
+    def _pick_cores(self, cpu):
+        """返回[(核, 份额)], 放不下返回None."""
+        if not cpu or self.cores is None:
+            return []
+        full = int(cpu)
+        part = int(round((cpu - full) * CPU_SHARE))
+        picked = [(core, CPU_SHARE) for core, share in sorted(self.cores.items()) if share >= CPU_SHARE][:full]
+        if len(picked) < full:
+            return None
+        if part:
+            used = set(core for core, _ in picked)
+            # 小数部分也是best fit, 找剩得最少但够用的核
+            candidates = [(share, core) for core, share in self.cores.items() if share >= part and core not in used]
+            if not candidates:
+                return None
+            picked.append((min(candidates)[1], part))
+        return picked
+
+    def fits(self, memory, cpu):
+        return memory <= self.memory and self._pick_cores(cpu) is not None
+
+    def place(self, memory, cpu):
+        for core, share in self._pick_cores(cpu):
+            self.cores[core] -= share
+        self.memory -= memory
+        self.placed += 1
+
+    def capacity(self, memory, cpu):
+        """还能放多少个(memory, cpu)的容器."""
+        if memory <= 0:
+            raise PlanError('memory must be positive')
+        count = int(self.memory // memory)
+        if not cpu or self.cores is None:
+            return count
+        saved = dict(self.cores)
+        slots = 0
+        while slots < count and self._pick_cores(cpu) is not None:
+            for core, share in self._pick_cores(cpu):
+                self.cores[core] -= share
+            slots += 1
+        self.cores = saved
+        return slots
+
+
+def node_capacities(podname, memcap, nodes):
+    """memcap: get_memcap的结果, nodes: get_pod_nodes(model=Node)的结果. 不可用的节点不算."""
+    capacities = []
+    for node in nodes:
+        name = node.name
+        if not node.available or name not in memcap:
+            continue
+        mem = memcap[name]
+        cores = node.cpu
+        if cores is not None:
+            cores = dict((str(core), int(share)) for core, share in cores.items())
+        capacities.append(NodeCapacity(podname, name, mem['total'] - mem['used_by_memcap'], cores))
+    return capacities
+
+
+def fetch_capacities(core, podnames):
+    """并发拿每个pod的getmemcap和节点列表, 返回{podname: [NodeCapacity]}."""
+    from citadelpy.models import Node
+
+    jobs = [(podname, what) for podname in podnames for what in ('memcap', 'nodes')]
+
+    def _fetch(job):
+        podname, what = job
+        return core.get_memcap(podname) if what == 'memcap' else core.get_pod_nodes(podname, model=Node)
+
+    results = {}
+    for (podname, what), result, exc in run_parallel(_fetch, jobs, len(jobs)):
+        if exc is not None:
+            raise exc
+        results[podname, what] = result
+    return dict((podname, node_capacities(podname, results[podname, 'memcap'], results[podname, 'nodes'])) for podname in podnames)
+
+
+class Plan:
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.placements = []
+        self.unplaced = []
+
+    @property
+    def ok(self):
+        return not self.unplaced
+
+    def headroom(self, memory, cpu):
+        """都放完之后还能再放多少个(memory, cpu)的容器."""
+        return sum(node.capacity(memory, cpu) for node in self.nodes)
+
+    def fragmentation(self, memory, cpu):
+        """剩下的空闲内存里有多少比例放不下一个(memory, cpu)的容器, 0到1."""
+        free = sum(node.memory for node in self.nodes)
+        if free <= 0:
+            return 0.0
+        usable = sum(node.capacity(memory, cpu) for node in self.nodes) * memory
+        return max(0.0, (free - usable) / float(free))
+
+
+def plan(nodes, requests):
+    """nodes: [NodeCapacity], 会被修改. requests: [(memory, cpu, count, nodename)], nodename可以为空.
+    返回Plan, placements是[(request下标, NodeCapacity)], unplaced是[(request下标, 没放下的个数)].
+    """
+    result = Plan(nodes)
+    # 空闲内存从小到大, keys和order一一对应
+    order = sorted(nodes, key=lambda n: n.memory)
+    keys = [n.memory for n in order]
+
+    def _take(index):
+        node = order.pop(index)
+        keys.pop(index)
+        return node
+
+    def _put(node):
+        index = bisect.bisect_left(keys, node.memory)
+        keys.insert(index, node.memory)
+        order.insert(index, node)
+
+    for i in sorted(range(len(requests)), key=lambda i: (-requests[i][0], -(requests[i][1] or 0))):
+        memory, cpu, count, nodename = requests[i]
+        missing = 0
+        for _ in range(count):
+            index = bisect.bisect_left(keys, memory)
+            while index < len(order) and not (order[index].fits(memory, cpu) and (not nodename or order[index].name == nodename)):
+                index += 1
+            if index == len(order):
+                missing += 1
+                continue
+            node = _take(index)
+            node.place(memory, cpu)
+            _put(node)
+            result.placements.append((i, node))
+        if missing:
+            result.unplaced.append((i, missing))
+    return result
+
+
+def preflight(core, targets):
+    """targets: [(podname, memory, cpu, count, nodename)], 部署之前检查每个pod放不放得下.
+    放不下的时候抛PlanError, 说明哪个pod差几个.
+    """
+    podnames = sorted(set(t[0] for t in targets))
+    capacities = fetch_capacities(core, podnames)
+    problems = []
+    for podname in podnames:
+        requests = [t[1:] for t in targets if t[0] == podname]
+        result = plan(capacities[podname], requests)
+        for i, missing in result.unplaced:
+            memory, cpu, count, nodename = requests[i]
+            where = '%s/%s' % (podname, nodename) if nodename else podname
+            problems.append('%s: %d of %d containers (memory %d, cpu %s) do not fit' % (where, missing, count, memory, cpu or 0))
+    if problems:
+        raise PlanError('; '.join(problems))
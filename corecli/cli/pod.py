@@ -1,24 +1,87 @@
 # coding: utf-8
 
 import click
-from prettytable import PrettyTable
+
+from corecli.cli.utils import echo_table, echo_rows, ensure_single_zone, error, info, page_size_option, CONTAINER_FIELDS, CONTAINER_HEADER, container_key, container_row
+from corecli.cli.watch import watch_options, watch_rows
 
 
 @click.argument('podname')
 @click.pass_context
 def get_memcap(ctx, podname):
-    core = ctx.obj['coreapi']
-    res = core.get_memcap(podname)
-    table = PrettyTable(['node', 'total', 'used', 'used_by_memcap', 'diff'])
-    for node, info in res.items():
-        table.add_row([node, info['total'], info['used'], info['used_by_memcap'], info['diff']])
+    def _rows(core):
+        res = core.get_memcap(podname)
+        return [[node, info['total'], info['used'], info['used_by_memcap'], info['diff']] for node, info in res.items()]
 
-    click.echo(table)
+    echo_table(ctx, ['node', 'total', 'used', 'used_by_memcap', 'diff'], _rows)
 
 
 @click.argument('podname')
 @click.pass_context
 def sync_memcap(ctx, podname):
+    ensure_single_zone(ctx)
     core = ctx.obj['coreapi']
     res = core.sync_memcap(podname)
     click.echo(res)
+
+
+@click.argument('podname')
+@page_size_option
+@watch_options
+@click.pass_context
+def get_pod_containers(ctx, podname, page_size, watch, interval, max_interval):
+    from citadelpy.models import Container
+
+    if watch:
+        watch_rows(ctx, CONTAINER_HEADER, lambda core, etag: core.poll_pod_containers(podname, etag, fields=CONTAINER_FIELDS, model=Container),
+                   container_row, container_key, interval, max_interval)
+        return
+
+    def _rows(core):
+        return (container_row(c) for c in core.iter_pod_containers(podname, page_size=page_size, fields=CONTAINER_FIELDS, model=Container))
+
+    echo_rows(ctx, CONTAINER_HEADER, _rows)
+
+
+@click.argument('podnames', nargs=-1, required=True)
+@click.option('--memory', default=536870912, type=float, help='memory of each container, e.g. --memory 536870912')
+@click.option('--cpu', default=0, type=float, help='CPUs of each container, e.g. --cpu 1.5')
+@click.option('--count', default=1, type=int, help='how many containers to place in each pod')
+@click.option('--nodename', default='', help='only place on this node')
+@click.pass_context
+def plan_pod(ctx, podnames, memory, cpu, count, nodename):
+    """check whether COUNT containers fit in each pod, and where"""
+    from citadelpy import CoreAPIError
+    from corecli.cli.output import renderer
+    from corecli.cli.planner import PlanError, fetch_capacities, plan
+
+    ensure_single_zone(ctx)
+    if memory <= 0 or count <= 0:
+        raise click.BadParameter('--memory and --count must be positive')
+
+    try:
+        capacities = fetch_capacities(ctx.obj['coreapi'], podnames)
+    except (CoreAPIError, PlanError) as e:
+        click.echo(error(str(e)))
+        ctx.exit(-1)
+
+    fmt = ctx.obj['output']
+    out = renderer(fmt, ['pod', 'node', 'free_memory', 'free_cpu', 'place', 'memory_after', 'headroom'], sample=sum(len(n) for n in capacities.values()) or 1)
+    summaries, failed = [], 0
+    for podname in podnames:
+        result = plan(capacities[podname], [(memory, cpu, count, nodename)])
+        for node in sorted(result.nodes, key=lambda n: n.name):
+            free_cpu = '' if node.free_cpu_before is None else node.free_cpu_before
+            out.add_row([podname, node.name, int(node.free_memory_before), free_cpu, node.placed, int(node.memory), node.capacity(memory, cpu)])
+        if not result.ok:
+            failed += 1
+        line = '%s: %d of %d containers fit, headroom %d more, fragmentation %.1f%%' % (
+            podname, len(result.placements), count, result.headroom(memory, cpu), 100 * result.fragmentation(memory, cpu))
+        summaries.append(info(line) if result.ok else error(line))
+    out.close()
+
+    # 机器读的格式只有表格在stdout上
+    for line in summaries:
+        click.echo(line, err=fmt != 'table')
+    if failed:
+        ctx.exit(-1)
@@ -0,0 +1,110 @@
+# coding: utf-8
+"""--profile用的计时.
+
+span(category, name)记录一段耗时, 没开--profile的时候什么都不做.
+HTTP请求的耗时通过CoreAPI的after_request hook拿到, 按connect / ttfb /
+body / decode拆开. 结束的时候打印每一类的汇总, 也可以写成Chrome的
+trace event格式, 在chrome://tracing或者perfetto里打开.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import simplejson as json
+
+
+_profiler = None
+
+
+class Profiler:
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add(self, category, name, start, duration, **args):
+        with self._lock:
+            self.events.append((category, name, start, duration, threading.current_thread().ident, args))
+
+    @contextmanager
+    def span(self, category, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(category, name, start, time.perf_counter() - start, **args)
+
+    def on_request(self, timing):
+        """CoreAPI after_request hook, 一个请求拆成连续的几段."""
+        name = '%s %s' % (timing.method, timing.path)
+        args = {'status': timing.status, 'bytes': timing.bytes, 'cached': timing.cached}
+        if timing.error:
+            args['error'] = timing.error
+        self.add('http', name, timing.start, timing.elapsed, **args)
+
+        offset = timing.start
+        for phase in ('connect', 'ttfb', 'body', 'decode'):
+            duration = getattr(timing, phase)
+            if duration:
+                self.add('http.' + phase, name, offset, duration)
+                offset += duration
+
+    def summary(self):
+        """{category: (count, seconds)}, 按耗时从大到小."""
+        totals = {}
+        with self._lock:
+            for category, _, _, duration, _, _ in self.events:
+                count, spent = totals.get(category, (0, 0.0))
+                totals[category] = (count + 1, spent + duration)
+        return OrderedDict(sorted(totals.items(), key=lambda item: -item[1][1]))
+
+    def report(self):
+        wall = time.perf_counter() - self.start
+        lines = ['%-14s %6s %10s %7s' % ('phase', 'count', 'total(ms)', 'wall%')]
+        for category, (count, spent) in self.summary().items():
+            lines.append('%-14s %6d %10.1f %6.1f%%' % (category, count, spent * 1000, spent / wall * 100 if wall else 0))
+        lines.append('%-14s %6s %10.1f' % ('wall', '', wall * 1000))
+        return '\n'.join(lines)
+
+    def write_trace(self, path):
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        trace = []
+        for category, name, start, duration, tid, args in events:
+            trace.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': (start - self.start) * 1e6,
+                'dur': duration * 1e6,
+                'pid': pid,
+                'tid': tid,
+                'args': args,
+            })
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+
+def enable():
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+@contextmanager
+def span(category, name, **args):
+    profiler = _profiler
+    if profiler is None:
+        yield
+        return
+    with profiler.span(category, name, **args):
+        yield
@@ -0,0 +1,50 @@
+# coding: utf-8
+"""多个任务同时跑的时候, 每个任务一行状态.
+
+终端上整块原地重画, 最多每interval秒一次; 输出不是终端 (CI日志) 的时候
+不重画, 只在任务开始和结束的时候打一行, 免得日志里全是进度.
+"""
+import sys
+import threading
+import time
+
+from corecli.cli.utils import echo
+
+
+class StatusBoard:
+
+    def __init__(self, names, tty=None, interval=0.2):
+        self.names = list(names)
+        self.status = [''] * len(self.names)
+        self.tty = sys.stdout.isatty() if tty is None else tty
+        self.interval = interval
+        self._width = max(len(name) for name in self.names) if self.names else 0
+        self._lock = threading.Lock()
+        self._drawn = 0
+        self._last_draw = 0
+
+    def _line(self, i):
+        return '%s  %s' % (self.names[i].ljust(self._width), self.status[i])
+
+    def _draw(self):
+        # 先回到上次画的第一行, 每行清掉重写
+        up = '\x1b[%dA' % self._drawn if self._drawn else ''
+        echo(up + '\n'.join('\r\x1b[2K' + self._line(i) for i in range(len(self.names))))
+        self._drawn = len(self.names)
+        self._last_draw = time.time()
+
+    def update(self, i, status, final=False):
+        """final: 任务的开始和结束, 不是终端的时候只打这些."""
+        with self._lock:
+            self.status[i] = status
+            if not self.tty:
+                if final:
+                    echo(self._line(i))
+                return
+            if final or time.time() - self._last_draw >= self.interval:
+                self._draw()
+
+    def close(self):
+        with self._lock:
+            if self.tty and self.names:
+                self._draw()
@@ -0,0 +1,137 @@
+# coding: utf-8
+"""分块并发删除容器.
+
+知道nodename的话按nodename分组, 每组再切成最多chunk_size个一块, 每块一个
+/remove请求, 多块同时跑. 失败的容器会退避重试, 删掉的ID记在本地journal里,
+中断之后重新跑会跳过已经删掉的; 全部删掉之后这次的ID从journal里去掉.
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import click
+
+from corecli.cli.utils import echo, error, info, warn, run_parallel
+
+
+DEFAULT_JOURNAL_PATH = os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'corecli', 'removed.journal')
+
+
+def removal_options(f):
+    f = click.option('--journal', default=DEFAULT_JOURNAL_PATH, help='file recording removed ids until the run succeeds, re-runs skip them, empty to disable')(f)
+    f = click.option('--retries', default=3, type=int, help='how many times to retry containers that failed to remove')(f)
+    f = click.option('--parallel', default=4, type=int, help='how many /remove requests to run at the same time')(f)
+    f = click.option('--chunk-size', default=50, type=int, help='max containers in one /remove request')(f)
+    return f
+
+
+class RemovalJournal:
+    """一行一个已经删掉的容器ID, 删的时候只追加, 整次都成功了再discard."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._removed = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._removed = set(line.strip() for line in f if line.strip())
+
+    def __contains__(self, container_id):
+        return container_id in self._removed
+
+    def record(self, container_id):
+        with self._lock:
+            self._removed.add(container_id)
+            if not self.path:
+                return
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(self.path, 'a') as f:
+                f.write(container_id + '\n')
+
+    def discard(self, ids):
+        """去掉这些ID, 剩下的写回去, 一个不剩就删掉文件."""
+        with self._lock:
+            self._removed.difference_update(ids)
+            if not self.path or not os.path.exists(self.path):
+                return
+            if not self._removed:
+                os.unlink(self.path)
+                return
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.writelines(container_id + '\n' for container_id in sorted(self._removed))
+            os.rename(tmp_path, self.path)
+
+
+def _chunks(containers, chunk_size):
+    """containers: [(id, nodename)], 返回[(nodename, [id])]."""
+    by_node = OrderedDict()
+    for container_id, nodename in containers:
+        by_node.setdefault(nodename or '', []).append(container_id)
+
+    chunk_size = max(1, chunk_size)
+    chunks = []
+    for nodename, ids in by_node.items():
+        chunks.extend((nodename, ids[i:i + chunk_size]) for i in range(0, len(ids), chunk_size))
+    return chunks
+
+
+def _backoff(attempt, base=0.5, cap=10):
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1)
+
+
+def remove_containers(core, containers, chunk_size=50, parallel=4, retries=3, journal_path=DEFAULT_JOURNAL_PATH):
+    """containers: [(id, nodename)], nodename不知道的话传None.
+    返回删除失败的ID列表.
+    """
+    journal = RemovalJournal(journal_path)
+    skipped = [container_id for container_id, _ in containers if container_id in journal]
+    if skipped:
+        echo(warn('Skip %d containers already removed according to %s' % (len(skipped), journal_path)))
+    containers = [(container_id, nodename) for container_id, nodename in containers if container_id not in journal]
+
+    def _remove_chunk(chunk):
+        nodename, ids = chunk
+        tag = '[%s]' % (nodename or '-')
+        pending = list(ids)
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(_backoff(attempt - 1))
+                echo(warn('%s Retry %d/%d for %d containers' % (tag, attempt, retries, len(pending))))
+
+            try:
+                for m in core.remove(pending):
+                    if m['success']:
+                        journal.record(m['id'])
+                        echo(info('%s Container %s removed successfully' % (tag, m['id'])))
+                    else:
+                        echo(error('%s Fail to remove %s, error: %s' % (tag, m['id'], m['message'])))
+            except Exception as e:
+                echo(error('%s Remove request failed: %s' % (tag, e)))
+
+            pending = [container_id for container_id in pending if container_id not in journal]
+            if not pending:
+                break
+        return pending
+
+    failed = []
+    for chunk, pending, exc in run_parallel(_remove_chunk, _chunks(containers, chunk_size), parallel):
+        failed.extend(chunk[1] if exc is not None else pending)
+    if not failed:
+        # 这次的都删掉了, 不用留着给重跑用, 免得以后的命令跳过
+        journal.discard(skipped + [container_id for container_id, _ in containers])
+    return failed
+
+
+def lookup_nodenames(core, ids, parallel):
+    """只有ID的时候并发查一下每个容器在哪个node上, 查不到的nodename是None.
+    每个ID一个请求, 只在remove --by-node的时候用.
+    """
+    def _nodename(container_id):
+        return core.get_container(container_id).get('nodename')
+
+    return [(container_id, nodename) for container_id, nodename, _ in run_parallel(_nodename, ids, parallel)]
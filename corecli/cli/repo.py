@@ -0,0 +1,279 @@
+# coding: utf-8
+"""当前git仓库的commit / branch / remote url.
+
+直接读.git下面的HEAD, refs, packed-refs和config, 不起git进程.
+读不了的情况 (设置了GIT_DIR之类的环境变量, config里有include,
+reftable, 还没有commit的分支...) 才退回去调git, commit和branch一次
+git rev-parse就拿到.
+结果按cwd缓存, HEAD / ref / packed-refs / config变了 (比如commit了,
+切了分支) 会重新读.
+"""
+import os
+import re
+
+from corecli.cli import profile as profiling
+
+
+# 这些环境变量会改变git找仓库/读配置的方式, 有的话就老老实实调git
+_GIT_ENV = ('GIT_DIR', 'GIT_WORK_TREE', 'GIT_COMMON_DIR', 'GIT_CEILING_DIRECTORIES',
+            'GIT_CONFIG', 'GIT_CONFIG_GLOBAL', 'GIT_CONFIG_SYSTEM', 'GIT_CONFIG_NOSYSTEM',
+            'GIT_CONFIG_COUNT', 'GIT_CONFIG_PARAMETERS')
+_SECTION_PATTERN = re.compile(r'^\[\s*([-\w.]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]\s*(.*)$')
+_KEY_PATTERN = re.compile(r'^([A-Za-z][-\w]*)\s*(?:=\s*(.*))?$')
+_ESCAPES = {'n': '\n', 't': '\t', 'b': '\b', '"': '"', '\\': '\\'}
+
+_repos = {}
+
+
+class GitError(Exception):
+    pass
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except (OSError, IOError):
+        return None
+
+
+def find_gitdir(cwd):
+    """从cwd往上找.git, 返回(gitdir, commondir), 找不到返回(None, None).
+    .git是文件的时候 (worktree, submodule) 跟着里面的gitdir走.
+    """
+    path = cwd
+    while True:
+        dotgit = os.path.join(path, '.git')
+        if os.path.isdir(dotgit):
+            gitdir = dotgit
+            break
+        if os.path.isfile(dotgit):
+            content = (_read(dotgit) or '').strip()
+            if not content.startswith('gitdir:'):
+                return None, None
+            gitdir = os.path.normpath(os.path.join(path, content[len('gitdir:'):].strip()))
+            break
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None, None
+        path = parent
+
+    if not os.path.isfile(os.path.join(gitdir, 'HEAD')):
+        return None, None
+    commondir = (_read(os.path.join(gitdir, 'commondir')) or '').strip()
+    commondir = os.path.normpath(os.path.join(gitdir, commondir)) if commondir else gitdir
+    return gitdir, commondir
+
+
+def _unquote(raw):
+    """git config的值: 去掉引号, 处理转义, 去掉行尾注释."""
+    chars = []
+    quoted = False
+    i = 0
+    while i < len(raw):
+        c = raw[i]
+        if c == '\\' and i + 1 < len(raw):
+            chars.append(_ESCAPES.get(raw[i + 1], raw[i + 1]))
+            i += 2
+            continue
+        if c == '"':
+            quoted = not quoted
+        elif c in '#;' and not quoted:
+            break
+        else:
+            chars.append(c)
+        i += 1
+    return ''.join(chars).strip()
+
+
+def parse_config(text):
+    """返回[(section, subsection, key, value)], section和key都是小写.
+    遇到include / includeIf返回None, 这种交给git自己处理.
+    """
+    entries = []
+    section = subsection = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line[0] in '#;':
+            continue
+        if line.startswith('['):
+            match = _SECTION_PATTERN.match(line)
+            if not match:
+                return None
+            section, subsection, line = match.group(1).lower(), match.group(2), match.group(3).strip()
+            if subsection is not None:
+                subsection = re.sub(r'\\(.)', r'\1', subsection)
+            elif '.' in section:
+                # 老的[remote.origin]写法
+                section, subsection = section.split('.', 1)
+            if section in ('include', 'includeif'):
+                return None
+            if not line or line[0] in '#;':
+                continue
+        match = _KEY_PATTERN.match(line)
+        if not match or section is None:
+            return None
+        value = match.group(2)
+        entries.append((section, subsection, match.group(1).lower(), 'true' if value is None else _unquote(value)))
+    return entries
+
+
+def _config_paths(commondir):
+    home = os.path.expanduser('~')
+    xdg = os.getenv('XDG_CONFIG_HOME') or os.path.join(home, '.config')
+    return ['/etc/gitconfig', os.path.join(xdg, 'git', 'config'), os.path.join(home, '.gitconfig'),
+            os.path.join(commondir, 'config')]
+
+
+class Repo:
+    """一个目录对应的仓库信息, 每一项第一次用到的时候才去读."""
+
+    def __init__(self, cwd):
+        self.cwd = cwd
+        if any(os.getenv(name) for name in _GIT_ENV):
+            self.gitdir, self.commondir = None, None
+        else:
+            self.gitdir, self.commondir = find_gitdir(cwd)
+        self._ref = None
+        self._head = None
+        self._remotes = None
+        self._fallback_urls = {}
+        self._stamp = self.stamp()
+
+    def stamp(self):
+        if self.gitdir is None:
+            return None
+        paths = [os.path.join(self.gitdir, 'HEAD'),
+                 os.path.join(self.commondir, 'packed-refs'),
+                 os.path.join(self.commondir, 'config')]
+        if self._ref:
+            paths.append(self._ref_path(self._ref))
+        return tuple(_stat(path) for path in paths)
+
+    def is_fresh(self):
+        return self._stamp == self.stamp()
+
+    def _ref_path(self, ref):
+        # refs/bisect这类是每个worktree自己的, 其他的都在commondir
+        local = os.path.join(self.gitdir, ref)
+        return local if os.path.isfile(local) else os.path.join(self.commondir, ref)
+
+    def _packed_refs(self):
+        refs = {}
+        for line in (_read(os.path.join(self.commondir, 'packed-refs')) or '').splitlines():
+            if not line or line[0] in '#^':
+                continue
+            sha, _, name = line.partition(' ')
+            refs[name.strip()] = sha
+        return refs
+
+    def _resolve_ref(self, ref):
+        for _ in range(5):
+            content = (_read(self._ref_path(ref)) or '').strip()
+            if not content:
+                return self._packed_refs().get(ref)
+            if not content.startswith('ref:'):
+                return content
+            ref = content[len('ref:'):].strip()
+        return None
+
+    def _read_head(self):
+        head = (_read(os.path.join(self.gitdir, 'HEAD')) or '').strip()
+        if not head.startswith('ref:'):
+            return (head, 'HEAD') if re.match(r'^[0-9a-f]{40,64}$', head) else None
+
+        ref = head[len('ref:'):].strip()
+        commit = self._resolve_ref(ref)
+        if not commit:
+            # 还没有commit的分支, 或者是reftable, 交给git报错
+            return None
+        self._ref = ref
+        self._stamp = self.stamp()
+        branch = ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref
+        return commit, branch
+
+    def _git_head(self):
+        import envoy
+
+        with profiling.span('git', 'git rev-parse HEAD --abbrev-ref HEAD'):
+            r = envoy.run('git rev-parse HEAD --abbrev-ref HEAD', cwd=self.cwd)
+        lines = r.std_out.split()
+        if r.status_code or len(lines) != 2:
+            raise GitError(r.std_err or r.std_out)
+        return lines[0], lines[1]
+
+    def head(self):
+        """(commit, branch), detached的时候branch是'HEAD'. 出错抛GitError."""
+        if self._head is None:
+            head = None
+            if self.gitdir is not None:
+                with profiling.span('git', 'read HEAD'):
+                    head = self._read_head()
+            self._head = head or self._git_head()
+        return self._head
+
+    def _read_remotes(self):
+        urls = {}
+        rewrites = []
+        for path in _config_paths(self.commondir):
+            text = _read(path)
+            if text is None:
+                continue
+            entries = parse_config(text)
+            if entries is None:
+                return None
+            for section, subsection, key, value in entries:
+                if section == 'remote' and key == 'url':
+                    # 一个remote有多个url的时候get-url给的是第一个
+                    urls.setdefault(subsection, value)
+                elif section == 'url' and key == 'insteadof':
+                    rewrites.append((value, subsection))
+
+        for name, url in urls.items():
+            matched = [(prefix, base) for prefix, base in rewrites if url.startswith(prefix)]
+            if matched:
+                prefix, base = max(matched, key=lambda m: len(m[0]))
+                urls[name] = base + url[len(prefix):]
+        return urls
+
+    def remote_url(self, remote='origin'):
+        """同git remote get-url, 出错抛GitError."""
+        if self._remotes is None and self.gitdir is not None:
+            with profiling.span('git', 'read config'):
+                self._remotes = self._read_remotes()
+
+        if self._remotes is not None:
+            if remote in self._remotes:
+                return self._remotes[remote]
+            raise GitError("error: No such remote '%s'" % remote)
+
+        if remote not in self._fallback_urls:
+            import envoy
+
+            with profiling.span('git', 'git remote get-url'):
+                r = envoy.run('git remote get-url %s' % str(remote), cwd=self.cwd)
+            if r.status_code:
+                raise GitError(r.std_err)
+            self._fallback_urls[remote] = r.std_out.strip()
+        return self._fallback_urls[remote]
+
+
+def resolve(cwd=None):
+    """cwd对应的Repo, 同一个进程里反复调用只读一次, 仓库变了会重新读."""
+    cwd = os.path.abspath(cwd or os.getcwd())
+    repo = _repos.get(cwd)
+    if repo is None or not repo.is_fresh():
+        repo = _repos[cwd] = Repo(cwd)
+    return repo
+
+
+def clear_cache():
+    _repos.clear()
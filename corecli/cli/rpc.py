@@ -1,42 +1,32 @@
 # coding: utf-8
 
 import click
-from prettytable import PrettyTable
-
-from corecli.cli.utils import error
+from corecli.cli.utils import echo_table
 
 
 @click.pass_context
 def get_networks(ctx):
-    core = ctx.obj['coreapi']
-    ns = core.get_networks()
+    def _rows(core):
+        rows = []
+        for n in core.get_networks():
+            cidrs = [c.get('PreferredPool', '') for c in n.get('ipamV4Config', [])]
+            rows.append([n['name'], n['id'], n['networkType'], ','.join(cidrs)])
+        return rows
 
-    table = PrettyTable(['name', 'id', 'type', 'CIDR'])
-    for n in ns:
-        cidrs = [c.get('PreferredPool', '') for c in n.get('ipamV4Config', [])]
-        table.add_row([n['name'], n['id'], n['networkType'], ','.join(cidrs)])
-    click.echo(table)
+    echo_table(ctx, ['name', 'id', 'type', 'CIDR'], _rows)
 
 
 @click.argument('podname', required=False)
 @click.pass_context
 def get_pod(ctx, podname):
-    core = ctx.obj['coreapi']
-
-    if not podname:
-        pods = core.get_pods()
-
-        table = PrettyTable(['name', 'desc'])
-        for p in pods:
-            table.add_row([p['name'], p['desc']])
-        click.echo(table)
-        return
+    def _rows(core):
+        if not podname:
+            return [[p['name'], p['desc']] for p in core.get_pods()]
 
-    pod = core.get_pod(podname)
-    if not pod:
-        click.echo(error('Pod %s not found' % podname))
-        ctx.exit(-1)
+        pod = core.get_pod(podname)
+        if not pod:
+            from citadelpy import CoreAPIError
+            raise CoreAPIError('Pod %s not found' % podname)
+        return [[pod['name'], pod['desc']]]
 
-    table = PrettyTable(['name', 'desc'])
-    table.add_row([pod['name'], pod['desc']])
-    click.echo(table)
+    echo_table(ctx, ['name', 'desc'], _rows)
@@ -1,15 +1,19 @@
 # coding: utf-8
 import os
+import queue
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from os import getenv
 
 import click
-import envoy
 import simplejson as json
-import yaml
 from click import ClickException
 
+from corecli.cli import profile as profiling, repo
 
+
+_echo_lock = threading.Lock()
 _GITLAB_CI_REMOTE_URL_PATTERN = re.compile(r'http://gitlab-ci-token:(.+)@([\.\w]+)/([-\w]+)/([-\w]+).git')
 
 
@@ -38,14 +42,14 @@ def get_current_branch(cwd=None):
     name from the current git repo, but luckily there's a environment
     variable called CI_BUILD_REF_NAME"""
     ctx = click.get_current_context()
-    r = envoy.run('git rev-parse --abbrev-ref HEAD', cwd=cwd)
-    if r.status_code:
+    try:
+        _, branch = repo.resolve(cwd).head()
+    except repo.GitError as e:
         if ctx.obj['debug']:
-            click.echo(debug_log('get_current_branch error: (stdout)%s, (stderr)%s', r.std_out, r.std_err))
+            click.echo(debug_log('get_current_branch error: %s', e))
 
         return ''
 
-    branch = r.std_out.strip()
     if branch == 'HEAD':
         branch = getenv('CI_BUILD_REF_NAME', '')
 
@@ -59,27 +63,24 @@ def get_commit_hash(cwd=None):
     """拿cwd的最新的commit hash."""
     ctx = click.get_current_context()
 
-    r = envoy.run('git rev-parse HEAD', cwd=cwd)
-    if r.status_code:
-        raise ClickException(r.std_err)
+    try:
+        commit_hash, _ = repo.resolve(cwd).head()
+    except repo.GitError as e:
+        raise ClickException(str(e))
 
-    commit_hash = r.std_out.strip()
     if ctx.obj['debug']:
         click.echo(debug_log('get_commit_hash: %s', commit_hash))
     return commit_hash
 
 
 def get_remote_url(cwd=None, remote='origin'):
-    """拿cwd的remote的url.
-    发现envoy.run的command只能是bytes, 不能是unicode.
-    """
+    """拿cwd的remote的url."""
     ctx = click.get_current_context()
 
-    r = envoy.run('git remote get-url %s' % str(remote), cwd=cwd)
-    if r.status_code:
-        raise ClickException(r.std_err)
-
-    remote = r.std_out.strip()
+    try:
+        remote = repo.resolve(cwd).remote_url(remote)
+    except repo.GitError as e:
+        raise ClickException(str(e))
 
     # 对gitlab ci需要特殊处理一下
     # 丫有个特殊的格式, 不太好支持...
@@ -96,9 +97,11 @@ def get_remote_url(cwd=None, remote='origin'):
 
 
 def get_appname(cwd=None):
+    import yaml
+
     try:
-        with open(os.path.join(cwd or os.getcwd(), 'app.yaml'), 'r') as f:
-            specs = yaml.load(f)
+        with open(os.path.join(cwd or os.getcwd(), 'app.yaml'), 'r') as f, profiling.span('yaml', 'app.yaml'):
+            specs = yaml.safe_load(f)
     except IOError:
         return ''
     return specs.get('appname', '')
@@ -110,3 +113,185 @@ def read_json_file(path):
             return json.loads(f.read())
     except (OSError, IOError):
         return None
+
+
+def ensure_single_zone(ctx):
+    """写操作只能对一个zone做, 用了--zones / --all-zones就直接报错."""
+    if ctx.obj['zones']:
+        raise click.UsageError('--zones / --all-zones only work with read commands, use --zone for %s' % ctx.info_name)
+
+
+def echo(text, **kwargs):
+    """多个线程同时输出的时候用, 保证一行不会被别的线程打断."""
+    with _echo_lock:
+        click.echo(text, **kwargs)
+
+
+def run_parallel(func, items, workers):
+    """用最多workers个线程对items里的每一个调用func(item).
+    返回[(item, result, exception)], 顺序和items一致, 一个失败不影响其他的.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def _call(item):
+        try:
+            return item, func(item), None
+        except Exception as e:
+            return item, None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(items)))) as executor:
+        return list(executor.map(_call, items))
+
+
+def fetch_zones(ctx, fetch):
+    """对ctx.obj['zones']里的每个zone并发调用fetch(coreapi).
+    返回[(zone, result, exception)], 顺序和zones一致, 一个zone失败不影响其他zone.
+    """
+    core = ctx.obj['coreapi']
+    zones = ctx.obj['zones']
+    return run_parallel(lambda zone: fetch(core.with_zone(zone)), zones, len(zones))
+
+
+def echo_table(ctx, header, fetch_rows, align=None):
+    """fetch_rows(coreapi)返回表格的行.
+    指定了--zones / --all-zones的时候每个zone并发查询, 合并成一个带zone列的表,
+    失败的zone显示为一行错误.
+    --output不是table的时候不用算列宽, 和echo_rows一样来一行打一行.
+    """
+    from citadelpy import CoreAPIError
+    from prettytable import PrettyTable
+
+    if ctx.obj['output'] != 'table':
+        echo_rows(ctx, header, fetch_rows, align)
+        return
+
+    if not ctx.obj['zones']:
+        try:
+            rows = fetch_rows(ctx.obj['coreapi'])
+        except CoreAPIError as e:
+            click.echo(error(str(e)))
+            ctx.exit(-1)
+    else:
+        rows = []
+        for zone, zone_rows, exc in fetch_zones(ctx, fetch_rows):
+            if exc is not None:
+                rows.append([zone, error(str(exc))] + [''] * (len(header) - 1))
+                continue
+            rows.extend([zone] + list(row) for row in zone_rows)
+        header = ['zone'] + header
+
+    with profiling.span('render', 'table', rows=len(rows)):
+        # 结果已经全部拿到了, 用PrettyTable算宽字符和换行
+        table = PrettyTable(header)
+        for column, value in (align or {}).items():
+            table.align[column] = value
+        for row in rows:
+            table.add_row(row)
+        output = table.get_string()
+    click.echo(output)
+
+
+def iter_zones(ctx, iter_items, buffer=1000):
+    """对ctx.obj['zones']里的每个zone并发调用iter_items(coreapi), 产生(zone, item, None),
+    某个zone出错的时候产生一个(zone, None, exception), 其他zone不受影响.
+    哪个zone的结果先到就先产生, 没有被取走的最多攒buffer个.
+    """
+    core = ctx.obj['coreapi']
+    zones = ctx.obj['zones']
+    results = queue.Queue(buffer)
+    stop = threading.Event()
+    done = object()
+
+    def _put(value):
+        while not stop.is_set():
+            try:
+                results.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(zone):
+        try:
+            for item in iter_items(core.with_zone(zone)):
+                if not _put((zone, item, None)):
+                    return
+        except Exception as e:
+            _put((zone, None, e))
+        finally:
+            _put(done)
+
+    for zone in zones:
+        threading.Thread(target=_run, args=(zone,), daemon=True).start()
+
+    try:
+        remaining = len(zones)
+        while remaining:
+            value = results.get()
+            if value is done:
+                remaining -= 1
+                continue
+            yield value
+    finally:
+        stop.set()
+
+
+def echo_rows(ctx, header, iter_rows, align=None):
+    """和echo_table一样, 但是iter_rows(coreapi)是一个一个产生行的iterator,
+    来一行打一行, 不会把全部的行攒在内存里. 多个zone的时候哪个zone的行先到先打.
+    --output不是table的时候出错信息打到stderr, stdout上的输出还是完整的.
+    """
+    from citadelpy import CoreAPIError
+    from corecli.cli.output import renderer
+
+    fmt = ctx.obj['output']
+    if ctx.obj['zones']:
+        out = renderer(fmt, ['zone'] + header, align)
+        for zone, row, exc in iter_zones(ctx, iter_rows):
+            if exc is not None:
+                out.add_error([zone], str(exc))
+            else:
+                out.add_row([zone] + list(row))
+        out.close()
+        return
+
+    out = renderer(fmt, header, align)
+    count = 0
+    try:
+        for row in iter_rows(ctx.obj['coreapi']):
+            out.add_row(row)
+            count += 1
+    except CoreAPIError as e:
+        if fmt == 'table':
+            if count:
+                out.close()
+            click.echo(error(str(e)))
+        else:
+            out.close()
+            click.echo(error(str(e)), err=True)
+        ctx.exit(-1)
+    out.close()
+
+
+def page_size_option(f):
+    return click.option('--page-size', default=0, type=int, help='fetch in pages of this many items, needs citadel to support start/limit, 0 to fetch in one request, ignored with --watch')(f)
+
+
+CONTAINER_HEADER = ['name', 'id', 'nodename', 'podname', 'appname', 'sha', 'entrypoint', 'env', 'cpu', 'ip']
+
+
+# container_row用到的字段, 列容器的时候只要这些
+CONTAINER_FIELDS = ['name', 'container_id', 'nodename', 'podname', 'appname', 'sha', 'entrypoint', 'env', 'cpu_quota',
+                    'info.NetworkSettings.Networks']
+
+
+def container_key(c):
+    return c.container_id
+
+
+def container_row(c):
+    """c: citadelpy.models.Container"""
+    ns = ['%s:%s' % (name, network['IPAddress']) for name, network in c.networks.items()]
+    return [c.name, c.container_id, c.nodename, c.podname, c.appname, c.sha[:7], c.entrypoint, c.env, c.cpu_quota, ','.join(ns)]
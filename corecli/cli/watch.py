@@ -0,0 +1,79 @@
+# coding: utf-8
+"""列表命令的--watch: 一直轮询, 只打印变化了的行.
+
+每一轮带上次的ETag发条件请求, citadel返回304就什么都不用下载.
+返回了新列表的话按id和上一轮比较, 新增的行前面是+, 没了的是-, 变了的是~.
+一直没变化的时候轮询间隔翻倍, 最多到max_interval, 一有变化就回到interval.
+"""
+import time
+
+import click
+
+from corecli.cli.utils import error
+
+
+def watch_options(f):
+    f = click.option('--max-interval', default=30.0, type=float, help='with --watch, slow down polling up to this many seconds while nothing changes')(f)
+    f = click.option('--interval', default=2.0, type=float, help='with --watch, seconds between polls')(f)
+    f = click.option('--watch', default=False, is_flag=True, help='keep polling and print only added (+), removed (-) and changed (~) rows, Ctrl-C to stop')(f)
+    return f
+
+
+def diff_rows(previous, current):
+    """previous / current: {id: row}, 返回[(change, row)], 按current的顺序, 没了的在最后."""
+    changes = []
+    for key, row in current.items():
+        old = previous.get(key)
+        if old is None:
+            changes.append(('+', row))
+        elif old != row:
+            changes.append(('~', row))
+    changes.extend(('-', row) for key, row in previous.items() if key not in current)
+    return changes
+
+
+def watch_rows(ctx, header, poll, to_row, key, interval=2.0, max_interval=30.0):
+    """poll(coreapi, etag)返回(items, etag), items为None表示没变, 见CoreAPI.poll_array.
+    to_row(item)是表格的一行, key(item)是这一行的id. 一直跑到Ctrl-C.
+    """
+    from citadelpy import CoreAPIError
+    from corecli.cli.output import renderer
+
+    if ctx.obj['zones']:
+        raise click.UsageError('--watch only works with a single zone')
+
+    core = ctx.obj['coreapi']
+    fmt = ctx.obj['output']
+    out = None
+    index, etag = {}, None
+    delay = interval
+    try:
+        while True:
+            try:
+                items, etag = poll(core, etag)
+            except CoreAPIError as e:
+                click.echo(error(str(e)), err=True)
+                items = None
+
+            changes = []
+            if items is not None:
+                current = dict((key(item), to_row(item)) for item in items)
+                changes = diff_rows(index, current)
+                index = current
+
+            if changes:
+                if out is None:
+                    # 第一轮的行用来算表格的列宽
+                    out = renderer(fmt, ['time', 'change'] + header, sample=len(changes))
+                now = time.strftime('%H:%M:%S')
+                for change, row in changes:
+                    out.add_row([now, change] + list(row))
+                delay = interval
+            else:
+                delay = min(delay * 2, max_interval)
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not None:
+            out.close()
@@ -17,7 +17,7 @@ setup(
     zip_safe=False,
     author_email='tonic@wolege.ca',
     description='Citadel client cli and lib',
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests', 'tests.*']),
     include_package_data=True,
     install_requires=[
         'requests',
@@ -29,9 +29,13 @@ setup(
         'six',
         'simplejson',
     ],
+    extras_require={
+        'async': ['aiohttp>=3.3'],
+        'fast': ['orjson'],
+    },
     entry_points={
         'console_scripts': [
-            'corecli=corecli.cli.cli:main',
+            'corecli=corecli.cli.client:main',
         ],
     },
 )
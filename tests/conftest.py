@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+import simplejson as json
+from click.testing import CliRunner
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corecli.cli.cli import core_commands  # noqa: E402
+from tests.stub import StubCitadel  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    server = StubCitadel().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def config(stub):
+    """指向stub的配置, 测试可以直接修改, invoke的时候才写到文件里."""
+    return {'citadel_url': stub.url, 'auth_token': 'token', 'zones': ['c1', 'c2', 'c3']}
+
+
+@pytest.fixture
+def invoke(config, tmp_path):
+    config_path = tmp_path / 'corecli.json'
+
+    def _invoke(*args, **kwargs):
+        config_path.write_text(json.dumps(config))
+        return CliRunner().invoke(core_commands, ['--config-path', str(config_path)] + list(args), obj={}, **kwargs)
+    return _invoke
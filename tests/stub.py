@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""A tiny in-process Citadel server for tests.
+
+    stub = StubCitadel().start()
+    stub.add('GET', '/app/foo', json={'name': 'foo'})
+    core = CoreAPI(stub.url, auth_token='t')
+"""
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+import simplejson as jsonlib
+
+
+class StubResponse:
+
+    def __init__(self, code=200, json=None, body=None, headers=None, lines=None, delay=0, drop=False, interval=0):
+        """lines: 给了就用chunked编码一行一行地发, 用来模拟/build这种流接口.
+        drop: 发完lines之后直接断开连接, 不发结束的chunk.
+        interval: lines每两行之间等多少秒.
+        """
+        self.code = code
+        self.json = json
+        self.body = body
+        self.headers = headers or {}
+        self.lines = lines
+        self.delay = delay
+        self.drop = drop
+        self.interval = interval
+
+
+class StubRequest:
+
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    @property
+    def zone(self):
+        return self.query.get('zone', [None])[0]
+
+    @property
+    def json(self):
+        return jsonlib.loads(self.body) if self.body else None
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StubCitadel:
+
+    def __init__(self, latency=0, error_rate=0, record=True, seed=None):
+        """latency: 每个请求先等多少秒. error_rate: 这个比例的请求直接返回503.
+        record: 为False的时候不记下收到的请求, benchmark跑很多请求的时候用.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.record = record
+        self.errors = 0
+        self._random = random.Random(seed)
+        self.routes = {}
+        self.requests = []
+        self.connections = set()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self._server.server_address[1]
+
+    def add(self, method, path, response=None, **kwargs):
+        """response可以是StubResponse, 也可以是callable(StubRequest) -> StubResponse."""
+        self.routes[(method, path)] = response if response is not None else StubResponse(**kwargs)
+        return self
+
+    def hits(self, method, path):
+        return [r for r in self.requests if r.method == method and r.path == path]
+
+    def start(self):
+        self._server = _Server(('127.0.0.1', 0), _handler(self))
+        thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _dispatch(self, req):
+        with self._lock:
+            if self.record:
+                self.requests.append(req)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            failed = self.error_rate and self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        try:
+            time.sleep(self.latency)
+            if failed:
+                return StubResponse(code=503, body='injected error')
+            response = self.routes.get((req.method, req.path))
+            if response is None:
+                return StubResponse(code=404, json={'error': 'not found'})
+            if callable(response):
+                response = response(req)
+            time.sleep(response.delay)
+            return response
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _handler(stub):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # header和body分两次写, 不关掉Nagle的话每个响应都要等客户端的delayed ACK (40ms)
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _handle(self):
+            with stub._lock:
+                stub.connections.add(self.client_address)
+            url = urlparse(self.path)
+            path = url.path[len('/api/v1'):] if url.path.startswith('/api/v1') else url.path
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            req = StubRequest(self.command, path, parse_qs(url.query), dict(self.headers), body)
+            response = stub._dispatch(req)
+
+            etag = response.headers.get('ETag')
+            if etag and self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            self.send_response(response.code)
+            for key, value in response.headers.items():
+                self.send_header(key, value)
+
+            if response.lines is not None:
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for i, line in enumerate(response.lines):
+                    if i and response.interval:
+                        time.sleep(response.interval)
+                    if not isinstance(line, bytes):
+                        line = (line if isinstance(line, str) else jsonlib.dumps(line)).encode('utf-8')
+                    line += b'\n'
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+                    self.wfile.flush()
+                if response.drop:
+                    self.close_connection = True
+                    return
+                self.wfile.write(b'0\r\n\r\n')
+                return
+
+            if response.body is not None:
+                payload = response.body if isinstance(response.body, bytes) else response.body.encode('utf-8')
+            else:
+                payload = jsonlib.dumps(response.json).encode('utf-8')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    return Handler
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from citadelpy import CoreAPIError  # noqa: E402
+from citadelpy.aio import AsyncCoreAPI  # noqa: E402
+from tests.stub import StubResponse  # noqa: E402
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+async def _call(stub, method, *args, **kwargs):
+    async with AsyncCoreAPI(stub.url, auth_token='token', zone=kwargs.pop('zone', None), **kwargs) as core:
+        return await getattr(core, method)(*args)
+
+
+async def _collect(stub, method, *args):
+    async with AsyncCoreAPI(stub.url, auth_token='token') as core:
+        return [m async for m in getattr(core, method)(*args)]
+
+
+def test_request_sends_token_and_zone(stub):
+    stub.add('GET', '/app/foo', json={'name': 'foo'})
+    assert _run(_call(stub, 'get_app', 'foo', zone='c1')) == {'name': 'foo'}
+
+    req = stub.hits('GET', '/app/foo')[0]
+    assert req.headers['X-Neptulon-Token'] == 'token'
+    assert req.zone == 'c1'
+
+
+def test_request_without_zone_omits_param(stub):
+    stub.add('GET', '/pod', json=[])
+    assert _run(_call(stub, 'get_pods')) == []
+    assert 'zone' not in stub.hits('GET', '/pod')[0].query
+
+
+def test_request_non_200_raises(stub):
+    stub.add('GET', '/app/foo', code=500, body='boom')
+    with pytest.raises(CoreAPIError) as e:
+        _run(_call(stub, 'get_app', 'foo'))
+    assert 'code 500' in str(e.value)
+    assert 'boom' in str(e.value)
+
+
+def test_request_non_json_raises(stub):
+    stub.add('GET', '/app/foo', body='<html>')
+    with pytest.raises(CoreAPIError) as e:
+        _run(_call(stub, 'get_app', 'foo'))
+    assert 'did not return json' in str(e.value)
+
+
+def test_request_stream_skips_blank_lines(stub):
+    stub.add('POST', '/remove', lines=[{'id': 'a', 'success': True}, '', '  ', {'id': 'b', 'success': True}])
+    messages = _run(_collect(stub, 'remove', ['a', 'b']))
+    assert [m['id'] for m in messages] == ['a', 'b']
+    assert stub.hits('POST', '/remove')[0].json == {'ids': ['a', 'b']}
+
+
+def test_request_stream_bad_line_raises(stub):
+    stub.add('POST', '/build', lines=[{'stream': 'ok'}, 'not json'])
+    with pytest.raises(CoreAPIError):
+        _run(_collect(stub, 'build', 'git@x:y/z.git', 'sha'))
+
+
+def test_request_stream_non_200_raises(stub):
+    stub.add('POST', '/upgrade', code=403, body='denied')
+    with pytest.raises(CoreAPIError) as e:
+        _run(_collect(stub, 'upgrade', ['a'], 'git@x:y/z.git', 'sha'))
+    assert 'code 403' in str(e.value)
+
+
+def test_limit_per_host_caps_concurrency(stub):
+    stub.add('GET', '/app/foo', StubResponse(json={'name': 'foo'}, delay=0.05))
+
+    async def fan_out():
+        async with AsyncCoreAPI(stub.url, limit_per_host=3) as core:
+            return await asyncio.gather(*[core.get_app('foo') for _ in range(12)])
+
+    results = _run(fan_out())
+    assert len(results) == 12
+    assert stub.max_active <= 3
+    assert len(stub.connections) <= 3
+
+
+def test_deploy_payload_matches_sync_client(stub):
+    stub.add('POST', '/deploy', lines=[{'success': True, 'id': 'c1', 'name': 'foo_1'}])
+
+    async def deploy():
+        async with AsyncCoreAPI(stub.url) as core:
+            return [m async for m in core.deploy('git@x:y/z.git', 'sha', 'pod', 'node', 'web', 1, 1024, 2,
+                                                  networks={'calico': ''}, extra_env=('A=1',))]
+
+    assert _run(deploy())[0]['id'] == 'c1'
+    payload = stub.hits('POST', '/deploy')[0].json
+    assert payload['networks'] == {'calico': ''}
+    assert payload['count'] == 2
+    assert payload['extra_env'] == ['A=1']
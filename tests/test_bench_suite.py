@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+import requests
+
+from benchmarks import bench_suite
+from corecli.cli.commands import commands
+from tests.stub import StubCitadel
+
+
+PARAMS = {'latency': 0, 'containers': 30, 'old_containers': 4, 'info_bytes': 10, 'pods': 2, 'nodes': 2, 'releases': 3,
+          'stream_lines': 5, 'stream_rate': 0, 'error_rate': 0}
+
+
+@pytest.fixture
+def fleet():
+    stub = bench_suite.build_stub(PARAMS).start()
+    yield stub
+    stub.stop()
+
+
+def test_every_command_has_a_scenario(tmp_path):
+    scenarios = bench_suite.command_scenarios(str(tmp_path))
+    assert set(scenarios) | set(bench_suite.SKIPPED) == set(commands)
+    assert not set(scenarios) & set(bench_suite.SKIPPED)
+
+
+def test_percentile_and_compare():
+    samples = [5, 1, 4, 2, 3, 6, 7, 8, 9, 10]
+    assert [bench_suite.percentile(samples, q) for q in (50, 90, 99)] == [5, 9, 10]
+    assert bench_suite.percentile([0.3], 90) == 0.3
+
+    baseline = {'api get_app': {'p50': 1.0, 'p90': 2.0, 'peak_rss_kb': 100}, 'gone': {'p50': 1.0}}
+    results = {'api get_app': {'p50': 1.1, 'p90': 3.0, 'peak_rss_kb': 200}, 'new': {'p50': 9.0}}
+    assert bench_suite.compare(results, baseline, 0.2) == [('api get_app', 'p90', 2.0, 3.0), ('api get_app', 'peak_rss_kb', 100, 200)]
+    assert bench_suite.compare(results, baseline, 1.5) == []
+    assert bench_suite.compare(results, baseline, 0.2, min_delta=1.5) == [('api get_app', 'peak_rss_kb', 100, 200)]
+
+
+def test_stub_error_injection_and_stream_rate():
+    stub = StubCitadel(error_rate=0.5, record=False, seed=1).start()
+    try:
+        stub.add('GET', '/ping', json={})
+        codes = [requests.get(stub.url + '/ping').status_code for _ in range(40)]
+        assert set(codes) == {200, 503}
+        assert codes.count(503) == stub.errors
+        assert stub.requests == []
+
+        stub.error_rate = 0
+        stub.add('GET', '/stream', lines=['a', 'b', 'c'], interval=0.05)
+        start = time.time()
+        assert requests.get(stub.url + '/stream').text == 'a\nb\nc\n'
+        assert time.time() - start >= 0.1
+    finally:
+        stub.stop()
+
+
+def test_commands_and_api_against_fleet(fleet, tmp_path):
+    results = bench_suite.bench_commands(fleet.url, str(tmp_path), 1, ['app:get', 'inventory', 'upgrade:rolling'])
+    assert set(results) == {'command app:get', 'command inventory:sync', 'command inventory:query', 'command upgrade:rolling'}
+    assert all(r['errors'] == 0 and r['peak_rss_kb'] > 0 for r in results.values()), results
+
+    results = bench_suite.bench_api(fleet.url, 4, 2, ['get_app_containers', 'build stream', 'stream_logs'])
+    assert sorted(results) == ['api build stream', 'api get_app_containers', 'api stream_logs']
+    assert all(r['errors'] == 0 and r['count'] == 4 for r in results.values()), results
+    assert results['api get_app_containers']['items_per_s'] > 0
+    assert all(r['peak_alloc_kb'] > 0 for r in results.values()), results
+
+
+def test_command_rss_is_measured_in_the_child(tmp_path):
+    # fork出来的子进程的ru_maxrss会带上父进程的, 父进程占的内存不能算到命令头上
+    ballast = b'x' * (200 * 1024 * 1024)
+    env = dict(bench_suite.os.environ, PYTHONPATH=bench_suite.ROOT, CORECLI_BENCH_RSS=str(tmp_path / 'rss'))
+    _, code, rss = bench_suite.run_process(['--help'], env)
+    assert code == 0
+    assert 0 < rss < 100 * 1024
+    del ballast
+
+
+def test_main_compares_with_baseline(fleet, tmp_path, monkeypatch, capsys):
+    class _Stub:
+        def __init__(self, params):
+            self.url = fleet.url
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+    monkeypatch.setattr(bench_suite, 'StubProcess', _Stub)
+    baseline = str(tmp_path / 'baseline.json')
+    args = ['--only', 'get_pods', '--requests', '3', '--baseline', baseline, '--min-delta', '0']
+
+    assert bench_suite.main(args + ['--save-baseline']) == 0
+    assert bench_suite.main(args + ['--threshold', '1000']) == 0
+    assert 'no regressions' in capsys.readouterr().out
+    assert bench_suite.main(args + ['--threshold', '-1']) == 1
+    assert 'REGRESSION api get_pods' in capsys.readouterr().out
+    assert bench_suite.main(args + ['--pods', '3']) == 0
+    assert 'different parameters' in capsys.readouterr().out
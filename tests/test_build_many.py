@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os
+
+from corecli.cli import progress
+from corecli.cli.progress import StatusBoard
+from tests.stub import StubResponse
+
+
+def _message(**kwargs):
+    return dict({'error': '', 'stream': '', 'status': '', 'progress': ''}, **kwargs)
+
+
+def _build(req):
+    payload = req.json
+    if payload['sha'].startswith('bad'):
+        return StubResponse(lines=[_message(status='Step 1/2'), _message(error='no such sha')])
+    if payload['sha'].startswith('500'):
+        return StubResponse(code=500, body='builder down')
+    return StubResponse(delay=0.1, lines=[_message(status='Step 1/2', progress='[==>   ]'), _message(stream='RUN make\n'),
+                                          _message(status='Successfully built %s' % payload['sha'])])
+
+
+def test_build_many(stub, invoke, tmp_path):
+    stub.add('POST', '/build', _build)
+    manifest = tmp_path / 'builds.yaml'
+    manifest.write_text('- {repo: "git@x:a/api.git", sha: "bbbbbbb", uid: "42"}\n')
+    log_dir = str(tmp_path / 'logs')
+
+    result = invoke('build:many', 'git@x:a/web.git@aaaaaaa', 'git@x:a/web.git@aaaaaaaa', '--manifest', str(manifest),
+                    '--log-dir', log_dir, '--parallel', '3')
+    assert result.exit_code == 0, result.output
+    assert '3 builds done' in result.output
+    assert sorted(os.listdir(log_dir)) == ['api-bbbbbbb.log', 'web-aaaaaaa-0.log', 'web-aaaaaaa-1.log']
+    log = open(os.path.join(log_dir, 'api-bbbbbbb.log')).read()
+    assert log == 'build git@x:a/api.git bbbbbbb\nStep 1/2\n[==>   ]\nRUN make\nSuccessfully built bbbbbbb\n'
+    # 不是终端的时候只有开始和结束
+    assert result.output.count('building') == 3
+    assert 'Step 1/2' not in result.output
+    assert [r.json['uid'] for r in stub.hits('POST', '/build') if r.json['sha'] == 'bbbbbbb'] == ['42']
+    # 三个是同时跑的
+    assert stub.max_active >= 2
+
+
+def test_build_many_failures(stub, invoke, tmp_path):
+    stub.add('POST', '/build', _build)
+    log_dir = str(tmp_path / 'logs')
+
+    result = invoke('build:many', 'git@x:a/web.git@aaaaaaa', 'git@x:a/web.git@bad1234', 'git@x:a/web.git@5001234', '--log-dir', log_dir)
+    assert result.exit_code in (-1, 255)
+    assert '2 of 3 builds failed' in result.output
+    assert 'failed: no such sha' in result.output
+    assert 'builder down' in open(os.path.join(log_dir, 'web-5001234.log')).read()
+
+    result = invoke('build:many', 'git@x:a/web.git')
+    assert result.exit_code == 2
+    assert 'is not REPO@SHA' in result.output
+
+
+def test_status_board_redraws_in_place(monkeypatch):
+    lines = []
+    monkeypatch.setattr(progress, 'echo', lines.append)
+    board = StatusBoard(['a', 'bb'], tty=True, interval=0)
+    board.update(0, 'x')
+    board.update(1, 'y', final=True)
+    assert lines[0] == '\r\x1b[2Ka   x\n\r\x1b[2Kbb  '
+    assert lines[1] == '\x1b[2A\r\x1b[2Ka   x\n\r\x1b[2Kbb  y'
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import pytest
+import simplejson as json
+from click.testing import CliRunner
+
+from citadelpy import CoreAPI
+from citadelpy import cache as cachelib
+from citadelpy.cache import ResponseCache
+from corecli.cli.cli import core_commands
+
+
+class _Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(cachelib.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(path=str(tmp_path / 'responses.sqlite'))
+
+
+def _core(stub, cache, zone='c1'):
+    return CoreAPI(stub.url, auth_token='token', zone=zone, cache=cache)
+
+
+def test_ttl_rules(cache):
+    assert cache.ttl('/pod') == 300
+    assert cache.ttl('/app/foo') == 60
+    assert cache.ttl('/app/foo/releases') == 60
+    assert cache.ttl('/app/foo/containers') is None
+
+    custom = ResponseCache(path=cache.path, ttls={r'^/pod$': 5, r'^/app/[^/]+/env$': 10})
+    assert custom.ttl('/pod') == 5
+    assert custom.ttl('/app/foo/env') == 10
+
+
+def test_fresh_entry_served_from_cache_until_ttl(stub, cache, clock):
+    stub.add('GET', '/app/foo', json={'name': 'foo'})
+    core = _core(stub, cache)
+
+    assert core.get_app('foo') == {'name': 'foo'}
+    clock.now += 59
+    assert core.get_app('foo') == {'name': 'foo'}
+    assert len(stub.hits('GET', '/app/foo')) == 1
+
+    clock.now += 2
+    assert core.get_app('foo') == {'name': 'foo'}
+    assert len(stub.hits('GET', '/app/foo')) == 2
+
+
+def test_uncached_endpoint_always_hits_server(stub, cache):
+    stub.add('GET', '/app/foo/containers', json=[])
+    core = _core(stub, cache)
+    core.get_app_containers('foo')
+    core.get_app_containers('foo')
+    assert len(stub.hits('GET', '/app/foo/containers')) == 2
+
+
+def test_expired_entry_revalidated_with_etag(stub, cache, clock):
+    stub.add('GET', '/pod', json=[{'name': 'pod1'}], headers={'ETag': '"v1"'})
+    core = _core(stub, cache)
+
+    core.get_pods()
+    clock.now += 301
+    assert core.get_pods() == [{'name': 'pod1'}]
+
+    first, second = stub.hits('GET', '/pod')
+    assert 'If-None-Match' not in first.headers
+    assert second.headers['If-None-Match'] == '"v1"'
+
+    # 304 renews the entry, so the next call is served locally
+    clock.now += 299
+    core.get_pods()
+    assert len(stub.hits('GET', '/pod')) == 2
+
+
+def test_changed_etag_replaces_body(stub, cache, clock):
+    stub.add('GET', '/pod', json=[{'name': 'pod1'}], headers={'ETag': '"v1"'})
+    core = _core(stub, cache)
+    core.get_pods()
+
+    stub.add('GET', '/pod', json=[{'name': 'pod2'}], headers={'ETag': '"v2"'})
+    clock.now += 301
+    assert core.get_pods() == [{'name': 'pod2'}]
+    assert core.get_pods() == [{'name': 'pod2'}]
+    assert len(stub.hits('GET', '/pod')) == 2
+
+
+def test_refresh_ignores_fresh_entries(stub, cache):
+    stub.add('GET', '/pod', json=[], headers={'ETag': '"v1"'})
+    _core(stub, cache).get_pods()
+
+    cache.refresh = True
+    _core(stub, cache).get_pods()
+    hits = stub.hits('GET', '/pod')
+    assert len(hits) == 2
+    assert hits[1].headers['If-None-Match'] == '"v1"'
+
+
+def test_key_separates_zone_and_params(cache):
+    assert cache.key('c1', '/pod') != cache.key('c2', '/pod')
+    assert cache.key('c1', '/pod', {'a': 1, 'b': 2}) == cache.key('c1', '/pod', {'b': 2, 'a': 1})
+    assert cache.key('c1', '/pod', {'a': 1}) != cache.key('c1', '/pod')
+
+
+def test_lru_eviction(tmp_path, clock):
+    cache = ResponseCache(path=str(tmp_path / 'lru.sqlite'), max_entries=2)
+    for name in ('a', 'b'):
+        clock.now += 1
+        cache.set(cache.key(None, '/app/' + name), None, '/app/' + name, '{}')
+
+    # touching a makes b the least recently used
+    clock.now += 1
+    assert cache.get(cache.key(None, '/app/a')) is not None
+
+    clock.now += 1
+    cache.set(cache.key(None, '/app/c'), None, '/app/c', '{}')
+    assert cache.get(cache.key(None, '/app/a')) is not None
+    assert cache.get(cache.key(None, '/app/b')) is None
+    assert cache.get(cache.key(None, '/app/c')) is not None
+
+
+def test_invalidate_prefix(cache):
+    paths = ['/app/foo', '/app/foo/releases', '/app/foobar', '/pod/foo']
+    for zone in ('c1', 'c2'):
+        for path in paths:
+            cache.set(cache.key(zone, path), zone, path, '{}')
+
+    cache.invalidate('c1', '/app/foo')
+    remaining = [path for path in paths if cache.get(cache.key('c1', path)) is not None]
+    assert remaining == ['/app/foobar', '/pod/foo']
+    assert all(cache.get(cache.key('c2', path)) is not None for path in paths)
+
+    cache.invalidate('c1')
+    assert all(cache.get(cache.key('c1', path)) is None for path in paths)
+    assert all(cache.get(cache.key('c2', path)) is not None for path in paths)
+
+
+def test_write_methods_invalidate(stub, cache):
+    stub.add('GET', '/app/foo', json={'name': 'foo'})
+    stub.add('GET', '/pod/pod1', json={'name': 'pod1'})
+    stub.add('PUT', '/app/foo/env/prod', json={})
+    stub.add('POST', '/deploy', lines=[{'success': True, 'id': 'x', 'name': 'y'}])
+    core = _core(stub, cache)
+
+    core.get_app('foo')
+    core.set_app_env('foo', 'prod', A='1')
+    core.get_app('foo')
+    assert len(stub.hits('GET', '/app/foo')) == 2
+
+    core.get_pod('pod1')
+    list(core.deploy('git@x:y/z.git', 'sha', 'pod1', '', 'web', 1, 1024, 1))
+    core.get_pod('pod1')
+    assert len(stub.hits('GET', '/pod/pod1')) == 2
+
+
+def test_refresh_without_cache_warns(stub, tmp_path):
+    config_path = tmp_path / 'corecli.json'
+    config_path.write_text(json.dumps({'citadel_url': stub.url, 'auth_token': 'token'}))
+    stub.add('GET', '/pod', json=[])
+
+    result = CliRunner().invoke(core_commands, ['--config-path', str(config_path), '--refresh', 'pod:get'], obj={})
+    assert result.exit_code == 0, result.output
+    assert '--refresh has no effect' in result.output
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import simplejson as json
+
+from corecli.cli import client
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def config_path(config, tmp_path):
+    path = tmp_path / 'corecli.json'
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def _accepting(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+@pytest.fixture
+def daemon(config_path, tmp_path, monkeypatch):
+    """另起一个进程跑corecli daemon, 返回socket路径."""
+    path = str(tmp_path / 'corecli.sock')
+    env = dict(os.environ, PYTHONPATH=ROOT, CITADEL_CONFIG_PATH=config_path)
+    proc = subprocess.Popen([sys.executable, '-c', 'from corecli.cli.cli import main; main()', 'daemon', '--socket', path],
+                            env=env, cwd=ROOT, stderr=subprocess.PIPE)
+    deadline = time.time() + 10
+    while not _accepting(path):
+        assert proc.poll() is None, proc.stderr.read()
+        assert time.time() < deadline
+        time.sleep(0.05)
+
+    monkeypatch.setenv('CITADEL_CONFIG_PATH', config_path)
+    yield path
+
+    proc.terminate()
+    proc.wait(10)
+    assert not os.path.exists(path)
+
+
+def test_no_daemon(tmp_path):
+    assert client.run_remote(['pod:get'], str(tmp_path / 'missing.sock')) is None
+
+    # 进程死掉之后留下的socket文件
+    stale = str(tmp_path / 'stale.sock')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(stale)
+    sock.close()
+    assert client.run_remote(['pod:get'], stale) is None
+
+
+def test_socket_appears_only_after_listen(tmp_path):
+    from corecli.cli.daemon import _listen
+
+    path = str(tmp_path / 'corecli.sock')
+    server = _listen(path)
+    try:
+        assert _accepting(path)
+        assert os.listdir(str(tmp_path)) == ['corecli.sock']
+    finally:
+        server.close()
+
+
+def test_commands_share_connections(stub, daemon, capsys):
+    stub.add('GET', '/pod', json=[{'name': 'pod1', 'desc': 'first pod'}])
+    for _ in range(3):
+        assert client.run_remote(['pod:get'], daemon) == 0
+        assert 'first pod' in capsys.readouterr().out
+
+    assert len(stub.hits('GET', '/pod')) == 3
+    assert len(stub.connections) == 1
+
+
+def test_forwards_cwd_env_and_exit_code(stub, daemon, tmp_path, monkeypatch, capsys):
+    stub.add('GET', '/app/foo', json={'name': 'foo', 'git': 'git@x:foo.git', 'created': 'now'})
+    stub.add('GET', '/app/bar', code=500, body='boom')
+
+    workdir = tmp_path / 'foo'
+    workdir.mkdir()
+    (workdir / 'app.yaml').write_text('appname: foo\n')
+    monkeypatch.chdir(str(workdir))
+    assert client.run_remote(['app:get'], daemon) == 0
+    assert 'git@x:foo.git' in capsys.readouterr().out
+
+    assert client.run_remote(['app:get', 'bar'], daemon) == -1
+    assert 'boom' in capsys.readouterr().out
+
+    assert client.run_remote(['app:get', '--nope'], daemon) == 2
+    assert 'no such option' in capsys.readouterr().err.lower()
+
+    monkeypatch.setenv('CITADEL_CONFIG_PATH', str(tmp_path / 'missing.json'))
+    monkeypatch.delenv('CITADEL_AUTH_TOKEN', raising=False)
+    assert client.run_remote(['pod:get'], daemon) == 1
+    assert 'CITADEL_AUTH_TOKEN not found' in capsys.readouterr().err
+
+
+def test_refuses_nested_daemon(daemon, capsys):
+    assert client.run_remote(['daemon'], daemon) == 2
+    assert 'already running' in capsys.readouterr().err
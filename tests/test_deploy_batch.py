@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import simplejson as json
+
+from tests.stub import StubResponse
+
+
+def _deploy(req):
+    payload = req.json
+    if payload['podname'] == 'broken':
+        return StubResponse(code=500, body='pod broken')
+    if payload['podname'] == 'full':
+        return StubResponse(lines=[{'success': False, 'error': 'not enough memory', 'id': '', 'name': ''}])
+    return StubResponse(delay=0.1, lines=[{'success': True, 'id': '%s-%d' % (payload['podname'], i), 'name': 'c%d' % i}
+                                           for i in range(payload['count'])])
+
+
+def _manifest(tmp_path, manifest):
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps(manifest))
+    return str(path)
+
+
+def test_deploy_batch_tags_output_and_summarizes(stub, invoke, tmp_path):
+    stub.add('POST', '/deploy', _deploy)
+    manifest = _manifest(tmp_path, {
+        'repo': 'git@x:y/z.git',
+        'sha': 'abc',
+        'defaults': {'entrypoint': 'web', 'memory': 1024},
+        'targets': [
+            {'pod': 'p1', 'node': 'n1', 'count': 2, 'networks': ['calico:10.0.0.1']},
+            {'pod': 'p2'},
+        ],
+    })
+    result = invoke('deploy:batch', manifest)
+    assert result.exit_code == 0, result.output
+    assert '[p1/n1/web] Container p1-0 / c0 created successfully' in result.output
+    assert '[p2/*/web] Container p2-0 / c0 created successfully' in result.output
+    assert 'Deploy git@x:y/z.git abc to 2 targets done.' in result.output
+
+    payloads = sorted((r.json for r in stub.hits('POST', '/deploy')), key=lambda p: p['podname'])
+    assert payloads[0]['networks'] == {'calico': '10.0.0.1'}
+    assert payloads[0]['memory'] == 1024
+    assert payloads[1]['count'] == 1
+
+
+def test_deploy_batch_reports_failures(stub, invoke, tmp_path):
+    stub.add('POST', '/deploy', _deploy)
+    manifest = _manifest(tmp_path, [
+        {'pod': 'p1', 'entrypoint': 'web'},
+        {'pod': 'full', 'entrypoint': 'web'},
+        {'pod': 'broken', 'entrypoint': 'web'},
+    ])
+    result = invoke('deploy:batch', manifest, '--repo', 'git@x:y/z.git', '--sha', 'abc')
+    assert result.exit_code in (-1, 255)
+    assert '2 of 3 targets failed' in result.output
+    assert 'not enough memory' in result.output
+    assert 'pod broken' in result.output
+
+
+def test_deploy_batch_limits_parallelism(stub, invoke, tmp_path):
+    stub.add('POST', '/deploy', _deploy)
+    manifest = _manifest(tmp_path, [{'pod': 'p%d' % i, 'entrypoint': 'web'} for i in range(6)])
+    result = invoke('deploy:batch', manifest, '--repo', 'r', '--sha', 's', '--parallel', '2')
+    assert result.exit_code == 0, result.output
+    assert len(stub.hits('POST', '/deploy')) == 6
+    assert stub.max_active == 2
+
+
+def test_deploy_batch_rejects_target_without_pod(invoke, tmp_path):
+    manifest = _manifest(tmp_path, [{'entrypoint': 'web'}])
+    result = invoke('deploy:batch', manifest, '--repo', 'r', '--sha', 's')
+    assert result.exit_code == 2
+    assert 'needs pod and entrypoint' in result.output
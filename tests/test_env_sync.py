@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import pytest
+import simplejson as json
+
+from corecli.cli.env import diff_env, read_desired
+from tests.stub import StubResponse
+
+
+def test_read_desired(tmp_path):
+    (tmp_path / 'shared.yaml').write_text('foo: {prod: {A: 1, B: "x"}}\nbar: {prod: {A: true}}\n')
+    (tmp_path / 'baz').mkdir()
+    (tmp_path / 'baz' / 'test.json').write_text(json.dumps({'C': 'c'}))
+    (tmp_path / 'baz' / 'README').write_text('ignored')
+    assert read_desired(str(tmp_path)) == {('foo', 'prod'): {'A': '1', 'B': 'x'}, ('bar', 'prod'): {'A': 'true'},
+                                           ('baz', 'test'): {'C': 'c'}}
+
+    (tmp_path / 'foo').mkdir()
+    (tmp_path / 'foo' / 'prod.yaml').write_text('A: 2\n')
+    with pytest.raises(Exception, match='more than once'):
+        read_desired(str(tmp_path))
+
+
+def test_diff_env():
+    assert diff_env({'A': '1', 'B': '2', 'C': '3'}, {'A': '1', 'B': '20', 'D': '4'}) == [
+        ('~', 'B', '2', '20'), ('-', 'C', '3', None), ('+', 'D', None, '4')]
+
+
+@pytest.fixture
+def citadel(stub):
+    envs = {
+        ('foo', 'prod'): {'A': '1', 'B': '2'},
+        ('bar', 'prod'): {'A': '1'},
+        ('baz', 'prod'): {'A': '1', 'OLD': 'x'},
+    }
+
+    def _get(req):
+        appname, envname = req.path.split('/')[2], req.path.split('/')[4]
+        return StubResponse(json={'envname': envname, 'vars': envs[appname, envname]})
+
+    def _put(req):
+        appname, envname = req.path.split('/')[2], req.path.split('/')[4]
+        if appname == 'bar':
+            return StubResponse(code=500, body='bar is locked')
+        envs[appname, envname] = req.json
+        return StubResponse(json={'msg': 'ok'})
+
+    for appname in ('foo', 'bar', 'baz'):
+        stub.add('GET', '/app/%s/env' % appname,
+                 json=[{'envname': e} for a, e in envs if a == appname])
+        for envname in ('prod', 'test'):
+            stub.add('GET', '/app/%s/env/%s' % (appname, envname), _get)
+            stub.add('PUT', '/app/%s/env/%s' % (appname, envname), _put)
+    return envs
+
+
+def _desired(tmp_path, desired):
+    path = tmp_path / 'envs.json'
+    path.write_text(json.dumps(desired))
+    return str(path)
+
+
+def test_sync_dry_run_and_apply(stub, citadel, invoke, tmp_path):
+    path = _desired(tmp_path, {'foo': {'prod': {'A': '1', 'B': '2'}, 'test': {'A': '1'}}, 'baz': {'prod': {'A': '2'}}})
+
+    result = invoke('env:sync', path, '--dry-run', '--show-values')
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == ['baz/prod', '  ~ A: 1 -> 2', '  - OLD=x', 'foo/test (new)', '  + A=1',
+                                          '2 env sets to change, 1 unchanged, dry run']
+    assert not any(r.method == 'PUT' for r in stub.requests)
+    # test不存在, 不用去拿
+    assert stub.hits('GET', '/app/foo/env/test') == []
+
+    result = invoke('env:sync', path)
+    assert result.exit_code == 0, result.output
+    assert '  - OLD' in result.output and 'OLD=x' not in result.output
+    assert '2 env sets updated, 1 unchanged' in result.output
+    assert citadel['baz', 'prod'] == {'A': '2'}
+    assert citadel['foo', 'test'] == {'A': '1'}
+    assert stub.hits('PUT', '/app/foo/env/prod') == []
+
+
+def test_sync_merge_and_failures(stub, citadel, invoke, tmp_path):
+    path = _desired(tmp_path, {'bar': {'prod': {'NEW': 'n'}}, 'baz': {'prod': {'NEW': 'n'}}})
+    result = invoke('env:sync', path, '--merge')
+    assert result.exit_code in (-1, 255)
+    assert 'bar/prod: Citadel internal error: code 500, body bar is locked' in result.output
+    assert '1 of 2 env sets failed to update' in result.output
+    assert citadel['baz', 'prod'] == {'A': '1', 'OLD': 'x', 'NEW': 'n'}
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import simplejson as json
+
+from corecli.cli.inventory import Inventory
+
+
+def _container(name, nodename, podname, appname, sha, ip):
+    return {'name': name, 'container_id': 'id-' + name, 'nodename': nodename, 'podname': podname, 'appname': appname,
+            'sha': sha, 'entrypoint': 'web', 'env': 'prod', 'cpu_quota': 1,
+            'info': {'NetworkSettings': {'Networks': {'calico': {'IPAddress': ip}}}}}
+
+
+def _cluster(stub, pods):
+    stub.add('GET', '/pod', json=[{'name': p} for p in pods])
+    for podname, containers in pods.items():
+        stub.add('GET', '/pod/%s/containers' % podname, json=containers, headers={'ETag': '"%s"' % ','.join(c['name'] for c in containers)})
+        stub.add('GET', '/pod/%s/nodes' % podname, json=[{'name': c['nodename']} for c in containers])
+
+
+def test_sync_and_query(stub, invoke, tmp_path):
+    db = str(tmp_path / 'inventory.sqlite')
+    _cluster(stub, {
+        'pa': [_container('a1', 'n1', 'pa', 'foo', 'abcdef1234', '10.0.0.1'), _container('a2', 'n2', 'pa', 'bar', '1234567890', '10.0.0.2')],
+        'pb': [_container('b1', 'n3', 'pb', 'foo', 'abcdef9999', '10.0.1.1')],
+    })
+
+    result = invoke('inventory:sync', '--db', db)
+    assert result.exit_code == 0, result.output
+    assert '2 pods updated, 0 unchanged, 0 removed' in result.output
+    assert stub.hits('GET', '/pod/pa/containers')[0].query['fields']
+
+    store = Inventory(db)
+    assert [row[0] for _, row in store.query(app='foo')] == ['a1', 'b1']
+    assert [row[0] for _, row in store.query(node='n2')] == ['a2']
+    assert [row[0] for _, row in store.query(ip='10.0.1.1')] == ['b1']
+    assert [row[0] for _, row in store.query(sha='abcdef')] == ['a1', 'b1']
+    assert [row[0] for _, row in store.query(sha='abcdef9', app='foo')] == ['b1']
+    assert store.query(app='foo', node='n2') == []
+    assert store.query(node='n1')[0][1] == ['a1', 'id-a1', 'n1', 'pa', 'foo', 'abcdef1', 'web', 'prod', 1, 'calico:10.0.0.1']
+
+    result = invoke('--output', 'json', 'inventory:query', '--db', db, '--ip', '10.0.0.2')
+    assert result.exit_code == 0, result.output
+    rows = json.loads(result.stdout)
+    assert [(r['name'], r['ip']) for r in rows] == [('a2', 'calico:10.0.0.2')]
+
+
+def test_resync_skips_unchanged_pods(stub, invoke, tmp_path):
+    db = str(tmp_path / 'inventory.sqlite')
+    pods = {'pa': [_container('a1', 'n1', 'pa', 'foo', 'abcdef1234', '10.0.0.1')],
+            'pb': [_container('b1', 'n2', 'pb', 'foo', 'abcdef1234', '10.0.1.1')]}
+    _cluster(stub, pods)
+    assert invoke('inventory:sync', '--db', db).exit_code == 0
+
+    # pa没变, pb换了一个容器
+    _cluster(stub, {'pa': pods['pa'], 'pb': [_container('b2', 'n2', 'pb', 'foo', 'abcdef1234', '10.0.1.2')]})
+    result = invoke('inventory:sync', '--db', db)
+    assert result.exit_code == 0, result.output
+    assert '1 pods updated, 1 unchanged, 0 removed' in result.output
+    assert len(stub.hits('GET', '/pod/pa/nodes')) == 1
+
+    store = Inventory(db)
+    assert [row[0] for _, row in store.query(app='foo')] == ['a1', 'b2']
+    assert store.query(ip='10.0.1.1') == []
+
+    # pb没了
+    _cluster(stub, {'pa': pods['pa']})
+    result = invoke('inventory:sync', '--db', db)
+    assert '0 pods updated, 1 unchanged, 1 removed' in result.output
+    assert [row[0] for _, row in store.query()] == ['a1']
+
+
+def test_failed_pod_keeps_old_rows(stub, invoke, tmp_path):
+    db = str(tmp_path / 'inventory.sqlite')
+    _cluster(stub, {'pa': [_container('a1', 'n1', 'pa', 'foo', 'abcdef1234', '10.0.0.1')],
+                    'pb': [_container('b1', 'n2', 'pb', 'foo', 'abcdef1234', '10.0.1.1')]})
+    assert invoke('inventory:sync', '--db', db).exit_code == 0
+
+    stub.add('GET', '/pod/pb/containers', code=500, json={'error': 'boom'})
+    result = invoke('inventory:sync', '--db', db)
+    assert result.exit_code in (-1, 255)
+    assert 'pod pb' in result.output
+    assert [row[0] for _, row in Inventory(db).query()] == ['a1', 'b1']
+
+
+def test_query_multi_zone_and_empty(stub, invoke, tmp_path):
+    db = str(tmp_path / 'inventory.sqlite')
+    result = invoke('inventory:query', '--db', db, '--app', 'foo')
+    assert result.exit_code in (-1, 255)
+    assert 'inventory:sync' in result.output
+
+    _cluster(stub, {'pa': [_container('a1', 'n1', 'pa', 'foo', 'abcdef1234', '10.0.0.1')]})
+    result = invoke('--zones', 'c1,c2', 'inventory:sync', '--db', db)
+    assert result.exit_code == 0, result.output
+    assert sorted(r.zone for r in stub.hits('GET', '/pod')) == ['c1', 'c2']
+
+    result = invoke('--output', 'csv', 'inventory:query', '--db', db, '--node', 'n1')
+    assert result.exit_code == 0, result.output
+    lines = result.stdout.splitlines()
+    assert lines[0].startswith('zone,name,id')
+    assert [line.split(',')[0] for line in lines[1:]] == ['c1', 'c2']
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+import click
+
+from corecli.cli.cli import core_commands
+from corecli.cli.commands import commands
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('yaml', 'prettytable', 'envoy', 'requests', 'citadelpy', 'corecli.cli.app', 'corecli.cli.action')
+
+
+def _imported_after(code):
+    """新起一个python跑code, 返回HEAVY里被import了的module."""
+    script = code + '\nimport sys\nprint("imported:" + ",".join(m for m in %r if m in sys.modules))' % (HEAVY,)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.check_output([sys.executable, '-c', script], env=env, cwd=ROOT)
+    line = out.decode().strip().splitlines()[-1]
+    return set(filter(None, line[len('imported:'):].split(',')))
+
+
+def test_every_command_resolves():
+    ctx = click.Context(core_commands)
+    assert core_commands.list_commands(ctx) == sorted(commands)
+    for name in commands:
+        assert isinstance(core_commands.get_command(ctx, name), click.Command), name
+    assert core_commands.get_command(ctx, 'nope') is None
+
+
+def test_help_lists_commands(invoke):
+    result = invoke('--help')
+    assert result.exit_code == 0
+    for name in commands:
+        assert name in result.output
+
+
+def test_startup_imports_nothing_heavy():
+    assert _imported_after('import corecli.cli.cli') == set()
+
+    code = ('import click\nfrom corecli.cli.cli import core_commands\n'
+            'ctx = click.Context(core_commands)\n'
+            'for name in core_commands.list_commands(ctx): core_commands.get_command(ctx, name)')
+    assert _imported_after(code) == {'corecli.cli.app', 'corecli.cli.action'}
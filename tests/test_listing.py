@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import pytest
+from prettytable import PrettyTable
+
+from citadelpy import CoreAPI, CoreAPIError
+from corecli.cli.output import StreamingTable
+from corecli.cli.utils import CONTAINER_FIELDS, CONTAINER_HEADER
+from tests.stub import StubResponse
+
+
+def _container(i, zone='c1'):
+    return {'name': 'web-%d' % i, 'container_id': '%064d' % i, 'nodename': 'node%d' % (i % 3), 'podname': 'pod',
+            'appname': 'foo', 'sha': 'abcdef1234', 'entrypoint': 'web', 'env': zone, 'cpu_quota': 1,
+            'info': {'NetworkSettings': {'Networks': {'calico': {'IPAddress': '10.0.0.%d' % i}}}, 'Blob': 'x' * 1000}}
+
+
+def _paged(total, supported=True):
+    containers = [_container(i) for i in range(total)]
+
+    def _response(req):
+        if not supported or 'start' not in req.query:
+            return StubResponse(json=containers)
+        start, limit = int(req.query['start'][0]), int(req.query['limit'][0])
+        return StubResponse(json=containers[start:start + limit])
+    return containers, _response
+
+
+def test_iter_containers_pages(stub):
+    containers, response = _paged(25)
+    stub.add('GET', '/pod/pod/containers', response)
+    core = CoreAPI(stub.url, auth_token='token')
+
+    assert list(core.iter_pod_containers('pod')) == containers
+    assert list(core.iter_pod_containers('pod', page_size=10)) == containers
+    queries = [r.query.get('start') for r in stub.hits('GET', '/pod/pod/containers')]
+    assert queries == [None, ['0'], ['10'], ['20']]
+
+
+@pytest.mark.parametrize('page_size', [5, 25, 100])
+def test_iter_containers_server_without_paging(stub, page_size):
+    containers, response = _paged(25, supported=False)
+    stub.add('GET', '/app/foo/containers', response)
+    core = CoreAPI(stub.url, auth_token='token')
+    assert list(core.iter_app_containers('foo', page_size=page_size)) == containers
+    assert len(stub.hits('GET', '/app/foo/containers')) <= 2
+
+
+def test_iter_containers_errors(stub):
+    stub.add('GET', '/app/foo/version/sha/containers', json={'error': 'not an array'})
+    stub.add('GET', '/app/bar/version/sha/containers', code=500, body='boom')
+    core = CoreAPI(stub.url, auth_token='token')
+    with pytest.raises(CoreAPIError, match='json array'):
+        list(core.iter_release_containers('foo', 'sha'))
+    with pytest.raises(CoreAPIError, match='boom'):
+        list(core.iter_release_containers('bar', 'sha'))
+
+
+def test_streaming_table_prints_rows_early():
+    lines = []
+    table = StreamingTable(['a', 'b'], sample=2, echo=lines.append)
+    table.add_row(['x', 'y'])
+    assert lines == []
+    table.add_row(['xx', 'y'])
+    assert len(lines) == 5
+    table.add_row(['xxx', 'y'])
+    assert len(lines) == 6
+    table.close()
+    assert lines[-1] == lines[0]
+
+
+def test_container_table_matches_prettytable(stub, invoke):
+    containers, response = _paged(30)
+    stub.add('GET', '/app/foo/containers', response)
+    result = invoke('app:container', 'foo')
+    assert result.exit_code == 0, result.output
+
+    table = PrettyTable(CONTAINER_HEADER)
+    for c in containers:
+        table.add_row([c['name'], c['container_id'], c['nodename'], 'pod', 'foo', 'abcdef1', 'web', 'c1', 1,
+                       'calico:' + c['info']['NetworkSettings']['Networks']['calico']['IPAddress']])
+    assert result.output == table.get_string() + '\n'
+
+
+def test_tsv_output(stub, invoke):
+    stub.add('GET', '/pod/pod/containers', json=[_container(1)])
+    stub.add('GET', '/app/foo/env/prod', json={'vars': {'A': 'tab\there', 'B': 'line\nbreak'}})
+
+    result = invoke('--output', 'tsv', 'pod:container', 'pod', '--page-size', '10')
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == ['\t'.join(CONTAINER_HEADER),
+                                          'web-1\t%064d\tnode1\tpod\tfoo\tabcdef1\tweb\tc1\t1\tcalico:10.0.0.1' % 1]
+
+    result = invoke('--output', 'tsv', 'app:env', 'get', 'prod', '--app', 'foo')
+    assert result.output.splitlines() == ['key\tvalue', 'A\ttab\\there', 'B\tline\\nbreak']
+
+
+def test_multi_zone_stream(stub, invoke):
+    def _response(req):
+        if req.zone == 'bad':
+            return StubResponse(code=500, body='zone down')
+        return StubResponse(json=[_container(i, req.zone) for i in range(3)])
+    stub.add('GET', '/app/foo/containers', _response)
+
+    result = invoke('--output', 'tsv', '--zones', 'c1,bad,c2', 'app:container', 'foo')
+    assert result.exit_code == 0, result.output
+    lines = [line.split('\t') for line in result.output.splitlines()]
+    assert lines[0] == ['zone'] + CONTAINER_HEADER
+    assert sorted(line[0] for line in lines[1:]) == ['bad', 'c1', 'c1', 'c1', 'c2', 'c2', 'c2']
+    assert all(line[8] == line[0] for line in lines[1:] if line[0] != 'bad')
+    assert any('zone down' in line[1] for line in lines if line[0] == 'bad')
+
+
+def test_single_zone_stream_error(stub, invoke):
+    stub.add('GET', '/app/foo/containers', code=500, body='boom')
+    result = invoke('app:container', 'foo')
+    assert result.exit_code in (-1, 255)
+    assert result.output.strip().endswith('boom')
+    assert '+' not in result.output
+
+
+def test_container_fields(stub, invoke):
+    containers, response = _paged(3, supported=False)
+    stub.add('GET', '/app/foo/containers', response)
+    stub.add('GET', '/pod/pod/containers', json=containers)
+    core = CoreAPI(stub.url, auth_token='token')
+
+    fields = ['name', 'info.NetworkSettings.Networks']
+    expected = [{'name': c['name'], 'info': {'NetworkSettings': c['info']['NetworkSettings']}} for c in containers]
+    # citadel不认fields参数, 在本地去掉别的key
+    assert list(core.iter_app_containers('foo', fields=fields)) == expected
+    assert list(core.iter_app_containers('foo', page_size=2, fields=fields)) == expected
+    assert core.get_pod_containers('pod', fields=fields) == expected
+    assert core.get_pod_containers('pod') == containers
+    sent = [r.query.get('fields') for r in stub.hits('GET', '/app/foo/containers')]
+    assert sent == [['name,info.NetworkSettings.Networks']] * len(sent)
+
+    result = invoke('--output', 'tsv', 'app:container', 'foo')
+    assert result.exit_code == 0, result.output
+    assert len(result.output.splitlines()) == 4
+    assert stub.hits('GET', '/app/foo/containers')[-1].query['fields'] == [','.join(CONTAINER_FIELDS)]
+
+
+def test_table_wide_chars_and_newlines(stub, invoke):
+    stub.add('GET', '/pod', json=[{'name': 'pod', 'desc': u'测试集群'}, {'name': 'longer-pod', 'desc': 'a'}])
+    result = invoke('pod:get')
+    assert result.exit_code == 0, result.output
+    table = PrettyTable(['name', 'desc'])
+    table.add_row(['pod', u'测试集群'])
+    table.add_row(['longer-pod', 'a'])
+    assert result.stdout == table.get_string() + '\n'
+
+    stub.add('GET', '/app/foo/env/prod', json={'vars': {'CERT': 'line1\nline2', 'KEY': 'v'}})
+    result = invoke('app:env', 'get', 'prod', '--app', 'foo')
+    assert result.exit_code == 0, result.output
+    assert result.stdout.splitlines()[3:6] == ['| CERT | line1 |', '|      | line2 |', '| KEY  | v     |']
+
+
+def test_streaming_table_wide_chars_and_newlines():
+    lines = []
+    table = StreamingTable(['name', 'desc'], sample=1, echo=lines.append)
+    table.add_row([u'测试', 'a\nbb'])
+    table.add_row(['xyz', u'中'])
+    table.close()
+    assert lines == [
+        '+------+------+',
+        '| name | desc |',
+        '+------+------+',
+        u'| 测试 |  a   |',
+        '|      |  bb  |',
+        u'| xyz  |  中  |',
+        '+------+------+',
+    ]
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import time
+
+from citadelpy import CoreAPI
+from corecli.cli.logs import BatchWriter, TailBuffer, merge_streams
+from tests.stub import StubResponse
+
+
+def _log(ts, data, node='n1'):
+    return {'datetime': '2026-10-18 10:00:%02d' % ts, 'type': 'stdout', 'entrypoint': 'web', 'id': node + 'abcdefgh', 'ident': '', 'data': data}
+
+
+def test_stream_logs_filters_and_resumes(stub):
+    attempts = []
+
+    def _response(req):
+        attempts.append(req.query)
+        if len(attempts) == 1:
+            return StubResponse(lines=[_log(1, 'a'), _log(2, 'b'), _log(2, 'c')], drop=True)
+        # 从since开始重放, 重复的要去掉
+        return StubResponse(lines=[_log(2, 'b'), _log(2, 'c'), _log(2, 'd'), _log(3, 'e')])
+    stub.add('GET', '/log/n1/foo', _response)
+    core = CoreAPI(stub.url, auth_token='token')
+
+    logs = list(core.stream_logs('n1', 'foo', entrypoint='web', type='stdout', backoff=0))
+    assert [m['data'] for m in logs] == ['a', 'b', 'c', 'd', 'e']
+    assert attempts[0]['entrypoint'] == ['web'] and attempts[0]['type'] == ['stdout']
+    assert 'since' not in attempts[0] and 'container' not in attempts[0]
+    assert attempts[1]['since'] == ['2026-10-18 10:00:02']
+
+
+def test_stream_logs_gives_up(stub):
+    stub.add('GET', '/log/n1/foo', lines=[_log(1, 'a')], drop=True)
+    core = CoreAPI(stub.url, auth_token='token')
+    logs = core.stream_logs('n1', 'foo', reconnect=2, backoff=0)
+    assert next(logs)['data'] == 'a'
+    try:
+        list(logs)
+    except Exception as e:
+        assert 'dropped' in str(e)
+    else:
+        assert False, 'should raise'
+    assert len(stub.hits('GET', '/log/n1/foo')) == 3
+
+
+def _slow(logs, delay):
+    for m in logs:
+        time.sleep(delay)
+        yield m
+
+
+def _broken():
+    raise IOError('node down')
+    yield
+
+
+def test_merge_streams_orders_by_time():
+    streams = {
+        'n1': _slow([_log(1, 'a'), _log(4, 'd'), _log(5, 'e')], 0.01),
+        'n2': _slow([_log(2, 'b', 'n2'), _log(3, 'c', 'n2')], 0.02),
+        'n3': _broken(),
+    }
+    results = [r for r in merge_streams(streams, window=0.5) if r[0] is not None]
+    assert [m['data'] for name, m, exc in results if m] == ['a', 'b', 'c', 'd', 'e']
+    [(name, _, exc)] = [r for r in results if r[2] is not None]
+    assert (name, str(exc)) == ('n3', 'node down')
+
+
+def test_writers():
+    lines = []
+    out = BatchWriter(max_lines=3, interval=60, echo=lines.append)
+    for i in range(7):
+        out.write(str(i))
+    out.idle()
+    assert lines == ['0\n1\n2', '3\n4\n5']
+    out.flush()
+    assert lines[-1] == '6'
+
+    lines = []
+    out = TailBuffer(2, echo=lines.append)
+    for i in range(5):
+        out.write(str(i))
+    out.idle()
+    assert lines == []
+    out.flush()
+    assert lines == ['3\n4']
+
+
+def test_log_command(stub, invoke):
+    stub.add('GET', '/log/n1/foo', lines=[_log(1, 'a'), _log(3, 'c')])
+    stub.add('GET', '/log/n2/foo', lines=[_log(2, 'b', 'n2')])
+    stub.add('GET', '/log/bad/foo', code=404, body='no such node')
+
+    result = invoke('log', 'n1,n2', 'foo', '--merge-window', '0.2')
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines() == ['[2026-10-18 10:00:01, stdout, web, n1abcde, ] a',
+                                          '[2026-10-18 10:00:02, stdout, web, n2abcde, ] b',
+                                          '[2026-10-18 10:00:03, stdout, web, n1abcde, ] c']
+
+    result = invoke('log', 'n1,bad', 'foo', '--tail', '1', '--container', 'abc')
+    assert result.exit_code in (-1, 255)
+    assert result.stdout.splitlines() == ['[2026-10-18 10:00:03, stdout, web, n1abcde, ] c']
+    assert 'bad: Citadel internal error: code 404' in result.stderr
+    assert stub.hits('GET', '/log/bad/foo')[0].query['container'] == ['abc']
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import pytest
+import simplejson as json
+
+from citadelpy import CoreAPI
+from citadelpy.models import Container, Node, Release
+from citadelpy.stream import iter_json_array, loads_raw
+
+
+def _container(i):
+    return {'name': 'web-%d' % i, 'container_id': '%064d' % i, 'nodename': 'node%d' % (i % 3), 'podname': 'pod',
+            'appname': 'foo', 'sha': 'abcdef1234', 'entrypoint': 'web', 'env': 'prod', 'cpu_quota': 1.5,
+            'info': {'NetworkSettings': {'Networks': {'calico': {'IPAddress': '10.0.0.%d' % i}}}, 'Blob': u'xé' * 100}}
+
+
+def test_container_keeps_info_raw():
+    c = Container.from_dict(_container(1))
+    assert isinstance(c._info, bytes)
+    assert c.networks == {'calico': {'IPAddress': '10.0.0.1'}}
+    assert c.info['Blob'] == u'xé' * 100
+    assert not hasattr(c, '__dict__')
+    assert Container.from_dict({'container_id': 'x'}).networks == {}
+    assert c == Container.from_dict(_container(1)) and c != Container.from_dict(_container(2))
+
+
+def test_models_are_hashable():
+    containers = {Container.from_dict(_container(i)) for i in [1, 2, 1]}
+    assert containers == {Container.from_dict(_container(1)), Container.from_dict(_container(2))}
+    # 空格不一样的原始JSON也是同一个
+    assert hash(Container(container_id='x', info=b'{"a": 1}')) == hash(Container(container_id='x', info={'a': 1}))
+    assert len({Release('foo', 'abc'), Release('foo', 'abc'), Release('foo', 'def')}) == 2
+    assert {Node('n1', 'pod'): 1}[Node('n1', 'pod')] == 1
+
+
+def test_json_array_raw_keys_split_anywhere():
+    containers = [_container(i) for i in range(20)]
+    data = json.dumps(containers).encode('utf-8')
+    for size in (1, 13, 1000, len(data)):
+        items = list(iter_json_array([data[i:i + size] for i in range(0, len(data), size)], raw=Container.raw_fields))
+        assert [item['name'] for item in items] == [c['name'] for c in containers]
+        assert all(isinstance(item['info'], bytes) for item in items)
+        assert json.loads(items[7]['info']) == containers[7]['info']
+
+
+def test_raw_keys_with_fields():
+    data = json.dumps([_container(1)])
+    [item] = iter_json_array([data], fields=['name', 'info.NetworkSettings.Networks'], raw=Container.raw_fields)
+    # 只要info的一部分的时候info先裁剪, 不保留整个blob
+    assert item == {'name': 'web-1', 'info': {'NetworkSettings': {'Networks': {'calico': {'IPAddress': '10.0.0.1'}}}}}
+    [item] = iter_json_array([data], fields=['name', 'info'], raw=Container.raw_fields)
+    assert set(item) == {'name', 'info'} and isinstance(item['info'], bytes)
+    assert loads_raw(data[1:-1], Container.raw_fields, fields=['sha']) == {'sha': 'abcdef1234'}
+
+
+@pytest.mark.parametrize('data', ['{"a": 1} x', '{"a": 1', '{"a" 1}', '{1: 2}'])
+def test_loads_raw_errors(data):
+    with pytest.raises(ValueError):
+        loads_raw(data, ('a',))
+
+
+def test_loads_raw():
+    assert loads_raw('{"a": {"b": [1, 2]}, "c": "d"}', ('a',)) == {'a': b'{"b": [1, 2]}', 'c': 'd'}
+    assert loads_raw(' [{"a": null}, 3] ', ('a',)) == [{'a': b'null'}, 3]
+    assert loads_raw('{}', ('a',)) == {}
+
+
+def test_api_returns_models(stub):
+    containers = [_container(i) for i in range(5)]
+    stub.add('GET', '/pod/pod/containers', json=containers, headers={'ETag': '"v1"'})
+    stub.add('GET', '/pod/pod/nodes', json=[{'name': 'n1', 'cpu': {'0': 10}, 'info': '{"NCPU": 4}'}, {'name': 'n2', 'available': False}])
+    stub.add('GET', '/app/foo/releases', json=[{'sha': 'abc', 'image': 'hub/foo:abc', 'created': 'now', 'specs': {'entrypoints': {}}}])
+    core = CoreAPI(stub.url, auth_token='token')
+
+    expected = [Container.from_dict(c) for c in containers]
+    assert core.get_pod_containers('pod', model=Container) == expected
+    assert list(core.iter_pod_containers('pod', page_size=2, model=Container)) == expected
+    items, etag = core.poll_pod_containers('pod', model=Container)
+    assert (items, etag) == (expected, '"v1"')
+    assert core.poll_pod_containers('pod', etag, model=Container) == (None, '"v1"')
+
+    n1, n2 = core.get_pod_nodes('pod', model=Node)
+    assert (n1.name, n1.available, n1.cpu, n1.info) == ('n1', True, {'0': 10}, '{"NCPU": 4}')
+    assert (n2.name, n2.available) == ('n2', False)
+
+    [release] = core.get_app_releases('foo', model=Release)
+    assert (release.sha, release.image, release.specs) == ('abc', 'hub/foo:abc', {'entrypoints': {}})
+    assert isinstance(release._specs, bytes)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+
+import pytest
+import simplejson as json
+
+from corecli.cli.output import FORMATS, JSONWriter
+from tests.stub import StubResponse
+
+
+def test_json_writer_streams_records():
+    lines = []
+    out = JSONWriter(['a', 'b'], echo=lines.append)
+    out.add_row(['x', 1])
+    assert lines == ['[{"a": "x", "b": 1}']
+    out.add_error(['c1'], 'boom')
+    out.add_row([u'中文', None])
+    out.close()
+    assert json.loads('\n'.join(lines)) == [{'a': 'x', 'b': 1}, {'a': 'c1', 'error': 'boom'}, {'a': u'中文', 'b': None}]
+
+    lines = []
+    JSONWriter(['a'], echo=lines.append).close()
+    assert json.loads('\n'.join(lines)) == []
+
+
+def test_jsonl_and_csv_output(stub, invoke):
+    stub.add('GET', '/pod/p1/getmemcap', json={'n1': {'total': 10, 'used': 4, 'used_by_memcap': 3, 'diff': 1}})
+    stub.add('GET', '/app/foo/env/prod', json={'vars': {'A': 'has,comma', 'B': 'has "quote"'}})
+
+    result = invoke('--output', 'jsonl', 'pod:getmemcap', 'p1')
+    assert result.exit_code == 0, result.output
+    assert [json.loads(line) for line in result.output.splitlines()] == [
+        {'node': 'n1', 'total': 10, 'used': 4, 'used_by_memcap': 3, 'diff': 1}]
+
+    result = invoke('--output', 'csv', 'app:env', 'get', 'prod', '--app', 'foo')
+    assert result.exit_code == 0, result.output
+    assert list(csv.reader(io.StringIO(result.output))) == [['key', 'value'], ['A', 'has,comma'], ['B', 'has "quote"']]
+
+
+def test_json_multi_zone_errors(stub, invoke):
+    def _response(req):
+        if req.zone == 'c2':
+            return StubResponse(code=500, body='zone down')
+        return StubResponse(json=[{'name': 'pod-' + req.zone, 'desc': ''}])
+    stub.add('GET', '/pod', _response)
+
+    result = invoke('--output', 'json', '--zones', 'c1,c2,c3', 'pod:get')
+    assert result.exit_code == 0, result.output
+    records = sorted(json.loads(result.output), key=lambda r: r['zone'])
+    assert [r['zone'] for r in records] == ['c1', 'c2', 'c3']
+    assert records[0] == {'zone': 'c1', 'name': 'pod-c1', 'desc': ''}
+    assert 'zone down' in records[1]['error']
+
+
+@pytest.mark.parametrize('fmt', [f for f in FORMATS if f != 'table'])
+def test_error_keeps_stdout_parseable(stub, invoke, fmt):
+    stub.add('GET', '/app/foo/containers', code=500, body='boom')
+    result = invoke('--output', fmt, 'app:container', 'foo')
+    assert result.exit_code in (-1, 255)
+    assert 'boom' not in result.stdout
+    assert 'boom' in result.stderr
+    if fmt == 'json':
+        assert json.loads(result.stdout) == []
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import pytest
+import simplejson as json
+
+from citadelpy.models import Node
+from corecli.cli.planner import NodeCapacity, node_capacities, plan
+
+
+GB = 1 << 30
+
+
+def _nodes(*free):
+    return [NodeCapacity('pod', 'n%d' % i, memory) for i, memory in enumerate(free)]
+
+
+def test_best_fit_keeps_big_nodes_free():
+    nodes = _nodes(8 * GB, 3 * GB, 2 * GB)
+    result = plan(nodes, [(2 * GB, 0, 2, '')])
+    assert result.ok
+    assert [node.name for _, node in result.placements] == ['n2', 'n1']
+    # 剩下8G, 1G, 0
+    assert result.headroom(4 * GB, 0) == 2
+    assert result.fragmentation(4 * GB, 0) == pytest.approx(1 / 9.0)
+
+
+def test_mixed_sizes_place_largest_first():
+    nodes = _nodes(4 * GB, 4 * GB)
+    result = plan(nodes, [(1 * GB, 0, 2, ''), (3 * GB, 0, 2, '')])
+    assert result.ok
+    assert sorted(node.memory for node in nodes) == [0, 0]
+
+
+def test_unplaced_and_nodename():
+    result = plan(_nodes(2 * GB, 8 * GB), [(3 * GB, 0, 3, '')])
+    assert result.unplaced == [(0, 1)]
+
+    result = plan(_nodes(2 * GB, 8 * GB), [(1 * GB, 0, 3, 'n0')])
+    assert [node.name for _, node in result.placements] == ['n0', 'n0']
+    assert result.unplaced == [(0, 1)]
+
+
+def test_cpu_needs_whole_cores_for_integer_part():
+    node = NodeCapacity('pod', 'n', 100 * GB, {'0': 10, '1': 10, '2': 5})
+    assert node.free_cpu == 2.5
+    assert node.capacity(GB, 1.5) == 1
+    assert node.capacity(GB, 0.5) == 5
+    result = plan([node], [(GB, 1.5, 2, '')])
+    assert result.unplaced == [(0, 1)]
+    assert node.cores == {'0': 0, '1': 10, '2': 0}
+
+
+def test_node_capacities_skips_unavailable():
+    memcap = {'n1': {'total': 10, 'used': 5, 'used_by_memcap': 4, 'diff': 1}, 'n2': {'total': 10, 'used': 0, 'used_by_memcap': 0, 'diff': 0}}
+    nodes = [Node.from_dict(n) for n in ({'name': 'n1', 'cpu': {'0': 10}}, {'name': 'n2', 'available': False}, {'name': 'n3'})]
+    [node] = node_capacities('pod', memcap, nodes)
+    assert (node.name, node.memory, node.cores) == ('n1', 6, {'0': 10})
+
+
+def _pod(stub, podname, free):
+    stub.add('GET', '/pod/%s/getmemcap' % podname,
+             json=dict(('%s-%d' % (podname, i), {'total': 16 * GB, 'used': 0, 'used_by_memcap': 16 * GB - f, 'diff': 0}) for i, f in enumerate(free)))
+    stub.add('GET', '/pod/%s/nodes' % podname, json=[{'name': '%s-%d' % (podname, i), 'available': True} for i in range(len(free))])
+
+
+def test_plan_command(stub, invoke):
+    _pod(stub, 'p1', [4 * GB, 2 * GB])
+    _pod(stub, 'p2', [1 * GB])
+
+    result = invoke('--output', 'jsonl', 'pod:plan', 'p1', 'p2', '--memory', str(2 * GB), '--count', '2')
+    assert result.exit_code in (-1, 255)
+    rows = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [(r['pod'], r['node'], r['place'], r['headroom']) for r in rows] == [('p1', 'p1-0', 1, 1), ('p1', 'p1-1', 1, 0), ('p2', 'p2-0', 0, 0)]
+    assert 'p1: 2 of 2 containers fit, headroom 1 more, fragmentation 0.0%' in result.stderr
+    assert 'p2: 0 of 2 containers fit' in result.stderr
+
+    result = invoke('pod:plan', 'p1', '--memory', str(2 * GB))
+    assert result.exit_code == 0, result.output
+    assert 'p1: 1 of 1 containers fit, headroom 2 more' in result.output
+
+
+def test_deploy_preflight_fails_fast(stub, invoke):
+    _pod(stub, 'p1', [1 * GB])
+    stub.add('POST', '/deploy', json={})
+
+    result = invoke('deploy', 'p1', 'web', '--repo', 'git@x:y/z.git', '--sha', 'abc', '--memory', str(2 * GB), '--preflight')
+    assert result.exit_code in (-1, 255)
+    assert 'Preflight check failed: p1: 1 of 1 containers' in result.output
+    assert stub.hits('POST', '/deploy') == []
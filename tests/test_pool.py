@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from citadelpy import CoreAPI, CoreAPIError
+from tests.stub import StubResponse
+
+
+def _flaky(failures, code=503, payload=None):
+    calls = []
+
+    def _handler(req):
+        calls.append(req)
+        if len(calls) <= failures:
+            return StubResponse(code=code, body='unavailable')
+        return StubResponse(json=payload if payload is not None else {'ok': True})
+    return _handler
+
+
+def test_get_retried_on_5xx(stub):
+    stub.add('GET', '/app/foo', _flaky(2))
+    core = CoreAPI(stub.url, auth_token='token', retries=2, backoff_factor=0)
+    assert core.get_app('foo') == {'ok': True}
+    assert len(stub.hits('GET', '/app/foo')) == 3
+
+
+def test_gives_up_after_retries(stub):
+    stub.add('GET', '/app/foo', _flaky(5))
+    core = CoreAPI(stub.url, auth_token='token', retries=1, backoff_factor=0)
+    with pytest.raises(CoreAPIError) as e:
+        core.get_app('foo')
+    assert 'code 503' in str(e.value)
+    assert len(stub.hits('GET', '/app/foo')) == 2
+
+
+def test_post_not_retried(stub):
+    stub.add('POST', '/pod/p1/syncmemcap', _flaky(1))
+    core = CoreAPI(stub.url, auth_token='token', retries=3, backoff_factor=0)
+    with pytest.raises(CoreAPIError):
+        core.sync_memcap('p1')
+    assert len(stub.hits('POST', '/pod/p1/syncmemcap')) == 1
+
+
+def test_no_retries_by_default(stub):
+    stub.add('GET', '/app/foo', _flaky(1))
+    with pytest.raises(CoreAPIError):
+        CoreAPI(stub.url, auth_token='token').get_app('foo')
+    assert len(stub.hits('GET', '/app/foo')) == 1
+
+
+def test_timeouts():
+    assert CoreAPI('http://x', timeout=5).timeout == 5
+    assert CoreAPI('http://x', connect_timeout=1, read_timeout=30).timeout == (1, 30)
+    assert CoreAPI('http://x', timeout=5, connect_timeout=1).timeout == (1, 5)
+
+
+def test_pool_size_and_reuse_stats(stub):
+    stub.add('GET', '/pod', json=[])
+    core = CoreAPI(stub.url, auth_token='token', pool_size=32)
+    assert core.adapter._pool_maxsize == 32
+
+    for _ in range(5):
+        core.get_pods()
+    assert core.pool_stats() == {'connections': 1, 'requests': 5, 'reused': 4}
+    assert len(stub.connections) == 1
+
+
+def test_connection_options_from_config(stub, config, invoke):
+    stub.add('GET', '/pod', _flaky(1, payload=[]))
+    config.update({'retries': 1, 'backoff_factor': 0, 'pool_size': 4})
+    result = invoke('--debug', 'pod:get')
+    assert result.exit_code == 0, result.output
+    assert len(stub.hits('GET', '/pod')) == 2
+    assert "connection pool: {'connections': 1, 'requests': 2, 'reused': 1}" in result.output
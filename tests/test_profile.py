@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import pytest
+import simplejson as json
+
+from citadelpy import CoreAPI, CoreAPIError
+from corecli.cli import profile as profiling
+
+
+@pytest.fixture(autouse=True)
+def reset_profiler():
+    yield
+    profiling.disable()
+
+
+def _recorder(core):
+    before, after = [], []
+    core.add_hook('before_request', lambda t: before.append((t.method, t.path)))
+    core.add_hook('after_request', lambda t: after.append(t.as_dict()))
+    return before, after
+
+
+def test_hooks_split_latency(stub):
+    stub.add('GET', '/pod', json=[{'name': 'pod1', 'desc': 'd'}])
+    core = CoreAPI(stub.url, auth_token='token')
+    before, after = _recorder(core)
+
+    core.get_pods()
+    core.get_pods()
+    assert before == [('GET', '/pod'), ('GET', '/pod')]
+
+    first, second = after
+    assert first['status'] == 200
+    assert first['bytes'] == len(json.dumps([{'name': 'pod1', 'desc': 'd'}]))
+    assert first['connect'] > 0
+    assert second['connect'] == 0
+    for t in after:
+        assert t['elapsed'] >= t['connect'] + t['ttfb'] + t['decode']
+
+
+def test_after_hook_sees_errors_and_streams(stub):
+    stub.add('GET', '/app/foo', code=500, body='boom')
+    stub.add('POST', '/remove', lines=[{'id': 'a', 'success': True, 'message': ''}])
+    core = CoreAPI(stub.url, auth_token='token')
+    _, after = _recorder(core)
+
+    with pytest.raises(CoreAPIError):
+        core.get_app('foo')
+    list(core.remove(['a']))
+
+    failed, stream = after
+    assert failed['status'] == 500
+    assert 'boom' in failed['error']
+    assert stream['path'] == '/remove'
+    assert stream['bytes'] > 0
+    assert stream['body'] > 0
+
+
+def test_no_hooks_no_timing(stub, monkeypatch):
+    stub.add('GET', '/pod', json=[])
+    import citadelpy
+    monkeypatch.setattr(citadelpy, 'RequestTiming', None)
+    assert CoreAPI(stub.url).get_pods() == []
+
+
+def test_profile_flag_reports_and_writes_trace(stub, invoke, tmp_path):
+    stub.add('GET', '/pod', json=[{'name': 'pod1', 'desc': 'd'}])
+    trace_path = tmp_path / 'trace.json'
+    result = invoke('--profile-trace', str(trace_path), 'pod:get')
+    assert result.exit_code == 0, result.output
+    assert 'phase' in result.output
+    assert 'http.ttfb' in result.output
+    assert 'render' in result.output
+
+    events = json.loads(trace_path.read_text())['traceEvents']
+    categories = set(e['cat'] for e in events)
+    assert {'http', 'http.ttfb', 'render', 'config'} <= categories
+    http = [e for e in events if e['cat'] == 'http'][0]
+    assert http['name'] == 'GET /pod'
+    assert http['ph'] == 'X'
+    assert http['args']['status'] == 200
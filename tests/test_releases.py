@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from citadelpy import CoreAPI
+from citadelpy.releases import ReleaseIndex
+from tests.stub import StubResponse
+
+
+SHA = 'a' * 40
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ReleaseIndex(str(tmp_path / 'releases.sqlite'))
+
+
+def test_index(index):
+    index.update('c1', 'foo', [{'sha': SHA, 'image': 'hub/foo:aaa', 'created': 'now'}, {'sha': 'ab' + 'c' * 38}], '"v1"')
+    assert index.etag('c1', 'foo') == '"v1"'
+    assert index.find('c1', 'foo', SHA[:7]).image == 'hub/foo:aaa'
+    # 前缀对应两个release
+    assert index.find('c1', 'foo', 'a') is None
+    assert index.find('c2', 'foo', SHA) is None
+
+    # 只知道注册了, 不会冲掉镜像
+    index.update('c1', 'foo', [{'sha': SHA}], complete=False)
+    assert index.find('c1', 'foo', SHA).image == 'hub/foo:aaa'
+
+    index.update('c1', 'foo', [], '"v2"')
+    assert index.find('c1', 'foo', SHA) is None
+
+
+def test_find_release_uses_index(stub, index):
+    releases = [{'sha': SHA, 'image': '', 'created': 'now'}]
+    stub.add('GET', '/app/foo/releases', lambda req: StubResponse(json=releases, headers={'ETag': '"%d"' % len(releases[0]['image'])}))
+    core = CoreAPI(stub.url, auth_token='token', zone='c1', releases=index)
+
+    # 还没有镜像, 每次都确认一下, 没变就是304
+    assert core.find_release('foo', SHA[:8])['image'] == ''
+    assert core.find_release('foo', SHA)['image'] == ''
+    assert [r.headers.get('If-None-Match') for r in stub.hits('GET', '/app/foo/releases')] == [None, '"0"']
+
+    releases[0]['image'] = 'hub/foo:aaa'
+    assert core.find_release('foo', SHA)['image'] == 'hub/foo:aaa'
+    # 有镜像了就不用再问citadel
+    assert core.find_release('foo', SHA)['image'] == 'hub/foo:aaa'
+    assert len(stub.hits('GET', '/app/foo/releases')) == 3
+    assert core.find_release('foo', 'b' * 40) is None
+
+
+def test_build_skip_existing(stub, invoke, config, tmp_path):
+    config['release_index'] = {'path': str(tmp_path / 'releases.sqlite')}
+    stub.add('GET', '/app/foo/releases', json=[{'sha': SHA, 'image': 'hub/foo:aaa', 'created': 'now'}])
+    stub.add('GET', '/app/new/releases', code=404, body='no such app')
+    stub.add('POST', '/build', lines=[{'error': '', 'stream': '', 'status': 'built', 'progress': ''}])
+
+    for _ in range(2):
+        result = invoke('build', 'git@x:y/foo.git', SHA, '--skip-existing', '--app', 'foo')
+        assert result.exit_code == 0, result.output
+        assert 'already has image hub/foo:aaa, skip build' in result.output
+    assert len(stub.hits('GET', '/app/foo/releases')) == 1
+    assert stub.hits('POST', '/build') == []
+
+    result = invoke('build', 'git@x:y/new.git', SHA, '--skip-existing', '--app', 'new')
+    assert result.exit_code == 0, result.output
+    assert 'build anyway' in result.output
+    assert len(stub.hits('POST', '/build')) == 1
+
+
+def test_register_is_idempotent(stub, invoke):
+    registered = []
+
+    def _register(req):
+        if registered:
+            return StubResponse(code=400, body='release exists')
+        registered.append(req.json['sha'])
+        return StubResponse(json={'sha': req.json['sha']})
+    stub.add('POST', '/app/register', _register)
+    stub.add('GET', '/app/foo/releases', lambda req: StubResponse(json=[{'sha': s, 'image': '', 'created': ''} for s in registered]))
+
+    for _ in range(2):
+        result = invoke('register', 'foo', SHA, 'git@x:y/foo.git')
+        assert result.exit_code == 0, result.output
+    assert 'already registered' in result.output
+    assert len(stub.hits('POST', '/app/register')) == 1
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from corecli.cli import removal
+from tests.stub import StubResponse
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(removal, '_backoff', lambda attempt: 0)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / 'removed.journal')
+
+
+def _containers(nodes):
+    return [{'container_id': '%s-%d' % (node, i), 'nodename': node} for node, count in nodes for i in range(count)]
+
+
+def _remove(flaky=()):
+    attempts = {}
+
+    def _handler(req):
+        lines = []
+        for container_id in req.json['ids']:
+            attempts[container_id] = attempts.get(container_id, 0) + 1
+            if container_id in flaky and attempts[container_id] == 1:
+                lines.append({'success': False, 'id': container_id, 'message': 'docker timeout'})
+            else:
+                lines.append({'success': True, 'id': container_id, 'message': ''})
+        return StubResponse(lines=lines, delay=0.05)
+    return _handler
+
+
+def test_offline_chunks_by_node(stub, invoke, journal):
+    stub.add('GET', '/app/foo/version/abc/containers', json=_containers([('n1', 5), ('n2', 2)]))
+    stub.add('POST', '/remove', _remove())
+    result = invoke('release:offline', 'foo', 'abc', '--chunk-size', '2', '--parallel', '3', '--journal', journal)
+    assert result.exit_code == 0, result.output
+
+    batches = sorted(r.json['ids'] for r in stub.hits('POST', '/remove'))
+    assert batches == [['n1-0', 'n1-1'], ['n1-2', 'n1-3'], ['n1-4'], ['n2-0', 'n2-1']]
+    assert stub.max_active == 3
+    assert '[n2] Container n2-1 removed successfully' in result.output
+    assert stub.hits('GET', '/app/foo/version/abc/containers')[0].query['fields'] == ['container_id,nodename']
+
+
+def test_failed_ids_are_retried(stub, invoke, journal):
+    stub.add('GET', '/app/foo/version/abc/containers', json=_containers([('n1', 3)]))
+    stub.add('POST', '/remove', _remove(flaky={'n1-1'}))
+    result = invoke('release:offline', 'foo', 'abc', '--journal', journal)
+    assert result.exit_code == 0, result.output
+
+    batches = [r.json['ids'] for r in stub.hits('POST', '/remove')]
+    assert batches == [['n1-0', 'n1-1', 'n1-2'], ['n1-1']]
+    assert 'Retry 1/3 for 1 containers' in result.output
+
+
+def test_gives_up_after_retries(stub, invoke, journal):
+    stub.add('GET', '/app/foo/version/abc/containers', json=_containers([('n1', 2)]))
+    stub.add('POST', '/remove', code=500, body='node down')
+    result = invoke('release:offline', 'foo', 'abc', '--retries', '2', '--journal', journal)
+    assert result.exit_code in (-1, 255)
+    assert len(stub.hits('POST', '/remove')) == 3
+    assert '2 containers not removed: n1-0 n1-1' in result.output
+
+
+def test_rerun_skips_journaled_ids(stub, invoke, journal):
+    with open(journal, 'w') as f:
+        f.write('n1-0\nn1-1\nother\n')
+    stub.add('GET', '/app/foo/version/abc/containers', json=_containers([('n1', 3)]))
+    stub.add('POST', '/remove', _remove())
+    result = invoke('release:offline', 'foo', 'abc', '--journal', journal)
+    assert result.exit_code == 0, result.output
+    assert [r.json['ids'] for r in stub.hits('POST', '/remove')] == [['n1-2']]
+    assert 'Skip 2 containers already removed' in result.output
+
+    # 全部删掉了, 这次的ID从journal里去掉, 别的不动
+    with open(journal) as f:
+        assert f.read().split() == ['other']
+
+
+def test_journal_kept_until_run_succeeds(stub, invoke, journal):
+    stub.add('GET', '/app/foo/version/abc/containers', json=_containers([('n1', 2)]))
+    stub.add('POST', '/remove', _remove(flaky={'n1-1'}))
+    result = invoke('release:offline', 'foo', 'abc', '--retries', '0', '--journal', journal)
+    assert result.exit_code in (-1, 255)
+    with open(journal) as f:
+        assert f.read().split() == ['n1-0']
+
+    result = invoke('release:offline', 'foo', 'abc', '--journal', journal)
+    assert result.exit_code == 0, result.output
+    assert stub.hits('POST', '/remove')[-1].json['ids'] == ['n1-1']
+    assert not os.path.exists(journal)
+
+
+def test_remove_chunks_in_given_order(stub, invoke, journal):
+    for i in range(3):
+        stub.add('GET', '/container/c%d' % i, json={'container_id': 'c%d' % i, 'nodename': 'n%d' % (i % 2)})
+    stub.add('POST', '/remove', _remove())
+
+    result = invoke('remove', 'c0', 'c1', 'c2', '--chunk-size', '2', '--journal', journal)
+    assert result.exit_code == 0, result.output
+    assert [r for r in stub.requests if r.method == 'GET'] == []
+    assert sorted(r.json['ids'] for r in stub.hits('POST', '/remove')) == [['c0', 'c1'], ['c2']]
+
+    result = invoke('remove', 'c0', 'c1', 'c2', '--chunk-size', '2', '--by-node', '--journal', '')
+    assert result.exit_code == 0, result.output
+    assert len([r for r in stub.requests if r.method == 'GET']) == 3
+    batches = sorted(r.json['ids'] for r in stub.hits('POST', '/remove')[2:])
+    assert batches == [['c0', 'c2'], ['c1']]
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import pytest
+import simplejson
+
+from citadelpy import CoreAPI
+from citadelpy import stream
+from citadelpy.stream import JSONArrayError, NDJSONError, iter_json_array, iter_ndjson
+
+
+@pytest.fixture(params=['default', 'simplejson'])
+def loads(request):
+    if request.param == 'simplejson':
+        return stream._simplejson_loads
+    return None
+
+
+def _split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_lines_split_across_chunks(loads):
+    data = b''.join(b'{"i": %d, "stream": "%s"}\n' % (i, b'x' * i) for i in range(50))
+    for size in (1, 7, 64, len(data)):
+        records = list(iter_ndjson(_split(data, size), loads=loads))
+        assert [r['i'] for r in records] == list(range(50))
+        assert records[10]['stream'] == 'x' * 10
+
+
+def test_blank_keepalive_lines_skipped(loads, caplog):
+    data = b'\n{"a": 1}\n\r\n   \n{"a": 2}\r\n\n'
+    with caplog.at_level(logging.WARNING):
+        assert list(iter_ndjson(_split(data, 3), loads=loads)) == [{'a': 1}, {'a': 2}]
+    assert not caplog.records
+
+
+def test_last_line_without_newline(loads):
+    assert list(iter_ndjson([b'{"a": 1}\n{"a"', b': 2}'], loads=loads)) == [{'a': 1}, {'a': 2}]
+
+
+def test_bad_and_partial_lines_skipped(loads, caplog):
+    data = [b'{"a": 1}\nnot json\n{"a": 2}\n{"a": 3']
+    with caplog.at_level(logging.WARNING):
+        assert list(iter_ndjson(data, loads=loads)) == [{'a': 1}, {'a': 2}]
+    assert len(caplog.records) == 2
+
+
+def test_strict_raises(loads):
+    with pytest.raises(NDJSONError):
+        list(iter_ndjson([b'{"a": 1}\n{"a":\n'], loads=loads, strict=True))
+
+
+def test_unicode_lines(loads):
+    data = '{"stream": "构建完成"}\n'.encode('utf-8')
+    assert list(iter_ndjson(_split(data, 5), loads=loads)) == [{'stream': '构建完成'}]
+
+
+def test_request_stream_survives_bad_line(stub):
+    stub.add('POST', '/build', lines=[{'stream': 'step 1'}, '', 'garbage', {'stream': 'step 2'}])
+    core = CoreAPI(stub.url, auth_token='token')
+    assert [m['stream'] for m in core.build('git@x:y/z.git', 'sha')] == ['step 1', 'step 2']
+
+
+def test_json_array_split_anywhere():
+    items = [{'i': i, 'info': {'Env': ['A=%s' % ('中' * i)]}} for i in range(30)] + [12345, 1.5e10, True, None, 'x', [1, [2]]]
+    data = simplejson.dumps(items, ensure_ascii=False).encode('utf-8')
+    for size in (1, 2, 7, 64, len(data)):
+        assert list(iter_json_array(_split(data, size))) == items
+
+
+def test_json_array_yields_before_the_end():
+    def _chunks():
+        yield b'[{"i": 0}, {"i": 1}, '
+        raise RuntimeError('connection lost')
+
+    items = iter_json_array(_chunks())
+    assert next(items) == {'i': 0}
+    assert next(items) == {'i': 1}
+    with pytest.raises(RuntimeError):
+        next(items)
+
+
+@pytest.mark.parametrize('data', [b'{"error": "x"}', b'[1, 2', b'[1,, 2]', b'[1] x', b'[1 2]', b''])
+def test_json_array_errors(data):
+    with pytest.raises(JSONArrayError):
+        list(iter_json_array(_split(data, 3)))
+
+
+def test_field_projection():
+    spec = stream.field_spec(['a', 'info.x.y', 'info.z'])
+    assert spec == {'a': True, 'info': {'x': {'y': True}, 'z': True}}
+    assert stream.field_spec(['info', 'info.x']) == {'info': True}
+
+    item = {'a': 1, 'b': 2, 'info': {'x': {'y': [1], 'w': 0}, 'big': 'x' * 100}}
+    assert stream.project(item, spec) == {'a': 1, 'info': {'x': {'y': [1]}}}
+    assert stream.project([1, 2], spec) == [1, 2]
+
+    data = simplejson.dumps([item, item, 3]).encode()
+    chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+    assert list(iter_json_array(chunks, fields=['a', 'info.x.y'])) == [{'a': 1, 'info': {'x': {'y': [1]}}}] * 2 + [3]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from citadelpy import CoreAPI, CoreAPIError
+from tests.stub import StubResponse
+
+
+def _echo(req):
+    return StubResponse(json={'path': req.path, 'zone': req.zone, 'query': req.query})
+
+
+@pytest.fixture
+def core(stub):
+    for i in range(20):
+        stub.add('GET', '/pod/p%d/containers' % i, _echo)
+        stub.add('GET', '/app/a%d/containers' % i, _echo)
+    return CoreAPI(stub.url, auth_token='token', pool_size=16)
+
+
+def test_request_does_not_mutate_params(stub, core):
+    params = {'limit': '10'}
+    core.request('/pod/p1/containers', params=params)
+    assert params == {'limit': '10'}
+
+
+def test_each_thread_gets_its_own_session(core):
+    sessions = []
+
+    def _grab():
+        sessions.append(core.session)
+
+    threads = [threading.Thread(target=_grab) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(id(s) for s in sessions)) == 4
+    assert all(s.get_adapter('http://x') is core.adapter for s in sessions)
+
+
+def test_map_returns_results_in_order(core):
+    results = core.map('get_pod_containers', ['p%d' % i for i in range(20)], workers=8)
+    assert [r['path'] for r in results] == ['/pod/p%d/containers' % i for i in range(20)]
+
+    results = core.map(core.request, [('/app/a1/containers',), {'path': '/app/a2/containers'}], workers=2)
+    assert [r['path'] for r in results] == ['/app/a1/containers', '/app/a2/containers']
+    assert core.map('get_pod_containers', []) == []
+
+
+def test_map_raises_first_error(stub, core):
+    with pytest.raises(CoreAPIError):
+        core.map('get_pod_containers', ['p1', 'missing', 'p2'], workers=3)
+
+
+def test_concurrent_zones_and_params_stay_separate(stub, core):
+    """很多线程用不同的zone和参数同时打同一个CoreAPI, 每个结果都要对得上."""
+    # 连接池比线程少的时候urllib3会丢掉多出来的连接再新建, 连接数没有上限, 这里给够
+    core = CoreAPI(stub.url, auth_token='token', pool_size=32)
+
+    def _call(i):
+        api = core.with_zone('z%d' % (i % 5))
+        path = '/pod/p%d/containers' % (i % 20) if i % 2 else '/app/a%d/containers' % (i % 20)
+        params = {'n': str(i)}
+        result = api.request(path, params=params)
+        return i, path, params, result
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        results = list(executor.map(_call, range(500)))
+
+    for i, path, params, result in results:
+        assert result['path'] == path
+        assert result['zone'] == 'z%d' % (i % 5)
+        assert result['query']['n'] == [str(i)]
+        assert params == {'n': str(i)}
+    stats = core.pool_stats()
+    assert stats['requests'] == 500
+    assert stats['connections'] <= 32
+    assert stats['reused'] >= 500 - 32
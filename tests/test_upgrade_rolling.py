@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from tests.stub import StubResponse
+
+
+SHA = 'b' * 40
+
+
+def _containers(n):
+    return [{'container_id': 'old%d' % i, 'sha': 'a' * 40} for i in range(n)]
+
+
+def _upgrade(fail_ids=()):
+    def _handler(req):
+        lines = []
+        for container_id in req.json['ids']:
+            if container_id in fail_ids:
+                lines.append({'success': False, 'id': container_id, 'error': 'no resource'})
+            else:
+                lines.append({'success': True, 'id': container_id, 'new_id': 'new-' + container_id, 'new_name': 'n'})
+        return StubResponse(lines=lines, delay=0.05)
+    return _handler
+
+
+def _container(running=True):
+    def _handler(req):
+        container_id = req.path.rsplit('/', 1)[1]
+        return StubResponse(json={'container_id': container_id, 'sha': SHA, 'info': {'State': {'Running': running}}})
+    return _handler
+
+
+def _setup(stub, n, fail_ids=(), running=True):
+    stub.add('GET', '/app/foo/version/old/containers', json=_containers(n))
+    stub.add('POST', '/upgrade', _upgrade(fail_ids))
+    for i in range(n):
+        stub.add('GET', '/container/new-old%d' % i, _container(running))
+
+
+def _args(*extra):
+    return ('upgrade:rolling', 'foo', 'old', '--repo', 'git@x:y/z.git', '--sha', SHA,
+            '--health-interval', '0.01', '--health-timeout', '0.2') + extra
+
+
+def test_rolling_upgrade_in_waves(stub, invoke):
+    _setup(stub, 7)
+    result = invoke(*_args('--batch-size', '3'))
+    assert result.exit_code == 0, result.output
+
+    batches = [r.json['ids'] for r in stub.hits('POST', '/upgrade')]
+    assert batches == [['old0', 'old1', 'old2'], ['old3', 'old4', 'old5'], ['old6']]
+    assert '[wave 3/3] Container old6 upgrade to new-old6' in result.output
+    assert 'done, 7 containers in 3 waves' in result.output
+    assert len(stub.hits('GET', '/container/new-old0')) == 1
+
+
+def test_max_unavailable_limits_parallel_waves(stub, invoke):
+    _setup(stub, 8)
+    result = invoke(*_args('--batch-size', '2', '--parallel', '4', '--max-unavailable', '4'))
+    assert result.exit_code == 0, result.output
+    assert len(stub.hits('POST', '/upgrade')) == 4
+    assert stub.max_active <= 2
+
+
+def test_failures_stop_later_waves(stub, invoke):
+    _setup(stub, 6, fail_ids={'old0'})
+    result = invoke(*_args('--batch-size', '2'))
+    assert result.exit_code in (-1, 255)
+    assert len(stub.hits('POST', '/upgrade')) == 1
+    assert 'skipped' in result.output
+    assert 'stopped, 1 containers failed' in result.output
+
+
+def test_unhealthy_containers_count_as_failures(stub, invoke):
+    _setup(stub, 2, running=False)
+    result = invoke(*_args('--batch-size', '2', '--max-failures', '5'))
+    assert result.exit_code == 0, result.output
+    assert 'Container new-old0 not running' in result.output
+
+    result = invoke(*_args('--batch-size', '2', '--max-failures', '1'))
+    assert result.exit_code in (-1, 255)
+
+
+def test_upgrade_error_stops_later_waves(stub, invoke):
+    _setup(stub, 6)
+    stub.add('POST', '/upgrade', code=500, body='boom')
+    result = invoke(*_args('--batch-size', '2'))
+    assert result.exit_code in (-1, 255)
+    assert len(stub.hits('POST', '/upgrade')) == 1
+    assert 'skipped' in result.output
+    assert 'stopped, 2 containers failed' in result.output
+
+
+def test_max_unavailable_caps_batch_size(stub, invoke):
+    _setup(stub, 10)
+    result = invoke(*_args('--batch-size', '10', '--max-unavailable', '2', '--parallel', '3'))
+    assert result.exit_code == 0, result.output
+    batches = [r.json['ids'] for r in stub.hits('POST', '/upgrade')]
+    assert [len(ids) for ids in batches] == [2] * 5
+    assert stub.max_active <= 1
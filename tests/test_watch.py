@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import simplejson as json
+
+from citadelpy import CoreAPI
+from corecli.cli import watch
+from corecli.cli.watch import diff_rows
+from tests.stub import StubResponse
+
+
+def _container(i, sha='abcdef1234'):
+    return {'name': 'web-%d' % i, 'container_id': 'id%d' % i, 'nodename': 'n', 'podname': 'pod', 'appname': 'foo',
+            'sha': sha, 'entrypoint': 'web', 'env': 'prod', 'cpu_quota': 1, 'info': {}}
+
+
+def test_diff_rows():
+    previous = {'a': [1], 'b': [2], 'c': [3]}
+    current = {'b': [2], 'c': [30], 'd': [4]}
+    assert diff_rows(previous, current) == [('~', [30]), ('+', [4]), ('-', [1])]
+    assert diff_rows(current, current) == []
+
+
+def test_poll_array_conditional(stub):
+    stub.add('GET', '/pod/pod/containers', json=[_container(1)], headers={'ETag': '"v1"'})
+    core = CoreAPI(stub.url, auth_token='token')
+
+    items, etag = core.poll_pod_containers('pod', fields=['name'])
+    assert (items, etag) == ([{'name': 'web-1'}], '"v1"')
+    assert core.poll_pod_containers('pod', etag) == (None, '"v1"')
+    assert [r.headers.get('If-None-Match') for r in stub.hits('GET', '/pod/pod/containers')] == [None, '"v1"']
+
+
+def test_watch_prints_only_changes(stub, invoke, monkeypatch):
+    snapshots = [
+        [_container(1), _container(2)],
+        [_container(1), _container(2)],
+        [_container(1), _container(2)],
+        [_container(2, sha='1234567aaa'), _container(3)],
+    ]
+
+    def _response(req):
+        version = min(len(stub.hits('GET', '/app/foo/version/sha/containers')), len(snapshots)) - 1
+        return StubResponse(json=snapshots[version], headers={'ETag': '"%d"' % version if version != 2 else '"1"'})
+    stub.add('GET', '/app/foo/version/sha/containers', _response)
+
+    delays = []
+    real_sleep = watch.time.sleep
+
+    def _sleep(delay):
+        # time是全局的, stub的线程也会sleep
+        if threading.current_thread() is not threading.main_thread():
+            return real_sleep(delay)
+        delays.append(delay)
+        if len(delays) == len(snapshots):
+            raise KeyboardInterrupt
+    monkeypatch.setattr(watch.time, 'sleep', _sleep)
+
+    result = invoke('--output', 'jsonl', 'release:container', 'foo', 'sha', '--watch', '--interval', '1', '--max-interval', '3')
+    assert result.exit_code == 0, result.output
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [(r['change'], r['id'], r['sha']) for r in records] == [
+        ('+', 'id1', 'abcdef1'), ('+', 'id2', 'abcdef1'),
+        ('~', 'id2', '1234567'), ('+', 'id3', 'abcdef1'), ('-', 'id1', 'abcdef1')]
+    # 没变化的时候翻倍, 有变化回到--interval
+    assert delays == [1, 2, 3, 1]
+    assert [r.headers.get('If-None-Match') for r in stub.hits('GET', '/app/foo/version/sha/containers')] == [None, '"0"', '"1"', '"1"']
+
+
+def test_watch_refuses_zones(invoke):
+    result = invoke('--zones', 'c1,c2', 'pod:container', 'pod', '--watch')
+    assert result.exit_code == 2
+    assert 'single zone' in result.output
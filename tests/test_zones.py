@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from tests.stub import StubResponse
+
+
+def _releases(req):
+    if req.zone == 'bad':
+        return StubResponse(code=500, body='zone down')
+    return StubResponse(json=[{'sha': 'sha-%s' % req.zone, 'image': 'img-%s' % req.zone, 'created': 'now'}])
+
+
+def _table_rows(output):
+    rows = []
+    for line in output.splitlines():
+        if line.startswith('|'):
+            rows.append([cell.strip() for cell in line.strip('|').split('|')])
+    return rows[0], rows[1:]
+
+
+def test_zones_merge_rows_in_zone_order(stub, invoke):
+    stub.add('GET', '/app/foo/releases', _releases)
+    result = invoke('--zones', 'c2,c1', 'app:release', 'foo')
+    assert result.exit_code == 0, result.output
+
+    header, rows = _table_rows(result.output)
+    assert header == ['zone', 'name', 'sha', 'image', 'created']
+    assert rows == [['c2', 'foo', 'sha-c2', 'img-c2', 'now'],
+                    ['c1', 'foo', 'sha-c1', 'img-c1', 'now']]
+
+
+def test_failing_zone_becomes_error_row(stub, invoke):
+    stub.add('GET', '/app/foo/releases', _releases)
+    result = invoke('--zones', 'c1,bad,c2', 'app:release', 'foo')
+    assert result.exit_code == 0, result.output
+
+    header, rows = _table_rows(result.output)
+    assert [row[0] for row in rows] == ['c1', 'bad', 'c2']
+    assert all(len(row) == len(header) for row in rows)
+    assert 'zone down' in rows[1][1]
+    assert rows[0][2] == 'sha-c1'
+    assert rows[2][2] == 'sha-c2'
+
+
+def test_all_zones_uses_config_and_runs_in_parallel(stub, invoke):
+    stub.add('GET', '/pod', StubResponse(json=[{'name': 'pod1', 'desc': 'd'}], delay=0.3))
+    start = time.time()
+    result = invoke('--all-zones', 'pod:get')
+    elapsed = time.time() - start
+    assert result.exit_code == 0, result.output
+
+    _, rows = _table_rows(result.output)
+    assert [row[0] for row in rows] == ['c1', 'c2', 'c3']
+    assert elapsed < 0.8
+    assert stub.max_active == 3
+
+
+def test_single_zone_error_exits(stub, invoke):
+    stub.add('GET', '/app/foo', code=500, body='boom')
+    result = invoke('--zone', 'c1', 'app:get', 'foo')
+    assert result.exit_code in (-1, 255)
+    assert 'boom' in result.output
+
+
+@pytest.mark.parametrize('args', [
+    ['remove', 'abc'],
+    ['upgrade', 'abc', '--repo', 'git@x:y/z.git', '--sha', 'sha'],
+    ['deploy', 'pod', 'web', '--repo', 'git@x:y/z.git', '--sha', 'sha'],
+    ['release:offline', 'foo', 'sha'],
+    ['register', 'foo', 'sha', 'git@x:y/z.git'],
+    ['app:env', 'set', 'prod', 'A=1', '--app', 'foo'],
+    ['app:env', 'delete', 'prod', '--app', 'foo'],
+    ['pod:syncmemcap', 'pod'],
+])
+def test_write_commands_refuse_zones(stub, invoke, args):
+    result = invoke('--zones', 'c1,c2', *args)
+    assert result.exit_code == 2
+    assert '--zones / --all-zones only work with read commands' in result.output
+    assert [r for r in stub.requests if r.method != 'GET'] == []